@@ -0,0 +1,72 @@
+"""
+Benchmark del motor PDF: tiempo de render de un reporte de ~30 páginas.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_pdf_report [--pages 30] [--runs 5]
+
+La primera corrida incluye la preparación por proceso (estilos, fuentes,
+banner); las siguientes reflejan el costo de un reporte con todo en caché.
+"""
+import argparse
+import re
+import time
+from statistics import median
+
+from reporting.pdf_generator import generate_pdf_html
+
+BANNER_FILE = "Banner (2).jpg"
+
+SECTION = """## Hallazgo {n}: percepción de **marca** y precio
+
+Los participantes describen la categoría con *matices* distintos según la región. En
+la sesión {n}, el grupo asocia el empaque con `calidad` y menciona precios de
+referencia & promociones recientes.
+
+- El **precio** es el primer filtro de compra para la mayoría.
+- La recomendación de *conocidos* pesa más que la publicidad.
+  - Especialmente en compras de alto valor.
+- Los sellos de advertencia generan dudas sobre la fórmula.
+
+1. Reforzar el mensaje de origen.
+2. Revisar la arquitectura de precios.
+
+> "Yo compro lo que veo en la góndola, si está en promoción mejor."
+
+| Segmento | Menciones | Tono |
+|---|---|---|
+| Jóvenes | 12 | Positivo |
+| Adultos | 8 | Neutral |
+| Mayores | 5 | **Negativo** |
+
+"""
+
+def build_report(pages):
+    # ~2 secciones por página A4 con los márgenes del reporte
+    return "# Reporte de benchmark\n\n" + "".join(SECTION.format(n=i + 1) for i in range(pages * 2))
+
+def count_pages(pdf_bytes):
+    return len(re.findall(rb"/Type\s*/Page[^s]", pdf_bytes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    markdown_text = build_report(args.pages)
+    timings, pdf = [], None
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        pdf = generate_pdf_html(markdown_text, title="Benchmark", banner_path=BANNER_FILE)
+        timings.append(time.perf_counter() - start)
+
+    if not pdf:
+        raise SystemExit("El PDF no se generó.")
+    print(f"Páginas: {count_pages(pdf)}  |  Tamaño: {len(pdf) / 1024:.0f} KB  |  Corridas: {args.runs}")
+    print(f"Primera corrida (incluye preparación): {timings[0] * 1000:.0f} ms")
+    if len(timings) > 1:
+        warm = timings[1:]
+        print(f"Siguientes: mediana {median(warm) * 1000:.0f} ms  |  mín {min(warm) * 1000:.0f} ms  |  máx {max(warm) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,80 @@
 import streamlit as st
 import re
+import time
 from utils import process_text_with_tooltips
 
+# --- RENDER INCREMENTAL DEL STREAMING ---
+# Cada chunk ya no re-renderiza la respuesta completa: los bloques terminados
+# (hasta el último párrafo en blanco fuera de un bloque de código) se escriben
+# una sola vez y solo la cola se redibuja, como máximo cada
+# STREAM_RENDER_INTERVAL segundos o cada STREAM_RENDER_CHARS caracteres.
+STREAM_RENDER_INTERVAL = 0.12
+STREAM_RENDER_CHARS = 600
+METADATA_SEPARATOR = "|||"
+CURSOR = "▌"
+
+def _stable_boundary(text):
+    """Fin del último bloque markdown cerrado (0 si aún no hay ninguno)."""
+    idx = text.rfind("\n\n")
+    while idx > 0:
+        if text.count("```", 0, idx) % 2 == 0:
+            return idx + 2
+        idx = text.rfind("\n\n", 0, idx)
+    return 0
+
+
+class StreamingMarkdown:
+    def __init__(self):
+        self._blocks = st.container()  # Bloques consolidados (se escriben una vez)
+        self._tail = st.empty()        # Cola en construcción (se redibuja)
+        self._parts = []               # Respuesta íntegra, incluidos los metadatos
+        self._tail_parts = []          # Texto visible aún no consolidado
+        self._pending_chars = 0
+        self._last_render = 0.0
+        self._hidden = False           # Tras '|||' no se muestra nada más
+        self._carry = ""               # Cola corta para detectar '|||' partido entre chunks
+
+    def write(self, chunk):
+        if not chunk: return
+        self._parts.append(chunk)
+        if self._hidden: return
+
+        window = self._carry + chunk
+        cut = window.find(METADATA_SEPARATOR)
+        if cut == -1:
+            visible = chunk
+            self._carry = window[-(len(METADATA_SEPARATOR) - 1):]
+        else:
+            self._hidden = True
+            overlap = len(self._carry) - cut
+            visible = chunk[:max(0, cut - len(self._carry))]
+            if overlap > 0:
+                # Parte del separador ya estaba en la cola: se retira
+                tail = "".join(self._tail_parts)
+                self._tail_parts = [tail[:-overlap]] if len(tail) > overlap else []
+
+        if visible:
+            self._tail_parts.append(visible)
+            self._pending_chars += len(visible)
+        if self._hidden or self._pending_chars >= STREAM_RENDER_CHARS or time.monotonic() - self._last_render >= STREAM_RENDER_INTERVAL:
+            self._render(CURSOR)
+
+    def _render(self, suffix):
+        tail = "".join(self._tail_parts)
+        boundary = _stable_boundary(tail)
+        if boundary:
+            self._blocks.markdown(tail[:boundary])
+            tail = tail[boundary:]
+        self._tail_parts = [tail] if tail else []
+        self._tail.markdown(tail + suffix)
+        self._pending_chars = 0
+        self._last_render = time.monotonic()
+
+    def close(self):
+        """Último render (sin cursor). Retorna la respuesta íntegra."""
+        self._render("")
+        return "".join(self._parts)
+
 def render_chat_history(history, source_mode="chat"):
     """
     Renderiza el historial aplicando limpieza visual quirúrgica.
@@ -45,20 +118,16 @@ def handle_chat_interaction(prompt, response_generator_func, history_key, source
         st.markdown(prompt)
 
     with st.chat_message("assistant", avatar="✨"):
-        full_response = ""
-        placeholder = st.empty()
-        
         # El generador ya viene configurado para 8,192 tokens
         stream = response_generator_func()
         
         if stream:
+            # Durante el streaming, solo ocultamos el separador técnico |||
+            # para que el usuario no vea los metadatos
+            renderer = StreamingMarkdown()
             for chunk in stream:
-                full_response += chunk
-                
-                # Durante el streaming, solo ocultamos el separador técnico ||| 
-                # para que el usuario no vea los metadatos
-                clean_display = full_response.split('|||')[0]
-                placeholder.markdown(clean_display + "▌")
+                renderer.write(chunk)
+            full_response = renderer.close()
             
             # GUARDADO ÍNTEGRO: Crucial para el botón 'Ver Fuentes'
             st.session_state.mode_state[history_key].append({
@@ -1,11 +1,11 @@
 import streamlit as st
 import re
 import time
-from reporting.pdf_generator import generate_pdf_html
-from reporting.docx_generator import generate_docx
 from services.supabase_db import log_message_feedback
 from services.memory_service import save_project_insight
-from config import banner_file
+from services.export_jobs import get_export_jobs, FORMATS
+
+EXPORT_POLL_SECONDS = 1.0
 
 # --- VENTANA EMERGENTE (MODAL CON FILTRADO DE DUPLICADOS) ---
 @st.dialog("Documentación de Respaldo")
@@ -42,6 +42,45 @@ def show_sources_dialog(content):
     for cid in sorted(fuentes_unicas.keys(), key=int):
         st.markdown(f"**[{cid}]** 📄 {fuentes_unicas[cid]}")
 
+# --- EXPORTACIÓN BAJO DEMANDA ---
+def _export_slot(fmt, text, title, file_name, key, polling, button_kwargs):
+    jobs = get_export_jobs()
+    future = jobs.get(fmt, text, title)
+    label = FORMATS[fmt]["label"]
+
+    if future is None:
+        if st.button(f"Generar {label}", key=f"gen_{key}", **button_kwargs):
+            jobs.submit(fmt, text, title)
+            st.rerun()  # Rerun completo: el slot se vuelve a registrar con sondeo
+        return
+
+    if not future.done():
+        st.button(f"Generando {label}...", key=f"wait_{key}", disabled=True, **button_kwargs)
+        return
+
+    if polling:
+        st.rerun()  # Listo: un rerun completo deja de sondear y muestra la descarga
+
+    data = future.result()
+    if data is None:
+        if st.button(f"Reintentar {label}", key=f"retry_{key}", **button_kwargs):
+            jobs.submit(fmt, text, title)
+            st.rerun()
+        st.caption(f"No se pudo generar el {label}.")
+        return
+    st.download_button(f"Descargar {label}", data, file_name, mime=FORMATS[fmt]["mime"], key=key, **button_kwargs)
+
+def render_export_button(fmt, text, title, file_name, key, **button_kwargs):
+    """
+    Botón de exportación diferida: 'Generar' encola el documento en segundo
+    plano y, mientras se construye, solo este fragmento se refresca hasta que
+    aparece 'Descargar'. fmt: "pdf" | "docx".
+    """
+    future = get_export_jobs().get(fmt, text, title)
+    polling = future is not None and not future.done()
+    slot = st.fragment(_export_slot, run_every=EXPORT_POLL_SECONDS if polling else None)
+    slot(fmt, text, title, file_name, key, polling, button_kwargs)
+
 def render_final_actions(content, title, mode_key, on_reset_func):
     """Barra de acciones finales con limpieza para exportación."""
     if not content: return
@@ -84,14 +123,10 @@ def render_final_actions(content, title, mode_key, on_reset_func):
             show_sources_dialog(content)
     
     with col_pdf:
-        pdf_bytes = generate_pdf_html(clean_export_text, title=title, banner_path=banner_file)
-        if pdf_bytes:
-            st.download_button("Descargar PDF", pdf_bytes, f"{title}.pdf", use_container_width=True, key=f"p_{mode_key}")
+        render_export_button("pdf", clean_export_text, title, f"{title}.pdf", key=f"p_{mode_key}", use_container_width=True)
 
     with col_word:
-        docx_bytes = generate_docx(clean_export_text, title=title)
-        if docx_bytes:
-            st.download_button("Descargar Word", docx_bytes, f"{title}.docx", use_container_width=True, key=f"w_{mode_key}")
+        render_export_button("docx", clean_export_text, title, f"{title}.docx", key=f"w_{mode_key}", use_container_width=True)
 
     with col_reset:
         if st.button("Nueva Búsqueda", use_container_width=True, type="secondary", key=f"res_{mode_key}"):
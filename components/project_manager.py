@@ -3,6 +3,8 @@ import uuid
 import os
 import datetime
 from services.supabase_db import supabase
+from services.chunked_upload import upload_file, pending_upload_target
+from services.dataset_store import convert_excel_upload, dataset_paths
 
 PROJECT_BUCKET = "project_files"
 
@@ -33,14 +35,24 @@ def show_project_creator(user_id, plan_limit):
                 with st.spinner("Subiendo archivo..."):
                     try:
                         file_ext = os.path.splitext(uploaded_file.name)[1]
-                        path = f"{user_id}/{uuid.uuid4()}{file_ext}"
+                        # Mismo archivo que un intento fallido anterior: misma ruta y la subida se reanuda.
+                        # Si el archivo cambió, se borra lo que dejó el intento anterior
+                        path = pending_upload_target(
+                            st.session_state.mode_state, "da_pending_path", [uploaded_file],
+                            f"{user_id}/{uuid.uuid4()}{file_ext}",
+                            lambda old_path: supabase.storage.from_(PROJECT_BUCKET).remove(dataset_paths(old_path))
+                        )
                         
-                        supabase.storage.from_(PROJECT_BUCKET).upload(
-                            path, 
-                            uploaded_file.getvalue(), 
-                            {"content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+                        progress = st.progress(0.0)
+                        upload_file(
+                            uploaded_file, PROJECT_BUCKET, path,
+                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            progress_callback=lambda done, total: progress.progress(done / total if total else 1.0)
                         )
                         
+                        # Copia columnar para que las cargas no pasen por openpyxl
+                        convert_excel_upload(uploaded_file, PROJECT_BUCKET, path)
+                        
                         supabase.table("projects").insert({
                             "project_name": project_name, 
                             "project_brand": project_brand, 
@@ -49,6 +61,7 @@ def show_project_creator(user_id, plan_limit):
                             "user_id": user_id
                         }).execute()
                         
+                        st.session_state.mode_state.pop("da_pending_path", None)
                         st.success("¡Proyecto creado!")
                         st.rerun()
                     except Exception as e: 
@@ -79,7 +92,7 @@ def show_project_list(user_id):
                     
                 if c3.button("Eliminar", key=f"del_{p['id']}", width='stretch'):
                     try:
-                        supabase.storage.from_(PROJECT_BUCKET).remove([p['storage_path']])
+                        supabase.storage.from_(PROJECT_BUCKET).remove(dataset_paths(p['storage_path']))
                         supabase.table("projects").delete().eq("id", p['id']).execute()
                         st.success("Eliminado.")
                         st.rerun()
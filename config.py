@@ -22,6 +22,7 @@ PLAN_FEATURES = {
         "da_has_pivot_table": False,
         "da_has_correlation": False,
         "da_has_group_comparison": False,
+        "da_has_significance_scan": False,
         # --- ETNOCHAT ---
         "has_etnochat_analysis": True,
         "etnochat_project_limit": 1,
@@ -45,6 +46,7 @@ PLAN_FEATURES = {
         "da_has_pivot_table": True,
         "da_has_correlation": False,
         "da_has_group_comparison": False,
+        "da_has_significance_scan": False,
         # --- ETNOCHAT ---
         "has_etnochat_analysis": True,
         "etnochat_project_limit": 3,
@@ -68,6 +70,7 @@ PLAN_FEATURES = {
         "da_has_pivot_table": True,
         "da_has_correlation": True,
         "da_has_group_comparison": True,
+        "da_has_significance_scan": True,
         # --- ETNOCHAT ---
         "has_etnochat_analysis": True,
         "etnochat_project_limit": 10,
@@ -128,3 +131,7 @@ safety_settings = [
 # CONSTANTES GLOBALES
 # ==============================
 banner_file = "Banner (2).jpg"
+ppt_template_file = "Plantilla_PPT_ATL.pptx"
+
+# Carpeta local para cachés y colas persistentes (SQLite, artefactos en disco)
+LOCAL_CACHE_DIR = os.environ.get("ATELIER_CACHE_DIR", ".atelier_cache")
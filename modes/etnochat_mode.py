@@ -1,12 +1,8 @@
 import streamlit as st
-import docx
-import io
 import os  
 import uuid
 from datetime import datetime
 import re 
-from PIL import Image
-import fitz # PyMuPDF
 import gc # <--- NUEVO: Garbage Collector para gestión de memoria
 
 # --- IMPORTACIONES SERVICIOS ---
@@ -19,17 +15,25 @@ except ImportError:
     def call_gemini_api(p, generation_config_override=None): return None
 
 from services.supabase_db import log_query_event, supabase, get_daily_usage
-from prompts import get_etnochat_prompt, get_media_transcription_prompt 
+from prompts import get_etnochat_prompt
 import constants as c
-from config import banner_file
 from utils import reset_etnochat_chat_workflow, render_process_status
+from services.image_processing import ImageDeduplicator
+from services.media_store import store_media, load_media_part
+from services.extraction_cache import extract_text
+from services.chunk_index import retrieve_context
+from services.project_artifacts import ProjectArtifacts, file_fingerprint, is_artifact_file
+from services.chunked_upload import upload_file, pending_upload_target, remove_storage_folder
+from services.transcription_queue import (
+    enqueue_transcription, get_transcription_status, discard_transcriptions,
+    STATUS_DONE, STATUS_ERROR, TRANSCRIPT_SUFFIX
+)
 
 # --- IMPORTACIONES UI UNIFICADA ---
 from components.chat_interface import render_chat_history, handle_chat_interaction
 
-# --- GENERADORES ---
-from reporting.pdf_generator import generate_pdf_html
-from reporting.docx_generator import generate_docx
+# --- EXPORTACIÓN (PDF / WORD BAJO DEMANDA) ---
+from components.export_utils import render_export_button
 
 # =====================================================
 # MODO: ANÁLISIS DE ETNOCHAT (OPTIMIZADO V2)
@@ -52,130 +56,131 @@ MIME_TYPES = {
 }
 ALLOWED_EXTENSIONS = list(MIME_TYPES.keys())
 
+def is_media_file(file_ext):
+    """True para audio/video (archivos que requieren transcripción)."""
+    mime = MIME_TYPES.get(file_ext, "")
+    return mime.startswith("audio") or mime.startswith("video")
+
 # --- Funciones de Carga de Datos (Optimized Memory Usage) ---
 
 @st.cache_data(ttl=600, show_spinner=False)
 def load_etnochat_project_data(storage_folder_path: str):
     """
-    Descarga archivos con gestión estricta de memoria.
-    Prioriza transcripciones existentes para evitar descargas pesadas.
+    Retorna los artefactos del proyecto (dict) al día con los archivos en Storage.
+    Solo se descargan los archivos nuevos o modificados (y de audio/video
+    únicamente su transcripción); el resto sale del bundle de artefactos.
     """
     if not storage_folder_path:
         st.error("Error: Ruta de proyecto vacía.")
-        return None, None
+        return None
         
-    text_context_parts = []
-    file_parts = [] # Solo imágenes
+    image_dedup = ImageDeduplicator()
     
     try:
         # 1. Listar archivos
         files_list = supabase.storage.from_(ETNOCHAT_BUCKET).list(storage_folder_path)
+        artifacts = ProjectArtifacts.load(ETNOCHAT_BUCKET, storage_folder_path, files_list)
+        files_list = [f for f in (files_list or []) if not is_artifact_file(f['name'])]
         if not files_list:
             st.warning("El proyecto está vacío.")
-            return "", []
+            return artifacts.data
 
         # Mapa de archivos existentes para búsqueda rápida O(1)
-        existing_filenames = {f['name'] for f in files_list}
-
-        st.write(f"Procesando {len(files_list)} archivo(s)...")
-        progress_bar = st.progress(0)
-        total_files = len(files_list)
+        files_by_name = {f['name']: f for f in files_list}
 
-        for i, file_info in enumerate(files_list):
+        # 2. Huella de cada fuente (audio/video: la de su transcripción) y lo que cambió
+        fingerprints = {}
+        for file_info in files_list:
             file_name = file_info['name']
             
             # Si es un archivo de transcripción, lo saltamos aquí (se carga asociado a su media o solo)
             # Pero si es un txt suelto que NO es transcripción automática, lo procesamos.
-            if file_name.endswith("_transcript.txt"):
+            if file_name.endswith(TRANSCRIPT_SUFFIX):
                 # Verificamos si es huérfano (si no existe el audio original)
-                original_media = file_name.replace("_transcript.txt", "")
-                has_original = any(original_media in f for f in existing_filenames)
-                if has_original:
-                    progress_bar.progress((i + 1) / total_files)
-                    continue 
+                original_media = file_name.replace(TRANSCRIPT_SUFFIX, "")
+                if original_media in files_by_name: continue
+
+            file_ext = os.path.splitext(file_name)[1].lower()
+            if is_media_file(file_ext):
+                transcript_info = files_by_name.get(f"{file_name}{TRANSCRIPT_SUFFIX}")
+                if not transcript_info:
+                    # No existe: la delegamos a la cola en segundo plano y seguimos.
+                    # El analizador abre de inmediato con lo que ya está listo.
+                    enqueue_transcription(ETNOCHAT_BUCKET, storage_folder_path, file_name, MIME_TYPES[file_ext])
+                    continue
+                fingerprints[file_name] = file_fingerprint(transcript_info)
+            else:
+                fingerprints[file_name] = file_fingerprint(file_info)
+
+        artifacts.prune(fingerprints)
+        to_process = []
+        for file_name, fingerprint in fingerprints.items():
+            entry = artifacts.get_entry(file_name, fingerprint)
+            if entry is None:
+                to_process.append(file_name)
+                continue
+            # Imágenes ya guardadas: cuentan para descartar duplicados nuevos
+            for handle in entry["media"]: image_dedup.remember(handle["key"], handle["source"])
 
+        st.write(f"{len(fingerprints) - len(to_process)} archivo(s) sin cambios, procesando {len(to_process)}...")
+        progress_bar = st.progress(0)
+        total_files = len(to_process)
+
+        for i, file_name in enumerate(to_process):
             full_file_path = f"{storage_folder_path}/{file_name}"
             file_ext = os.path.splitext(file_name)[1].lower()
             
             try:
                 # --- LÓGICA DE AUDIO/VIDEO (OPTIMIZACIÓN MAYOR) ---
-                if file_ext in MIME_TYPES and ("audio" in MIME_TYPES[file_ext] or "video" in MIME_TYPES[file_ext]):
-                    transcript_filename = f"{file_name}_transcript.txt"
-                    transcript_full_path = f"{storage_folder_path}/{transcript_filename}"
+                if is_media_file(file_ext):
+                    # ¡OPTIMIZACIÓN! Descargamos SOLO el TXT (Kb), no el Video (Mb/Gb)
+                    trans_bytes = supabase.storage.from_(ETNOCHAT_BUCKET).download(f"{full_file_path}{TRANSCRIPT_SUFFIX}")
+                    transcript_text = trans_bytes.decode('utf-8')
+                    artifacts.put_entry(file_name, fingerprints[file_name],
+                                        [{"source": file_name, "kind": "transcript", "content": transcript_text}])
                     
-                    # 1. ¿Existe ya la transcripción?
-                    if transcript_filename in existing_filenames:
-                        # ¡OPTIMIZACIÓN! Descargamos SOLO el TXT (Kb), no el Video (Mb/Gb)
-                        trans_bytes = supabase.storage.from_(ETNOCHAT_BUCKET).download(transcript_full_path)
-                        transcript_text = trans_bytes.decode('utf-8')
-                        text_context_parts.append(f"\n\n--- TRANSCRIPCIÓN DE {file_name} ---\n{transcript_text}\n")
-                        
-                        # Liberar memoria explícitamente
-                        del trans_bytes
-                        gc.collect()
-                        
-                    else:
-                        # 2. No existe, toca descargar y transcribir (Costoso pero necesario una vez)
-                        with st.spinner(f"Transcribiendo {file_name}... (Esto tomará unos segundos)"):
-                            response_bytes = supabase.storage.from_(ETNOCHAT_BUCKET).download(full_file_path)
-                            media_data = {"mime_type": MIME_TYPES[file_ext], "data": response_bytes}
-                            prompt_transcribe = get_media_transcription_prompt()
-                            
-                            generated_transcript = call_gemini_api([prompt_transcribe, media_data], generation_config_override={"max_output_tokens": 8192})
-                            
-                            if generated_transcript:
-                                text_context_parts.append(f"\n\n--- TRANSCRIPCIÓN AUTOMÁTICA DE {file_name} ---\n{generated_transcript}\n")
-                                # Guardar para el futuro
-                                try:
-                                    supabase.storage.from_(ETNOCHAT_BUCKET).upload(
-                                        path=transcript_full_path,
-                                        file=generated_transcript.encode('utf-8'),
-                                        file_options={"content-type": "text/plain"}
-                                    )
-                                except: pass
-                            
-                            # LIMPIEZA CRÍTICA DE MEMORIA
-                            del response_bytes
-                            del media_data
-                            gc.collect()
+                    # Liberar memoria explícitamente
+                    del trans_bytes
+                    gc.collect()
 
                 # --- LÓGICA DE IMÁGENES ---
                 elif file_ext in [".jpg", ".jpeg", ".png"]:
-                    # Descargamos
+                    # Descargamos y normalizamos (lado máximo, sin EXIF, JPEG eficiente)
                     response_bytes = supabase.storage.from_(ETNOCHAT_BUCKET).download(full_file_path)
-                    file_stream = io.BytesIO(response_bytes)
-                    img = Image.open(file_stream)
-                    file_parts.append(img)
-                    text_context_parts.append(f"[Imagen cargada: {file_name}]")
-                    # No borramos img porque se necesita para el prompt, pero borramos el buffer binario
+                    image_part, duplicate_of = image_dedup.add(response_bytes, file_name)
+                    if image_part:
+                        # Los bytes van al almacén en disco; en caché solo queda el handle
+                        handle = store_media(
+                            image_part["data"], image_part["mime_type"], file_name,
+                            origin={"bucket": ETNOCHAT_BUCKET, "path": full_file_path}
+                        )
+                        del image_part
+                        artifacts.put_entry(file_name, fingerprints[file_name],
+                                            [{"source": file_name, "kind": "image", "content": f"[Imagen cargada: {file_name}]"}],
+                                            media=[handle])
+                    else:
+                        artifacts.put_entry(file_name, fingerprints[file_name],
+                                            [{"source": file_name, "kind": "image", "content": f"[Imagen {file_name}: idéntica a {duplicate_of}]"}])
+                    # Solo conservamos la versión reducida
                     del response_bytes
                     gc.collect()
 
                 # --- DOCUMENTOS DE TEXTO ---
                 else:
                     response_bytes = supabase.storage.from_(ETNOCHAT_BUCKET).download(full_file_path)
-                    file_stream = io.BytesIO(response_bytes)
-                    
-                    header = f"\n\n--- DOC: {file_name} ---\n"
-                    footer = "\n----------------------\n"
+                    text = None
                     
                     if file_ext == ".txt":
-                        text = file_stream.read().decode('utf-8')
-                        text_context_parts.append(f"{header}{text}{footer}")
+                        text = response_bytes.decode('utf-8')
+                    
+                    elif file_ext in (".pdf", ".docx"):
+                        # Caché compartida por hash (evita re-parsear con PyMuPDF/python-docx)
+                        text = extract_text(response_bytes, file_ext)
                     
-                    elif file_ext == ".pdf":
-                        pdf_doc = fitz.open(stream=file_stream, filetype="pdf")
-                        text = "".join(page.get_text() for page in pdf_doc)
-                        pdf_doc.close()
-                        text_context_parts.append(f"{header}{text}{footer}")
-
-                    elif file_ext == ".docx":
-                        document = docx.Document(file_stream)
-                        text = "\n".join([para.text for para in document.paragraphs if para.text.strip()])
-                        text_context_parts.append(f"{header}{text}{footer}")
+                    docs = [{"source": file_name, "kind": "document", "content": text}] if text else []
+                    artifacts.put_entry(file_name, fingerprints[file_name], docs)
                     
                     del response_bytes
-                    del file_stream
                     gc.collect()
 
             except Exception as e_file:
@@ -185,12 +190,13 @@ def load_etnochat_project_data(storage_folder_path: str):
             progress_bar.progress((i + 1) / total_files)
         
         progress_bar.empty()
-        combined_text_context = "\n".join(text_context_parts)
-        return combined_text_context, file_parts
+        artifacts.chunk_index()
+        artifacts.save()
+        return artifacts.data
         
     except Exception as e:
         st.error(f"Error crítico cargando proyecto: {e}")
-        return None, None
+        return None
 
 # --- Funciones de UI ---
 
@@ -225,7 +231,12 @@ def show_etnochat_project_creator(user_id, project_limit, files_per_project_limi
                 st.error(f"Demasiados archivos. Máximo: {int(files_per_project_limit)}.")
                 return
 
-            project_storage_folder = f"{user_id}/{uuid.uuid4()}" 
+            # Si un intento anterior falló a mitad con los mismos archivos, reutilizamos la carpeta
+            # para reanudar las subidas; si los archivos cambiaron, se borra lo que dejó subido
+            project_storage_folder = pending_upload_target(
+                st.session_state.mode_state, "etno_pending_folder", uploaded_files,
+                f"{user_id}/{uuid.uuid4()}", _discard_project_folder
+            )
             
             with render_process_status("Subiendo archivos...", expanded=True) as status:
                 try:
@@ -240,18 +251,19 @@ def show_etnochat_project_creator(user_id, project_limit, files_per_project_limi
                         
                         path = f"{project_storage_folder}/{safe_name}"
                         
-                        # Subida optimizada
-                        file_bytes = uploaded_file.getvalue()
-                        supabase.storage.from_(ETNOCHAT_BUCKET).upload(
-                            path=path,
-                            file=file_bytes,
-                            file_options={"content-type": MIME_TYPES.get(file_ext, "application/octet-stream")}
+                        # Subida por partes desde el handle (sin materializar el archivo completo)
+                        progress = status.progress(0.0)
+                        upload_file(
+                            uploaded_file, ETNOCHAT_BUCKET, path,
+                            MIME_TYPES.get(file_ext, "application/octet-stream"),
+                            progress_callback=lambda done, total: progress.progress(done / total if total else 1.0)
                         )
-                        
-                        # Liberar memoria local
-                        del file_bytes
                         gc.collect()
 
+                        # La transcripción arranca ya, en segundo plano
+                        if is_media_file(file_ext):
+                            enqueue_transcription(ETNOCHAT_BUCKET, project_storage_folder, safe_name, MIME_TYPES[file_ext])
+
                     supabase.table("etnochat_projects").insert({
                         "project_name": project_name,
                         "project_brand": project_brand,
@@ -260,6 +272,7 @@ def show_etnochat_project_creator(user_id, project_limit, files_per_project_limi
                         "user_id": user_id
                     }).execute()
                     
+                    st.session_state.mode_state.pop("etno_pending_folder", None)
                     status.update(label="¡Proyecto Creado!", state="complete", expanded=False)
                     st.success("Proyecto creado exitosamente.")
                     st.rerun()
@@ -268,6 +281,10 @@ def show_etnochat_project_creator(user_id, project_limit, files_per_project_limi
                     status.update(label="Error", state="error")
                     st.error(f"Error: {e}")
 
+def _discard_project_folder(folder):
+    discard_transcriptions(ETNOCHAT_BUCKET, folder)
+    remove_storage_folder(ETNOCHAT_BUCKET, folder)
+
 def show_etnochat_project_list(user_id):
     st.subheader("Mis Proyectos EtnoChat")
     try:
@@ -289,12 +306,9 @@ def show_etnochat_project_list(user_id):
                     
                 if c3.button("Borrar", key=f"btn_borrar_{proj['id']}", width='stretch'):
                     try:
-                        # Limpieza profunda en Storage
+                        # Limpieza profunda: transcripciones en cola y archivos en Storage
                         if proj['storage_path']:
-                            files = supabase.storage.from_(ETNOCHAT_BUCKET).list(proj['storage_path'])
-                            if files:
-                                paths = [f"{proj['storage_path']}/{f['name']}" for f in files]
-                                supabase.storage.from_(ETNOCHAT_BUCKET).remove(paths)
+                            _discard_project_folder(proj['storage_path'])
                         
                         supabase.table("etnochat_projects").delete().eq("id", proj['id']).execute()
                         st.success("Eliminado.")
@@ -302,14 +316,36 @@ def show_etnochat_project_list(user_id):
                     except Exception as e: st.error(f"Error eliminando: {e}")
     except: st.error("Error cargando lista.")
 
+def render_transcription_status(storage_folder_path):
+    """Panel con el estado por archivo de las transcripciones en segundo plano."""
+    jobs = get_transcription_status(ETNOCHAT_BUCKET, storage_folder_path)
+    if not jobs: return
+
+    pending = [name for name, job in jobs.items() if job["status"] not in (STATUS_DONE, STATUS_ERROR)]
+    label = f"Transcripciones: {len(jobs) - len(pending)}/{len(jobs)} listas"
+    with st.expander(label, expanded=bool(pending)):
+        icons = {STATUS_DONE: "✅", STATUS_ERROR: "❌"}
+        for name, job in jobs.items():
+            icon = icons.get(job["status"], "⏳")
+            detail = f" — {job['last_error'][:120]}" if job["status"] == STATUS_ERROR and job.get("last_error") else ""
+            st.caption(f"{icon} {name}: {job['status']}{detail}")
+
+        if pending:
+            st.info("El análisis usa solo las transcripciones listas. Recarga cuando terminen las pendientes.")
+            if st.button("Recargar transcripciones", key="etno_reload_transcripts"):
+                load_etnochat_project_data.clear(storage_folder_path)
+                st.session_state.mode_state.pop("etno_file_parts", None)
+                st.rerun()
+
 # --- ANALIZADOR PRINCIPAL (UI UNIFICADA) ---
 
-def show_etnochat_project_analyzer(text_context, file_parts, project_name):
+def show_etnochat_project_analyzer(chunk_index, file_parts, project_name):
     st.markdown(f"### Analizando: **{project_name}**")
     if st.button("← Volver"): 
         st.session_state.mode_state = {}
         st.rerun()
         
+    render_transcription_status(st.session_state.mode_state.get("etno_storage_path"))
     st.divider()
     
     # 1. INICIALIZAR HISTORIAL
@@ -335,14 +371,26 @@ def show_etnochat_project_analyzer(text_context, file_parts, project_name):
                 status.write("Procesando contexto visual y textual...")
                 
                 # Contexto Histórico
-                history_str = "\n".join(f"{m['role']}: {m['content']}" for m in st.session_state.mode_state["etno_chat_history"][-6:])
+                recent_history = st.session_state.mode_state["etno_chat_history"][-6:]
+                history_str = "\n".join(f"{m['role']}: {m['content']}" for m in recent_history)
+                previous_questions = " ".join(m['content'] for m in recent_history if m['role'] == "user")
+                
+                # Recuperación: solo los fragmentos relevantes y las imágenes vinculadas a ellos
+                text_context, linked_images = retrieve_context(
+                    chunk_index, user_prompt, history=previous_questions,
+                    image_sources=[p["source"] for p in file_parts]
+                )
+                # Los bytes se leen del disco solo ahora, al armar el prompt
+                image_parts = [load_media_part(h) for h in file_parts if h["source"] in linked_images]
+                image_parts = [p for p in image_parts if p]
+                status.write(f"Contexto seleccionado: ~{len(text_context) // 4:,} tokens y {len(image_parts)} imagen(es).")
                 
                 # Prompt Compuesto
                 prompt_text = get_etnochat_prompt(history_str, text_context)
                 
-                # Payload: Texto Prompt + Imágenes (file_parts)
+                # Payload: Texto Prompt + Imágenes vinculadas
                 # Nota: Gemini procesa texto e imágenes en la misma lista
-                final_payload = [prompt_text] + file_parts + [f"\nUsuario: {user_prompt}"]
+                final_payload = [prompt_text] + image_parts + [f"\nUsuario: {user_prompt}"]
                 
                 status.write("Consultando motor Gemini...")
                 stream = call_gemini_stream(final_payload)
@@ -373,12 +421,10 @@ def show_etnochat_project_analyzer(text_context, file_parts, project_name):
         raw_text += "\n\n".join(f"**{m['role'].upper()}:** {m['content']}" for m in st.session_state.mode_state["etno_chat_history"])
         
         with c1:
-            pdf = generate_pdf_html(raw_text.replace("](#)", "]"), title=f"EtnoChat - {project_name}", banner_path=banner_file)
-            if pdf: st.download_button("Descargar PDF", data=pdf, file_name="etno_reporte.pdf", mime="application/pdf", width='stretch')
+            render_export_button("pdf", raw_text.replace("](#)", "]"), f"EtnoChat - {project_name}", "etno_reporte.pdf", key="etno_export_pdf", width='stretch')
         
         with c2:
-            docx = generate_docx(raw_text, title=f"EtnoChat - {project_name}")
-            if docx: st.download_button("Descargar Word", data=docx, file_name="etno_reporte.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", width='stretch', type="primary")
+            render_export_button("docx", raw_text, f"EtnoChat - {project_name}", "etno_reporte.docx", key="etno_export_docx", width='stretch', type="primary")
 
         with c3: 
             st.button("Reiniciar", on_click=reset_etnochat_chat_workflow, key="rst_etno", width='stretch')
@@ -397,19 +443,20 @@ def etnochat_mode():
     # 1. Cargar datos (si aplica)
     if "etno_selected_project_id" in st.session_state.mode_state and "etno_file_parts" not in st.session_state.mode_state:
         with render_process_status("Cargando proyecto (optimizando memoria)...", expanded=True) as status:
-            text_ctx, file_parts = load_etnochat_project_data(st.session_state.mode_state["etno_storage_path"]) 
+            data = load_etnochat_project_data(st.session_state.mode_state["etno_storage_path"]) 
             status.update(label="Carga completa", state="complete", expanded=False)
 
-        if text_ctx is not None:
-            st.session_state.mode_state["etno_context_str"] = text_ctx
-            st.session_state.mode_state["etno_file_parts"] = file_parts
+        if data is not None:
+            artifacts = ProjectArtifacts(ETNOCHAT_BUCKET, st.session_state.mode_state["etno_storage_path"], data)
+            st.session_state.mode_state["etno_chunk_index"] = artifacts.chunk_index()
+            st.session_state.mode_state["etno_file_parts"] = artifacts.media()
         else:
             st.session_state.mode_state.pop("etno_selected_project_id", None)
 
     # 2. Router de Vistas
     if "etno_file_parts" in st.session_state.mode_state:
         show_etnochat_project_analyzer( 
-            st.session_state.mode_state["etno_context_str"],
+            st.session_state.mode_state["etno_chunk_index"],
             st.session_state.mode_state["etno_file_parts"],
             st.session_state.mode_state["etno_selected_project_name"]
         )
@@ -1,6 +1,4 @@
 import streamlit as st
-from PIL import Image
-from io import BytesIO
 import time
 import constants as c
 
@@ -10,6 +8,7 @@ from services.gemini_api import call_gemini_stream
 from services.supabase_db import log_query_event
 from config import banner_file
 from prompts import get_image_eval_prompt_parts
+from services.image_processing import normalize_image, as_gemini_part
 
 # --- COMPONENTES UNIFICADOS ---
 from components.chat_interface import render_chat_history
@@ -60,9 +59,9 @@ def image_evaluation_mode(db, selected_files):
             prompt_parts = get_image_eval_prompt_parts(target_audience, comm_objectives, relevant_text_context)
             
             try:
-                img_obj = Image.open(BytesIO(image_bytes))
+                image_part = normalize_image(image_bytes)
                 prompt_parts.append("\n\n**Imagen para evaluar:**")
-                prompt_parts.append(img_obj)
+                prompt_parts.append(as_gemini_part(image_part))
                 
                 stream = call_gemini_stream(prompt_parts)
                 
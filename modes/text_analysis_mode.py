@@ -1,52 +1,65 @@
 import streamlit as st
-import docx
-import io
 import os  
 import uuid
 from datetime import datetime
 import re 
-from services.gemini_api import call_gemini_api, call_gemini_stream 
+from services.gemini_api import call_gemini_stream 
 from services.supabase_db import log_query_event, supabase, get_daily_usage
-from prompts import get_transcript_prompt, get_text_analysis_summary_prompt
+from prompts import get_transcript_prompt
 import constants as c
-from config import banner_file
 from utils import reset_transcript_chat_workflow, render_process_status
+from services.extraction_cache import extract_text
+from services.chunked_upload import upload_file, pending_upload_target, remove_storage_folder
+from services.chunk_index import retrieve_context
+from services.project_artifacts import ProjectArtifacts, file_fingerprint
+from services.document_summaries import summarize_documents, reduce_summaries, render_summaries, project_summary_key
 
 # --- COMPONENTE UNIFICADO ---
 from components.chat_interface import render_chat_history, handle_chat_interaction
 
-# --- GENERADORES ---
-from reporting.pdf_generator import generate_pdf_html
-from reporting.docx_generator import generate_docx
+# --- EXPORTACIÓN (PDF / WORD BAJO DEMANDA) ---
+from components.export_utils import render_export_button
 
 # =====================================================
 # MODO: ANÁLISIS DE TEXTOS (VISUALMENTE MEJORADO)
 # =====================================================
 
 TEXT_PROJECT_BUCKET = "text_project_files"
+CHAT_PASSAGES_TOKEN_BUDGET = 20000
 
-# --- Funciones de Carga (Sin cambios) ---
+# --- Funciones de Carga ---
 @st.cache_data(ttl=600, show_spinner=False)
 def load_text_project_data(storage_folder_path: str):
+    """
+    Retorna los artefactos del proyecto (dict) al día con los .docx en Storage.
+    Solo se descargan y extraen los archivos nuevos o modificados.
+    """
     if not storage_folder_path:
-        st.error("Error: Ruta vacía."); return []
-    documents_list = [] 
+        st.error("Error: Ruta vacía."); return None
     try:
         files_list = supabase.storage.from_(TEXT_PROJECT_BUCKET).list(storage_folder_path)
-        if not files_list: st.warning("Proyecto vacío."); return []
+        if not files_list: st.warning("Proyecto vacío."); return None
         docx_files = [f for f in files_list if f['name'].endswith('.docx')]
         
-        st.write(f"Cargando {len(docx_files)} archivo(s)...")
-        for file_info in docx_files:
+        artifacts = ProjectArtifacts.load(TEXT_PROJECT_BUCKET, storage_folder_path, files_list)
+        artifacts.purge_legacy_files(files_list)
+        artifacts.prune(f['name'] for f in docx_files)
+        to_process = [f for f in docx_files if not artifacts.get_entry(f['name'], file_fingerprint(f))]
+        
+        st.write(f"{len(docx_files) - len(to_process)} archivo(s) sin cambios, cargando {len(to_process)}...")
+        for file_info in to_process:
             full_file_path = f"{storage_folder_path}/{file_info['name']}"
             try:
                 res = supabase.storage.from_(TEXT_PROJECT_BUCKET).download(full_file_path)
-                doc = docx.Document(io.BytesIO(res))
-                text = "\n".join([p.text for p in doc.paragraphs if p.text.strip()])
-                if text: documents_list.append({'source': file_info['name'], 'content': text})
+                text = extract_text(res, ".docx")
+                docs = [{'source': file_info['name'], 'kind': 'document', 'content': text}] if text else []
+                artifacts.put_entry(file_info['name'], file_fingerprint(file_info), docs)
             except Exception as e: st.error(f"Error en '{file_info['name']}': {e}"); continue 
-        return documents_list
-    except Exception as e: st.error(f"Error carga: {e}"); return []
+        
+        artifacts.chunk_index()
+        artifacts.save()
+        return artifacts.data
+    except Exception as e: st.error(f"Error carga: {e}"); return None
 
 # --- Funciones de UI ---
 def show_text_project_creator(user_id, plan_limit):
@@ -65,16 +78,22 @@ def show_text_project_creator(user_id, plan_limit):
         if st.form_submit_button("Crear Proyecto"):
             if not all([p_name, p_brand, u_files]): st.warning("Completa campos."); return
             
-            p_folder = f"{user_id}/{uuid.uuid4()}"
+            # Reutilizamos la carpeta de un intento fallido con los mismos archivos para reanudar;
+            # si los archivos cambiaron, se borra lo que dejó subido
+            p_folder = pending_upload_target(
+                st.session_state.mode_state, "ta_pending_folder", u_files, f"{user_id}/{uuid.uuid4()}",
+                lambda folder: remove_storage_folder(TEXT_PROJECT_BUCKET, folder)
+            )
             
             with render_process_status("Subiendo archivos al repositorio...", expanded=True) as status:
                 try:
                     for idx, f in enumerate(u_files):
                         status.write(f"Procesando {idx+1}/{len(u_files)}: {f.name}")
                         safe_name = re.sub(r'[^\w._-]', '', f.name.replace(' ', '_'))
-                        supabase.storage.from_(TEXT_PROJECT_BUCKET).upload(f"{p_folder}/{safe_name}", f.getvalue(), {"content-type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"})
+                        upload_file(f, TEXT_PROJECT_BUCKET, f"{p_folder}/{safe_name}", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
                     
                     supabase.table("text_projects").insert({"project_name": p_name, "project_brand": p_brand, "project_year": int(p_year), "storage_path": p_folder, "user_id": user_id}).execute()
+                    st.session_state.mode_state.pop("ta_pending_folder", None)
                     status.update(label="¡Proyecto creado!", state="complete", expanded=False)
                     st.success("Proyecto creado!"); st.rerun()
                 except Exception as e: 
@@ -104,15 +123,14 @@ def show_text_project_list(user_id):
 
 # --- ANALIZADOR (VISUALMENTE MEJORADO) ---
 
-def show_text_project_analyzer(summary_context, project_name, documents_list):
+def show_text_project_analyzer(summary_context, project_name, chunk_index, doc_summaries, doc_stats):
     st.markdown(f"### Análisis de Transcripciones: **{project_name}**")
+    st.caption(f"{len(doc_stats)} documento(s) · {sum(s['words'] for s in doc_stats.values()):,} palabras")
     if st.button("← Volver"): st.session_state.mode_state = {}; st.rerun()
     st.divider()
     
-    # Preparar contexto documental
-    all_docs_text = "\n".join([f"--- DOCUMENTO {i+1} (Archivo: {d['source']}) ---\n{d['content']}" for i, d in enumerate(documents_list)])
-    if len(all_docs_text) > 200000: 
-        all_docs_text = all_docs_text[:200000] + "\n...(texto truncado por seguridad)"
+    # Contexto fijo: resúmenes por documento (los pasajes se recuperan por pregunta)
+    summaries_text = render_summaries(doc_summaries)
     
     # 1. RENDERIZAR HISTORIAL
     render_chat_history(st.session_state.mode_state.get("transcript_chat_history", []), source_mode="text_analysis")
@@ -142,15 +160,18 @@ def show_text_project_analyzer(summary_context, project_name, documents_list):
                 recent_history = st.session_state.mode_state["transcript_chat_history"][-3:]
                 history_context = "\n".join([f"{m['role'].upper()}: {m['content']}" for m in recent_history])
 
-                # Paso 2: Prompt
+                # Paso 2: Pasajes relevantes + Prompt
                 status.write("Detectando patrones y citas...")
+                passages, _ = retrieve_context(chunk_index, user_prompt, history=history_context,
+                                               token_budget=CHAT_PASSAGES_TOKEN_BUDGET)
                 format_instruction = (
                     "\n\n[INSTRUCCIÓN CRÍTICA: Usa referencias [1], [2] inmediatamente después de las citas. "
                     "NO repitas el texto de la cita dentro del corchete.]"
                 )
                 
                 final_context = (
-                    f"--- INFORMACIÓN (FUENTES) ---\n{all_docs_text}\n\n"
+                    f"--- RESÚMENES POR DOCUMENTO ---\n{summaries_text}\n\n"
+                    f"--- INFORMACIÓN (FUENTES) ---\n{passages}\n\n"
                     f"--- HISTORIAL RECIENTE ---\n{history_context}\n\n"
                     f"--- CONTEXTO ---\n{summary_context}\n"
                     f"{format_instruction}"
@@ -206,12 +227,10 @@ def show_text_project_analyzer(summary_context, project_name, documents_list):
         raw_text += "\n\n".join(f"**{m['role'].upper()}:** {m['content']}" for m in st.session_state.mode_state["transcript_chat_history"])
         
         with c1:
-            pdf = generate_pdf_html(raw_text, title=f"Reporte - {project_name}", banner_path=banner_file)
-            if pdf: st.download_button("Descargar PDF", data=pdf, file_name="analisis.pdf", mime="application/pdf", width='stretch')
+            render_export_button("pdf", raw_text, f"Reporte - {project_name}", "analisis.pdf", key="ta_export_pdf", width='stretch')
         
         with c2:
-            docx = generate_docx(raw_text, title=f"Reporte - {project_name}")
-            if docx: st.download_button("Descargar Word", data=docx, file_name="analisis.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", width='stretch', type="primary")
+            render_export_button("docx", raw_text, f"Reporte - {project_name}", "analisis.docx", key="ta_export_docx", width='stretch', type="primary")
         
         with c3:
             st.button("Reiniciar", on_click=reset_transcript_chat_workflow, key="rst_chat", width='stretch')
@@ -221,29 +240,51 @@ def text_analysis_mode():
     uid = st.session_state.user_id
     limit = st.session_state.plan_features.get('transcript_file_limit', 0)
 
-    if "ta_selected_project_id" in st.session_state.mode_state and "ta_documents_list" not in st.session_state.mode_state:
+    if "ta_selected_project_id" in st.session_state.mode_state and "ta_artifacts" not in st.session_state.mode_state:
         # Aquí también usamos el status box para la carga
         with render_process_status("Cargando corpus documental...", expanded=True) as status:
-            docs = load_text_project_data(st.session_state.mode_state["ta_storage_path"]) 
+            data = load_text_project_data(st.session_state.mode_state["ta_storage_path"]) 
             status.update(label="Archivos cargados", state="complete", expanded=False)
             
-        if docs: st.session_state.mode_state["ta_documents_list"] = docs
+        if data and ProjectArtifacts(TEXT_PROJECT_BUCKET, st.session_state.mode_state["ta_storage_path"], data).documents():
+            st.session_state.mode_state["ta_artifacts"] = data
         else: st.session_state.mode_state.pop("ta_selected_project_id")
 
-    if "ta_documents_list" in st.session_state.mode_state and "ta_summary_context" not in st.session_state.mode_state:
+    if "ta_artifacts" in st.session_state.mode_state and "ta_summary_context" not in st.session_state.mode_state:
+        artifacts = ProjectArtifacts(TEXT_PROJECT_BUCKET, st.session_state.mode_state["ta_storage_path"], st.session_state.mode_state["ta_artifacts"])
         with render_process_status("Generando resumen ejecutivo inicial...", expanded=True) as status:
-            docs = st.session_state.mode_state["ta_documents_list"]
-            summ_in = "".join([f"\nDoc: {d['source']}\n{d['content'][:3000]}\n..." for d in docs])
-            summ = call_gemini_api(get_text_analysis_summary_prompt(summ_in), generation_config_override={"max_output_tokens": 8192})
+            # Map: resumen por documento en paralelo (reutiliza los guardados en los artefactos)
+            summaries, summaries_by_key = summarize_documents(
+                artifacts.documents(), cached=artifacts.summaries,
+                progress_callback=lambda done, total, source: status.write(f"Resumen {done}/{total}: {source}")
+            )
+            artifacts.set_summaries(summaries_by_key)
+            
+            # Reduce: informe del proyecto a partir de los resúmenes
+            summary_key = project_summary_key(summaries_by_key)
+            summ = artifacts.get_project_summary(summary_key)
+            if not summ:
+                status.write("Integrando hallazgos del proyecto...")
+                summ = reduce_summaries(summaries)
+                if summ: artifacts.set_project_summary(summary_key, summ)
+            
+            # La próxima apertura lee todo de los artefactos
+            if artifacts.save(): load_text_project_data.clear(artifacts.storage_folder)
             status.update(label="Resumen listo", state="complete", expanded=False)
             
-        if summ: st.session_state.mode_state["ta_summary_context"] = summ; st.rerun()
+        if summ:
+            st.session_state.mode_state["ta_doc_summaries"] = summaries
+            st.session_state.mode_state["ta_chunk_index"] = artifacts.chunk_index()
+            st.session_state.mode_state["ta_doc_stats"] = artifacts.stats()
+            st.session_state.mode_state["ta_summary_context"] = summ; st.rerun()
 
     if "ta_summary_context" in st.session_state.mode_state:
         show_text_project_analyzer(
             st.session_state.mode_state["ta_summary_context"],
             st.session_state.mode_state["ta_selected_project_name"],
-            st.session_state.mode_state["ta_documents_list"]
+            st.session_state.mode_state["ta_chunk_index"],
+            st.session_state.mode_state["ta_doc_summaries"],
+            st.session_state.mode_state["ta_doc_stats"]
         )
     elif "ta_selected_project_id" in st.session_state.mode_state:
         st.info("Iniciando...")
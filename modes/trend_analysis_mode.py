@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from pytrends.request import TrendReq
 from services.gemini_api import call_gemini_stream, call_gemini_api
 from utils import render_process_status
 from prompts import get_trend_synthesis_prompt
+from services.trends_service import get_trends
+from services.search_index import get_repository_index, repository_fingerprint
 import random
 import json
 
@@ -19,7 +20,8 @@ import constants as c
 def smart_internal_search(db, keyword):
     """
     1. Expande la keyword usando IA (Sinónimos/Categorías).
-    2. Busca en el repositorio fragmentos que coincidan con CUALQUIERA de los términos.
+    2. Busca en el índice del repositorio los documentos que contienen CUALQUIERA de
+       los términos y toma la ventana con más coincidencias como fragmento.
     3. Retorna un contexto denso y relevante.
     """
     # 1. Expansión Semántica
@@ -33,48 +35,9 @@ def smart_internal_search(db, keyword):
     search_terms = [keyword.lower()] + variants
     st.caption(f"🕵️ **Rastreador Interno activado:** Buscando huellas de: *{', '.join(search_terms)}*")
 
-    # 2. Barrido del Repositorio
-    hits = []
-    
-    for doc in db:
-        doc_name = doc.get('nombre_archivo', 'Documento sin nombre')
-        content_chunks = []
-        for grupo in doc.get("grupos", []):
-            content_chunks.append(str(grupo.get('contenido_texto', '')))
-        
-        full_text = " ".join(content_chunks).lower()
-        
-        # Scoring simple
-        score = 0
-        matched_terms = []
-        for term in search_terms:
-            if term in full_text:
-                score += 1
-                matched_terms.append(term)
-        
-        if score > 0:
-            # Snippet
-            start_idx = -1
-            for term in matched_terms:
-                idx = full_text.find(term)
-                if idx != -1:
-                    start_idx = idx
-                    break
-            
-            snippet_start = max(0, start_idx - 100)
-            snippet_end = min(len(full_text), start_idx + 400)
-            snippet = full_text[snippet_start:snippet_end] + "..."
-            
-            hits.append({
-                "doc": doc_name,
-                "score": score,
-                "snippet": snippet,
-                "matches": matched_terms
-            })
-
-    # 3. Ordenar
-    hits.sort(key=lambda x: x['score'], reverse=True)
-    top_hits = hits[:7] 
+    # 2. Barrido del Repositorio (índice posicional, construido una vez por repositorio)
+    index = get_repository_index(repository_fingerprint(db), db)
+    top_hits = index.search(search_terms, limit=7)
     
     if not top_hits:
         return ""
@@ -108,13 +71,16 @@ def google_trends_mode():
         market = c2.selectbox("Mercado", ["Colombia", "México", "Global"], index=0)
         timeframe = c3.selectbox("Tiempo", ["today 1-m", "today 12-m", "today 5-y"], format_func=lambda x: "30 Días" if "1-m" in x else "1 Año" if "12-m" in x else "5 Años")
 
+        compare_raw = st.text_input("Comparar con (opcional):", placeholder="Términos separados por coma")
+
     geo_map = {"Colombia": "CO", "México": "MX", "Global": ""}
     geo_code = geo_map[market]
 
     if st.button("Escanear Tendencia", type="primary", width="stretch"):
         if not keyword: st.warning("Ingresa un término."); return
 
-        trend_df, geo_df = None, None
+        compare_terms = [t.strip() for t in compare_raw.split(",") if t.strip() and t.strip().lower() != keyword.strip().lower()]
+        trend_df, geo_df, compare_df = None, None, None
         rising_queries, related_topics = [], []
         internal_context = ""
         is_simulation = False
@@ -132,31 +98,15 @@ def google_trends_mode():
             # 2. GOOGLE TRENDS
             status.write("🌍 Consultando Google Trends Live...")
             try:
-                pytrends = TrendReq(hl='es', tz=300, timeout=(5, 20))
-                pytrends.build_payload([keyword], cat=0, timeframe=timeframe, geo=geo_code)
-                
-                data = pytrends.interest_over_time()
-                if data.empty: raise ValueError("EmptyData")
-                
-                trend_df = data.reset_index().rename(columns={keyword: 'Interés', 'date': 'Fecha'})
-                
-                # Geo
-                try:
-                    geo_data = pytrends.interest_by_region(resolution='REGION', inc_low_vol=True)
-                    geo_data = geo_data[geo_data[keyword] > 0].sort_values(keyword, ascending=False).head(10)
-                    if not geo_data.empty: geo_df = geo_data.reset_index().rename(columns={keyword: 'Interés', 'geoName': 'Región'})
-                except: pass
-
-                # Topics
-                try:
-                    rel_q = pytrends.related_queries()
-                    if rel_q and keyword in rel_q:
-                        if rel_q[keyword]['rising'] is not None: rising_queries = rel_q[keyword]['rising'].head(5)['query'].tolist()
-                    
-                    rel_t = pytrends.related_topics()
-                    if rel_t and keyword in rel_t:
-                        if rel_t[keyword]['rising'] is not None: related_topics = rel_t[keyword]['rising'].head(5)['topic_title'].tolist()
-                except: pass
+                trends = get_trends([keyword] + compare_terms, timeframe, geo_code)
+                main = trends[keyword.strip()]
+                trend_df, geo_df = main["interest"], main["regions"]
+                rising_queries, related_topics = main["rising_queries"], main["related_topics"]
+
+                # Comparadas en la escala de la principal (pico de la principal = 100)
+                frames = [data["interest"].assign(Término=term, Interés=data["interest"]["Interés"] * (data["relative_peak"] or 0))
+                          for term, data in trends.items() if data["relative_peak"] is not None]
+                if len(frames) > 1: compare_df = pd.concat(frames, ignore_index=True)
 
             except Exception as e:
                 is_simulation = True
@@ -202,6 +152,12 @@ def google_trends_mode():
             ).encode(x='Fecha:T', y='Interés:Q', tooltip=['Fecha', 'Interés']).properties(height=300)
             
             st.altair_chart(chart_time, width="stretch")
+
+            if compare_df is not None:
+                st.caption("Comparación en la escala del término principal (su pico = 100).")
+                st.altair_chart(alt.Chart(compare_df).mark_line().encode(
+                    x='Fecha:T', y='Interés:Q', color='Término:N', tooltip=['Término', 'Fecha', alt.Tooltip('Interés:Q', format='.0f')]
+                ).properties(height=300), width="stretch")
         
         with t2:
             if geo_df is not None:
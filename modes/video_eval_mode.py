@@ -1,4 +1,5 @@
 import streamlit as st
+import os
 import time
 import constants as c
 
@@ -8,11 +9,16 @@ from services.gemini_api import call_gemini_stream
 from services.supabase_db import log_query_event
 from config import banner_file
 from prompts import get_video_eval_prompt_parts
+from services.media_processing import prepare_media, format_timestamp
 
 # --- COMPONENTES UNIFICADOS ---
 from components.chat_interface import render_chat_history
 from components.export_utils import render_final_actions
 
+# Piezas publicitarias cortas: muestreo denso de fotogramas
+VIDEO_EVAL_KEYFRAME_INTERVAL = 2
+VIDEO_EVAL_MAX_KEYFRAMES = 24
+
 def video_evaluation_mode(db, selected_files):
     """
     Modo de Evaluación de Video: Integra el estándar de invisibilidad de fuentes
@@ -53,10 +59,23 @@ def video_evaluation_mode(db, selected_files):
             relevant_text_context = get_relevant_info(db, f"Contexto: {target_audience}", selected_files)
             
             # Preparación de datos para Gemini (Multimodal)
-            video_file_data = {'mime_type': uploaded_file.type, 'data': video_bytes}
+            # Enviamos fotogramas clave + pista de audio en lugar del video completo
+            status.write("Extrayendo fotogramas clave y audio...")
+            file_ext = os.path.splitext(uploaded_file.name)[1].lower()
+            prepared = prepare_media(video_bytes, file_ext, is_video=True, segment_seconds=None,
+                                     keyframe_interval=VIDEO_EVAL_KEYFRAME_INTERVAL, max_keyframes=VIDEO_EVAL_MAX_KEYFRAMES)
+
             prompt_parts = get_video_eval_prompt_parts(target_audience, comm_objectives, relevant_text_context)
             prompt_parts.append("\n\n**Video para evaluar:**")
-            prompt_parts.append(video_file_data)
+            if prepared and prepared["keyframes"]:
+                for frame in prepared["keyframes"]:
+                    prompt_parts.append(f"[Fotograma {format_timestamp(frame['timestamp_seconds'])}]")
+                    prompt_parts.append({'mime_type': frame['mime_type'], 'data': frame['data']})
+                for segment in prepared["audio_segments"]:
+                    prompt_parts.append("[Pista de audio del video]")
+                    prompt_parts.append({'mime_type': segment['mime_type'], 'data': segment['data']})
+            else:
+                prompt_parts.append({'mime_type': uploaded_file.type, 'data': video_bytes})
             
             # Streaming de respuesta
             stream = call_gemini_stream(prompt_parts)
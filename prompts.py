@@ -96,6 +96,17 @@ def get_text_analysis_summary_prompt(analysis_results):
         f"**Tarea:** Cruza los hallazgos de todos los textos analizados. Salida: Informe ejecutivo de alta densidad."
     )
 
+def get_document_summary_prompt(source_name, document_text):
+    """Paso 'map': resumen de un solo documento, insumo del resumen del proyecto."""
+    return (
+        f"**Rol:** Analista Cualitativo Senior.\n"
+        f"**Documento:** {source_name}\n"
+        f"**Texto:**\n{document_text}\n"
+        f"**Tarea:** Resume este documento sin perder hallazgos: temas principales, tensiones, cifras, "
+        f"perfiles de los participantes y 3-5 verbatims textuales representativos (entre comillas). "
+        f"Salida: viñetas densas, máximo 600 palabras. No inventes información."
+    )
+
 def get_autocode_prompt(context, main_topic):
     return f"""
     **Rol:** Codificador Cualitativo (Grounded Theory).
@@ -114,10 +125,14 @@ def get_etnochat_prompt(conversation_history, text_context):
         f"{INSTRUCCIONES_DE_CITAS}"
     )
 
-def get_media_transcription_prompt():
-    return """
+def get_media_transcription_prompt(segment_start=None):
+    segment_note = (
+        f"\n    **Nota:** Este audio es un fragmento que inicia en {segment_start} de la grabación original. "
+        "Las imágenes adjuntas son fotogramas de ese mismo tramo."
+    ) if segment_start else ""
+    return f"""
     **Rol:** Transcriptor Profesional.
-    **Tarea:** Transcribe el audio palabra por palabra.
+    **Tarea:** Transcribe el audio palabra por palabra.{segment_note}
     **Formato:**
     - Usa parráfos claros.
     - Identifica hablantes si es posible (Hablante 1, Hablante 2).
@@ -1,129 +1,107 @@
 import io
 import os
-from docx import Document
-from docx.shared import RGBColor, Inches
-import markdown2
-from bs4 import BeautifulSoup
+from docx.shared import RGBColor, Inches, Pt
+from reporting.markdown_ir import get_markdown_ir, plain_text, BOLD, ITALIC, CODE
+from reporting.template_cache import open_docx_template
 
 # ==============================
-# GENERADOR DE WORD (DOCX) - CORREGIDO
+# GENERADOR DE WORD (DOCX)
 # ==============================
+# Recorre la misma IR de markdown que el PDF (reporting.markdown_ir): el texto
+# se parsea una sola vez y ambos formatos muestran la misma estructura.
 
-def process_rich_text(paragraph, html_content):
+def add_inline_runs(paragraph, inlines):
     """
-    Procesa un párrafo HTML y añade 'runs' al párrafo de Word
-    para manejar negritas (<strong>, <b>), cursivas (<em>, <i>) y código.
+    Añade un 'run' por tramo de la IR para manejar negritas, cursivas y código.
     """
-    # Si recibimos un NavigableString (texto plano), lo agregamos directo
-    if isinstance(html_content, str):
-        paragraph.add_run(str(html_content))
-        return
-
-    # Si es un Tag, procesamos sus hijos
-    for child in html_content.contents:
-        if isinstance(child, str):
-            paragraph.add_run(child)
-        elif child.name in ['strong', 'b']:
-            run = paragraph.add_run(child.get_text())
-            run.bold = True
-        elif child.name in ['em', 'i']:
-            run = paragraph.add_run(child.get_text())
-            run.italic = True
-        elif child.name == 'code':
-            run = paragraph.add_run(child.get_text())
+    for text, style in inlines:
+        run = paragraph.add_run(text)
+        if style & BOLD: run.bold = True
+        if style & ITALIC: run.italic = True
+        if style & CODE:
             run.font.name = 'Courier New'
             run.font.color.rgb = RGBColor(100, 100, 100)
-        else:
-            # Recursividad simple para otros tags anidados
-            paragraph.add_run(child.get_text())
+
+def _add_styled_paragraph(doc, *styles):
+    # El primer estilo que exista en la plantilla; si ninguno, párrafo normal
+    for style in styles:
+        try:
+            return doc.add_paragraph(style=style)
+        except KeyError:
+            continue
+    return doc.add_paragraph()
+
+def _add_table(doc, header, rows):
+    n_cols = max([len(header)] + [len(r) for r in rows])
+    table = doc.add_table(rows=len(rows) + 1, cols=n_cols)
+    try:
+        table.style = 'Table Grid'
+    except Exception:
+        pass
+    for i, row in enumerate([header] + rows):
+        for j, cell_inlines in enumerate(row):
+            p = table.cell(i, j).paragraphs[0]
+            add_inline_runs(p, cell_inlines)
+            if i == 0:
+                for run in p.runs: run.bold = True
 
 def generate_docx(markdown_text, title="Reporte Atelier", template_path=None):
     """
-    Convierte Markdown a DOCX iterando secuencialmente para evitar duplicados.
+    Convierte Markdown a DOCX recorriendo los bloques de la IR en orden.
     """
     try:
         # 1. Cargar Plantilla o Crear Nuevo
+        # (parseadas una vez por proceso; cada exportación recibe un clon)
         if template_path and os.path.exists(template_path):
-            doc = Document(template_path)
+            doc = open_docx_template(template_path)
         else:
-            doc = Document()
+            doc = open_docx_template()
             # Si no hay plantilla, agregamos el título manualmente
             doc.add_heading(title, 0)
 
-        # 2. Convertir Markdown a HTML
-        # Agregamos extras para asegurar estructura limpia
-        html_content = markdown2.markdown(markdown_text, extras=["tables", "fenced-code-blocks"])
-        soup = BeautifulSoup(html_content, "html.parser")
-
-        # 3. Obtener contenedor principal (Body o Soup directo)
-        container = soup.body if soup.body else soup
-
-        # 4. ITERACIÓN SECUENCIAL (CORRECCIÓN ANTI-DUPLICADOS)
-        # Iteramos solo los hijos directos. find_all era recursivo y causaba el error.
-        for element in container.children:
-            
-            # Ignorar saltos de línea vacíos entre tags
-            if isinstance(element, str):
-                if element.strip(): 
-                    doc.add_paragraph(element.strip())
-                continue
-
-            tag_name = element.name.lower()
+        # 2. Bloques ya parseados (compartidos con el PDF del mismo texto)
+        for block in get_markdown_ir(markdown_text):
+            kind = block["type"]
 
             # --- ENCABEZADOS ---
-            if tag_name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                # Extraer nivel del número (h1 -> 1, h2 -> 2)
-                try:
-                    level = int(tag_name[1])
-                except: 
-                    level = 1
-                doc.add_heading(element.get_text().strip(), level=level)
+            if kind == "heading":
+                text = plain_text(block["inlines"]).strip()
+                if text: doc.add_heading(text, level=block["level"])
 
             # --- PÁRRAFOS ---
-            elif tag_name == 'p':
-                p = doc.add_paragraph()
-                process_rich_text(p, element)
+            elif kind == "paragraph":
+                add_inline_runs(doc.add_paragraph(), block["inlines"])
 
             # --- LISTAS (UL / OL) ---
-            elif tag_name in ['ul', 'ol']:
-                # Iterar sobre los items de la lista <li>
-                list_items = element.find_all('li', recursive=False)
-                for li in list_items:
-                    style = 'List Bullet' if tag_name == 'ul' else 'List Number'
-                    try:
-                        p = doc.add_paragraph(style=style)
-                    except:
-                        # Fallback si la plantilla no tiene el estilo
-                        p = doc.add_paragraph(style='List Paragraph')
-                        if tag_name == 'ul': p.style = 'List Bullet'
-                    
-                    process_rich_text(p, li)
+            elif kind == "list":
+                base = 'List Bullet' if not block["ordered"] else 'List Number'
+                for item in block["items"]:
+                    # Niveles anidados: 'List Bullet 2', 'List Bullet 3'...
+                    style = base if not item["level"] else f"{base} {item['level'] + 1}"
+                    p = _add_styled_paragraph(doc, style, base, 'List Paragraph')
+                    add_inline_runs(p, item["inlines"])
 
             # --- CITAS (BLOCKQUOTE) ---
-            elif tag_name == 'blockquote':
+            elif kind == "quote":
                 p = doc.add_paragraph()
                 p.paragraph_format.left_indent = Inches(0.5)
-                # Las citas suelen tener <p> dentro, extraemos el texto o procesamos hijos
-                text_content = element.get_text(" ", strip=True)
-                run = p.add_run(text_content)
+                run = p.add_run(plain_text(block["inlines"]))
                 run.italic = True
                 run.font.color.rgb = RGBColor(80, 80, 80)
 
-            # --- CÓDIGO (PRE) ---
-            elif tag_name == 'pre':
+            # --- CÓDIGO ---
+            elif kind == "code":
                 p = doc.add_paragraph()
                 p.paragraph_format.left_indent = Inches(0.2)
-                run = p.add_run(element.get_text())
+                run = p.add_run(block["text"])
                 run.font.name = 'Courier New'
-                run.font.size = Pt(9) if 'Pt' in globals() else None
+                run.font.size = Pt(9)
 
-            # --- OTROS (Fallback) ---
-            else:
-                text = element.get_text().strip()
-                if text:
-                    doc.add_paragraph(text)
+            # --- TABLAS ---
+            elif kind == "table":
+                _add_table(doc, block["header"], block["rows"])
 
-        # 5. Guardar
+        # 3. Guardar
         buffer = io.BytesIO()
         doc.save(buffer)
         buffer.seek(0)
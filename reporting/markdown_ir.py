@@ -0,0 +1,194 @@
+import re
+import html
+import hashlib
+import threading
+from collections import OrderedDict
+
+# =====================================================
+# MARKDOWN -> REPRESENTACIÓN INTERMEDIA (IR)
+# =====================================================
+# Parser mínimo del markdown que producen los prompts (encabezados, párrafos,
+# listas, citas, código, tablas, separadores). Una sola pasada por líneas, sin
+# pasar por HTML ni por un árbol DOM. El resultado se memoiza por hash del
+# contenido (get_markdown_ir): PDF y Word del mismo texto comparten un único
+# parseo y por eso quedan consistentes entre sí; el PPTX usa parse_inlines
+# para los textos cortos de sus slides.
+#
+# Bloques (dicts, no modificar):
+#   {"type": "heading", "level": 1-6, "inlines": [...]}
+#   {"type": "paragraph", "inlines": [...]}        ("\n" = salto de línea)
+#   {"type": "list", "ordered": bool, "start": int, "items": [{"level", "inlines"}]}
+#   {"type": "quote", "inlines": [...]}
+#   {"type": "code", "text": str}
+#   {"type": "table", "header": [inlines], "rows": [[inlines]]}
+#   {"type": "rule"}
+# Inlines: [(texto, estilo)] con estilo = combinación de BOLD | ITALIC | CODE.
+
+BOLD, ITALIC, CODE = 1, 2, 4
+IR_CACHE_MAX_ENTRIES = 32
+
+_ir_cache = OrderedDict()
+_ir_cache_lock = threading.Lock()
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE_RE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_LIST_RE = re.compile(r"^(\s*)([-*+•]|\d+[.)])\s+(.*)$")
+_QUOTE_RE = re.compile(r"^\s{0,3}>\s?(.*)$")
+_TABLE_SEP_RE = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+
+_INLINE_RE = re.compile(
+    r"(?P<code>`+)(?P<code_text>.+?)(?P=code)"
+    r"|\*\*\*(?P<bold_italic>.+?)\*\*\*"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|__(?P<bold2>.+?)__"
+    r"|(?<!\w)\*(?![\s*])(?P<italic>.+?)(?<![\s*])\*"
+    r"|(?<!\w)_(?![\s_])(?P<italic2>.+?)(?<![\s_])_(?!\w)"
+    r"|\[(?P<label>[^\]]+)\]\((?P<url>[^)]*)\)"
+)
+
+def parse_inlines(text, style=0):
+    """Texto markdown de una línea/párrafo -> [(texto, estilo)]."""
+    spans = []
+    pos = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > pos:
+            spans.append((text[pos:match.start()], style))
+        if match.group("code"):
+            spans.append((match.group("code_text"), style | CODE))
+        elif match.group("bold_italic"):
+            spans.extend(parse_inlines(match.group("bold_italic"), style | BOLD | ITALIC))
+        elif match.group("bold") or match.group("bold2"):
+            spans.extend(parse_inlines(match.group("bold") or match.group("bold2"), style | BOLD))
+        elif match.group("italic") or match.group("italic2"):
+            spans.extend(parse_inlines(match.group("italic") or match.group("italic2"), style | ITALIC))
+        else:
+            spans.extend(parse_inlines(match.group("label"), style))
+        pos = match.end()
+    if pos < len(text):
+        spans.append((text[pos:], style))
+    return spans
+
+def plain_text(inlines):
+    return "".join(text for text, _ in inlines)
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith("|"): line = line[1:]
+    if line.endswith("|"): line = line[:-1]
+    return [parse_inlines(cell.strip()) for cell in line.split("|")]
+
+def parse_markdown(text):
+    """Markdown -> lista de bloques."""
+    lines = html.unescape(str(text or "")).replace("\r\n", "\n").split("\n")
+    blocks = []
+    paragraph = []
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.append({"type": "paragraph", "inlines": parse_inlines("\n".join(paragraph))})
+            paragraph.clear()
+
+    i, n = 0, len(lines)
+    while i < n:
+        line = lines[i]
+        stripped = line.strip()
+
+        if not stripped:
+            flush_paragraph()
+            i += 1
+            continue
+
+        fence = _FENCE_RE.match(line)
+        if fence:
+            flush_paragraph()
+            code = []
+            i += 1
+            while i < n and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            blocks.append({"type": "code", "text": "\n".join(code)})
+            i += 1
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush_paragraph()
+            blocks.append({"type": "heading", "level": len(heading.group(1)), "inlines": parse_inlines(heading.group(2))})
+            i += 1
+            continue
+
+        if _RULE_RE.match(line):
+            flush_paragraph()
+            blocks.append({"type": "rule"})
+            i += 1
+            continue
+
+        if stripped.startswith("|") and i + 1 < n and _TABLE_SEP_RE.match(lines[i + 1]):
+            flush_paragraph()
+            header = _split_row(line)
+            rows = []
+            i += 2
+            while i < n and lines[i].strip().startswith("|"):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            blocks.append({"type": "table", "header": header, "rows": rows})
+            continue
+
+        quote = _QUOTE_RE.match(line)
+        if quote:
+            flush_paragraph()
+            quoted = []
+            while i < n and _QUOTE_RE.match(lines[i]):
+                quoted.append(_QUOTE_RE.match(lines[i]).group(1).strip())
+                i += 1
+            blocks.append({"type": "quote", "inlines": parse_inlines(" ".join(q for q in quoted if q))})
+            continue
+
+        item = _LIST_RE.match(line)
+        if item:
+            flush_paragraph()
+            ordered = item.group(2)[0].isdigit()
+            start = int(item.group(2)[:-1]) if ordered else 1
+            base_indent = len(item.group(1).expandtabs(4))
+            items = []
+            while i < n:
+                current = lines[i]
+                match = _LIST_RE.match(current)
+                if match:
+                    indent = len(match.group(1).expandtabs(4)) - base_indent
+                    # Otro tipo de marcador en el nivel base (viñeta <-> número) abre otra lista
+                    if indent <= 0 and match.group(2)[0].isdigit() != ordered:
+                        break
+                    level = max(0, indent // 2)
+                    items.append({"level": min(level, 3), "text": match.group(3)})
+                elif current.strip() and current[:1].isspace() and items:
+                    items[-1]["text"] += " " + current.strip()  # Continuación del ítem
+                else:
+                    break
+                i += 1
+            blocks.append({"type": "list", "ordered": ordered, "start": start,
+                           "items": [{"level": it["level"], "inlines": parse_inlines(it["text"])} for it in items]})
+            continue
+
+        paragraph.append(stripped)
+        i += 1
+
+    flush_paragraph()
+    return blocks
+
+def get_markdown_ir(text):
+    """parse_markdown memoizado por hash del contenido (resultado compartido: no modificar)."""
+    key = hashlib.sha256(str(text or "").encode("utf-8")).hexdigest()
+    with _ir_cache_lock:
+        if key in _ir_cache:
+            _ir_cache.move_to_end(key)
+            return _ir_cache[key]
+
+    blocks = parse_markdown(text)
+    with _ir_cache_lock:
+        _ir_cache[key] = blocks
+        _ir_cache.move_to_end(key)
+        while len(_ir_cache) > IR_CACHE_MAX_ENTRIES:
+            _ir_cache.popitem(last=False)
+    return blocks
@@ -1,19 +1,22 @@
 import html
-import markdown2
-from bs4 import BeautifulSoup
+from functools import lru_cache
 from io import BytesIO
 import os
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Preformatted, Spacer, Table, TableStyle
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
+from reporting.markdown_ir import get_markdown_ir, BOLD, ITALIC, CODE
 
 # ==============================
 # REGISTRO DE FUENTES PDF
 # ==============================
+# Fuentes, hoja de estilos y banner se preparan una sola vez por proceso y se
+# comparten entre todos los PDFs (los estilos son de solo lectura al renderizar).
 FONT_REGISTERED = False
 FONT_NAME = 'DejaVuSans'
 FALLBACK_FONT_NAME = 'Helvetica'
@@ -29,63 +32,107 @@ else:
     print(f"Advertencia PDF: No se encontró 'DejaVuSans.ttf'. Usando '{FALLBACK_FONT_NAME}'.")
     FONT_NAME = FALLBACK_FONT_NAME
 
+CODE_FONT_NAME = 'Courier' if FONT_NAME == FALLBACK_FONT_NAME or not FONT_REGISTERED else FONT_NAME
+FOOTER_TEXT = "Generado por Atelier Data Studio. Verifica las respuestas."
+
+
+@lru_cache(maxsize=1)
+def get_stylesheet():
+    styles = getSampleStyleSheet()
+    pdf_font_name = FONT_NAME
+    base_styles = ['Normal', 'BodyText', 'Italic', 'Bold', 'Heading1', 'Heading2', 'Heading3', 'Heading4', 'Heading5', 'Heading6', 'Code']
+
+    for style_name in base_styles:
+        if style_name in styles:
+            try:
+                styles[style_name].fontName = pdf_font_name
+                if style_name == 'Code':
+                    styles[style_name].fontName = CODE_FONT_NAME
+                    styles[style_name].fontSize = 9
+                    styles[style_name].leading = 11
+                    styles[style_name].leftIndent = 6*mm
+                    styles[style_name].backColor = colors.whitesmoke
+                    styles[style_name].textColor = colors.darkslategrey
+            except Exception:
+                pass
+
+    styles.add(ParagraphStyle(name='CustomTitle', parent=styles['Heading1'], fontName=pdf_font_name,
+                              alignment=1, spaceAfter=14, fontSize=16, leading=20))
+
+    styles.add(ParagraphStyle(name='CustomHeading2', parent=styles['Heading2'], fontName=pdf_font_name,
+                              spaceBefore=12, spaceAfter=6, fontSize=13, leading=17))
+    styles.add(ParagraphStyle(name='CustomHeading3', parent=styles['Heading3'], fontName=pdf_font_name,
+                              spaceBefore=10, spaceAfter=5, fontSize=12, leading=16))
+
+    styles.add(ParagraphStyle(name='CustomBodyText', parent=styles['Normal'], fontName=pdf_font_name,
+                              leading=15, alignment=4, fontSize=11, spaceAfter=6))
+
+    styles.add(ParagraphStyle(name='CustomBullet', parent=styles['Normal'], fontName=pdf_font_name,
+                              fontSize=11, leading=15, spaceAfter=4,
+                              leftIndent=10*mm, bulletIndent=5*mm))
+
+    styles.add(ParagraphStyle(name='CustomNumber', parent=styles['Normal'], fontName=pdf_font_name,
+                              fontSize=11, leading=15, spaceAfter=4,
+                              leftIndent=10*mm, bulletIndent=5*mm))
+
+    styles.add(ParagraphStyle(name='CustomFooter', parent=styles['Normal'], fontName=pdf_font_name,
+                              alignment=1, textColor=colors.grey, fontSize=8))
+
+    styles.add(ParagraphStyle(name='CustomTableCell', parent=styles['Normal'], fontName=pdf_font_name,
+                              fontSize=9, leading=11))
+    styles.add(ParagraphStyle(name='CustomTableHeader', parent=styles['CustomTableCell'],
+                              textColor=colors.white))
+    return styles
+
+@lru_cache(maxsize=None)
+def _nested_list_style(style_name, level):
+    # Sangría adicional para ítems anidados (derivada una vez por estilo y nivel)
+    base = get_stylesheet()[style_name]
+    return ParagraphStyle(name=f'{style_name}{level}', parent=base,
+                          leftIndent=base.leftIndent + level*6*mm, bulletIndent=base.bulletIndent + level*6*mm)
+
+@lru_cache(maxsize=1)
+def _table_style():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#003366')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+@lru_cache(maxsize=1)
+def _footer_paragraph():
+    return Paragraph(FOOTER_TEXT, get_stylesheet()['CustomFooter'])
+
+@lru_cache(maxsize=4)
+def _banner_image(banner_path):
+    """Banner decodificado una vez por proceso (None si no existe o falla)."""
+    if not banner_path or not os.path.isfile(banner_path): return None
+    try:
+        return ImageReader(banner_path)
+    except Exception as e:
+        print(f"Error PDF header: {e}")
+        return None
+
 
 class PDFReport:
     def __init__(self, buffer_or_filename, banner_path=None):
         self.banner_path = banner_path
         self.elements = []
-        self.styles = getSampleStyleSheet()
+        self.styles = get_stylesheet()
         self.doc = SimpleDocTemplate(buffer_or_filename, pagesize=A4, 
                                      rightMargin=15*mm, leftMargin=15*mm,
                                      topMargin=40*mm, bottomMargin=20*mm)
-        
-        pdf_font_name = FONT_NAME
-        base_styles = ['Normal', 'BodyText', 'Italic', 'Bold', 'Heading1', 'Heading2', 'Heading3', 'Heading4', 'Heading5', 'Heading6', 'Code']
-        
-        for style_name in base_styles:
-            if style_name in self.styles:
-                try:
-                    self.styles[style_name].fontName = pdf_font_name
-                    if style_name == 'Code':
-                        if pdf_font_name == FALLBACK_FONT_NAME or not FONT_REGISTERED: 
-                            self.styles[style_name].fontName = 'Courier'
-                        self.styles[style_name].fontSize = 9
-                        self.styles[style_name].leading = 11
-                        self.styles[style_name].leftIndent = 6*mm
-                        self.styles[style_name].backColor = colors.whitesmoke
-                        self.styles[style_name].textColor = colors.darkslategrey
-                except Exception:
-                    pass
-
-        self.styles.add(ParagraphStyle(name='CustomTitle', parent=self.styles['Heading1'], fontName=pdf_font_name, 
-                                       alignment=1, spaceAfter=14, fontSize=16, leading=20)) 
-        
-        self.styles.add(ParagraphStyle(name='CustomHeading2', parent=self.styles['Heading2'], fontName=pdf_font_name, 
-                                       spaceBefore=12, spaceAfter=6, fontSize=13, leading=17))
-        self.styles.add(ParagraphStyle(name='CustomHeading3', parent=self.styles['Heading3'], fontName=pdf_font_name, 
-                                       spaceBefore=10, spaceAfter=5, fontSize=12, leading=16))
-
-        self.styles.add(ParagraphStyle(name='CustomBodyText', parent=self.styles['Normal'], fontName=pdf_font_name, 
-                                       leading=15, alignment=4, fontSize=11, spaceAfter=6)) 
-        
-        self.styles.add(ParagraphStyle(name='CustomBullet', parent=self.styles['Normal'], fontName=pdf_font_name,
-                                       fontSize=11, leading=15, spaceAfter=4,
-                                       leftIndent=10*mm, bulletIndent=5*mm))
-                                       
-        self.styles.add(ParagraphStyle(name='CustomNumber', parent=self.styles['Normal'], fontName=pdf_font_name,
-                                       fontSize=11, leading=15, spaceAfter=4,
-                                       leftIndent=10*mm, bulletIndent=5*mm))
-
-        self.styles.add(ParagraphStyle(name='CustomFooter', parent=self.styles['Normal'], fontName=pdf_font_name, 
-                                       alignment=1, textColor=colors.grey, fontSize=8))
 
     def header(self, canvas, doc):
         canvas.saveState()
-        if self.banner_path and os.path.isfile(self.banner_path):
+        banner = _banner_image(self.banner_path)
+        if banner is not None:
             try:
                 img_w, img_h = 210*mm, 30*mm 
                 y_pos = A4[1] - img_h - 5*mm 
-                canvas.drawImage(self.banner_path, 0, y_pos, width=img_w, height=img_h, 
+                canvas.drawImage(banner, 0, y_pos, width=img_w, height=img_h, 
                                  preserveAspectRatio=True, anchor='n')
             except Exception as e:
                 print(f"Error PDF header: {e}")
@@ -93,8 +140,7 @@ class PDFReport:
         
     def footer(self, canvas, doc):
         canvas.saveState()
-        footer_text = "Generado por Atelier Data Studio. Verifica las respuestas."
-        p = Paragraph(footer_text, self.styles['CustomFooter'])
+        p = _footer_paragraph()
         w, h = p.wrap(doc.width, doc.bottomMargin)
         p.drawOn(canvas, doc.leftMargin, 8*mm)
         canvas.restoreState()
@@ -121,6 +167,18 @@ class PDFReport:
         p = Paragraph(text, style_to_use)
         self.elements.append(p)
 
+    def add_table(self, header, rows):
+        n_cols = max([len(header)] + [len(r) for r in rows])
+        data = []
+        for i, row in enumerate([header] + rows):
+            cell_style = self.styles['CustomTableHeader' if i == 0 else 'CustomTableCell']
+            data.append([Paragraph(inline_markup(cell), cell_style) for cell in row] + [""] * (n_cols - len(row)))
+        col_width = self.doc.width / n_cols
+        table = Table(data, colWidths=[col_width] * n_cols, repeatRows=1)
+        table.setStyle(_table_style())
+        self.elements.append(table)
+        self.elements.append(Spacer(1, 4*mm))
+
     def build_pdf(self):
         try:
             self.doc.build(self.elements, onFirstPage=self.header_footer, onLaterPages=self.header_footer)
@@ -128,76 +186,64 @@ class PDFReport:
             print(f"Error building PDF: {e}")
 
 
+def inline_markup(inlines):
+    """Inlines de la IR -> mini-markup de ReportLab (texto escapado)."""
+    parts = []
+    for text, style in inlines:
+        markup = html.escape(text, quote=False).replace('\n', '<br/>')
+        if style & CODE: markup = f'<font face="{CODE_FONT_NAME}">{markup}</font>'
+        if style & ITALIC: markup = f'<i>{markup}</i>'
+        if style & BOLD: markup = f'<b>{markup}</b>'
+        parts.append(markup)
+    return "".join(parts)
+
 def add_markdown_content(pdf: PDFReport, markdown_text: str):
-    processed_elements = 0
     try:
-        decoded_text = html.unescape(str(markdown_text))
-        html_text = markdown2.markdown(decoded_text, extras=[
-            "fenced-code-blocks", "tables", "break-on-newline",
-            "code-friendly", "cuddled-lists", "smarty-pants"
-        ])
+        blocks = get_markdown_ir(markdown_text)
+    except Exception as e:
+        print(f"Error parsing markdown: {e}")
+        pdf.add_paragraph("Error procesando contenido.", style='Code')
+        return
 
-        soup = BeautifulSoup(html_text, "html.parser")
-        container = soup.body if soup.body else soup
+    for block in blocks:
+        try:
+            kind = block["type"]
+            if kind == "heading":
+                title_markup = inline_markup(block["inlines"]).strip()
+                if title_markup: pdf.add_title(title_markup, level=block["level"])
 
-        if not container:
-             return
+            elif kind == "paragraph":
+                pdf.add_paragraph(inline_markup(block["inlines"]))
 
-        for elem in container.children:
-            try:
-                if isinstance(elem, str):
-                    text = elem.strip()
-                    if text:
-                        pdf.add_paragraph(text)
-                        processed_elements += 1
-                    continue
-
-                if not hasattr(elem, 'name') or not elem.name:
-                    continue
-
-                tag_name = elem.name.lower()
-
-                if tag_name.startswith("h"):
-                   level = int(tag_name[1]) if len(tag_name) > 1 and tag_name[1].isdigit() else 1
-                   title_text = elem.get_text(strip=True)
-                   if title_text:
-                       pdf.add_title(title_text, level=level)
-
-                elif tag_name == "p":
-                    content = elem.decode_contents(formatter="html").strip() if hasattr(elem, 'decode_contents') else elem.get_text(strip=True)
-                    if content: pdf.add_paragraph(content)
-
-                elif tag_name == "ul":
-                    list_items = elem.find_all("li", recursive=False)
-                    for li in list_items:
-                        content = li.get_text(separator=' ', strip=True)
-                        if content: pdf.add_paragraph(f"• {content}", style='CustomBullet')
-
-                elif tag_name == "ol":
-                    list_items = elem.find_all("li", recursive=False)
-                    for idx, li in enumerate(list_items, 1):
-                        content = li.get_text(separator=' ', strip=True)
-                        if content: pdf.add_paragraph(f"{idx}. {content}", style='CustomNumber')
-
-                elif tag_name == "pre":
-                   code_elem = elem.find('code')
-                   code_text = (code_elem.get_text() if code_elem else elem.get_text())
-                   if code_text: pdf.add_paragraph(code_text, style='Code')
-
-                elif tag_name == "blockquote":
-                    content = elem.get_text(strip=True)
-                    if content: pdf.add_paragraph(f"> {content}", style='Italic')
-
-                else:
-                    plain_text = elem.get_text(strip=True)
-                    if plain_text: pdf.add_paragraph(plain_text)
+            elif kind == "list":
+                style_name = 'CustomNumber' if block["ordered"] else 'CustomBullet'
+                number = block["start"]
+                for item in block["items"]:
+                    content = inline_markup(item["inlines"]).strip()
+                    if not content: continue
+                    style = pdf.styles[style_name] if not item["level"] else _nested_list_style(style_name, item["level"])
+                    if block["ordered"] and not item["level"]:
+                        prefix = f"{number}. "
+                        number += 1
+                    else:
+                        prefix = "• " if not item["level"] else "– "
+                    pdf.elements.append(Paragraph(prefix + content, style))
 
-            except Exception:
-                continue
+            elif kind == "code":
+                if block["text"].strip(): pdf.elements.append(Preformatted(block["text"], pdf.styles['Code']))
 
-    except Exception as e:
-        print(f"Error parsing markdown: {e}")
-        pdf.add_paragraph("Error procesando contenido.", style='Code')
+            elif kind == "quote":
+                content = inline_markup(block["inlines"])
+                if content: pdf.add_paragraph(f"&gt; {content}", style='Italic')
+
+            elif kind == "table":
+                pdf.add_table(block["header"], block["rows"])
+
+            elif kind == "rule":
+                pdf.elements.append(Spacer(1, 4*mm))
+
+        except Exception:
+            continue
 
 def generate_pdf_html(content, title="Documento Final", banner_path=None):
     """
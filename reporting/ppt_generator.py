@@ -0,0 +1,184 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import streamlit as st
+from pptx.util import Inches, Pt, Emu
+from pptx.dml.color import RGBColor
+from config import ppt_template_file
+from services.logger import log_error
+from reporting.pptx_generator import COLOR_PRIMARY, COLOR_GRAY, COLOR_LIGHT
+from reporting.template_cache import open_pptx_template
+
+# =====================================================
+# EXPORTACIÓN DE ANÁLISIS A PPT (POR LOTES)
+# =====================================================
+# Recibe la cola de resultados del modo Análisis de Datos (tablas dinámicas,
+# escaneos de significancia, nubes de palabras) y arma un único .pptx:
+#   1) Los gráficos se renderizan en paralelo en un pool de procesos
+#      (matplotlib no es thread-safe y es CPU puro). El pool es único por
+#      proceso y usa 'spawn': nunca se hace fork del servidor de Streamlit,
+#      que tiene hilos vivos (transcripciones, exportaciones).
+#   2) La plantilla se prepara una sola vez por proceso (template_cache) y el
+#      deck se arma en una pasada.
+#
+# Ítem de la cola: {"title", "table": DataFrame | None, "chart": spec | None,
+#                   "image": bytes PNG | None, "caption": str | None}
+# Spec de gráfico (picklable): {"kind": "bar", "data": df.to_dict("split"), "title"}
+
+MAX_TABLE_ROWS = 15
+MAX_TABLE_COLS = 8
+CHART_WORKERS = 4
+CHART_DPI = 150
+
+def _drop_sample_slides(prs):
+    # La plantilla aporta masters y estilos; sus slides de ejemplo se descartan
+    slide_ids = prs.slides._sldIdLst
+    for slide_id in list(slide_ids):
+        prs.part.drop_rel(slide_id.rId)
+        slide_ids.remove(slide_id)
+
+def _widescreen(prs):
+    prs.slide_width, prs.slide_height = Inches(13.333), Inches(7.5)
+
+def _new_presentation():
+    # Plantilla preparada una vez por proceso (reporting.template_cache)
+    if not os.path.exists(ppt_template_file):
+        return open_pptx_template(prepare=_widescreen)
+    return open_pptx_template(ppt_template_file, prepare=_drop_sample_slides)
+
+def _blank_layout(prs):
+    layouts = prs.slide_layouts
+    return layouts[6] if len(layouts) > 6 else layouts[len(layouts) - 1]
+
+# --- Gráficos (se ejecuta en procesos hijos) ---
+
+def render_chart_png(spec):
+    """Renderiza un spec de gráfico a PNG. Función de módulo para poder enviarla al pool."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    data = spec["data"]
+    df = pd.DataFrame(data["data"], index=data["index"], columns=data["columns"])
+    fig, ax = plt.subplots(figsize=(10, 5))
+    try:
+        df.iloc[:MAX_TABLE_ROWS, :MAX_TABLE_COLS].plot(kind="bar", ax=ax, width=0.8)
+        ax.set_title(spec.get("title", ""))
+        ax.set_xlabel("")
+        ax.tick_params(axis="x", rotation=30)
+        ax.legend(fontsize=8, loc="best")
+        ax.spines[["top", "right"]].set_visible(False)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=CHART_DPI, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+@st.cache_resource(show_spinner=False)
+def get_chart_pool():
+    """Pool de procesos persistente para los gráficos (arranca los hijos una sola vez)."""
+    return ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def _render_charts(specs):
+    """PNG por spec (None si falló). En paralelo cuando hay más de uno."""
+    if not specs: return []
+    if len(specs) == 1:
+        return [_safe_render(specs[0])]
+    try:
+        return list(get_chart_pool().map(_safe_render, specs))
+    except Exception as e:
+        # Un pool roto (p. ej. un hijo murió) no se reutiliza: el próximo export crea otro
+        get_chart_pool.clear()
+        log_error("Pool de gráficos no disponible; se renderiza en serie", module="PPTGenerator", error=e, level="WARNING")
+        return [_safe_render(spec) for spec in specs]
+
+def _safe_render(spec):
+    try:
+        return render_chart_png(spec)
+    except Exception:
+        return None
+
+# --- Slides ---
+
+def _add_title(slide, prs, title, caption=None):
+    width = prs.slide_width - Inches(1)
+    tb = slide.shapes.add_textbox(Inches(0.5), Inches(0.3), width, Inches(0.8))
+    p = tb.text_frame.paragraphs[0]
+    p.text = str(title)
+    p.font.size = Pt(26)
+    p.font.bold = True
+    p.font.color.rgb = COLOR_PRIMARY
+    if caption:
+        tb_sub = slide.shapes.add_textbox(Inches(0.5), Inches(1.0), width, Inches(0.4))
+        p_sub = tb_sub.text_frame.paragraphs[0]
+        p_sub.text = str(caption)
+        p_sub.font.size = Pt(12)
+        p_sub.font.color.rgb = COLOR_GRAY
+
+def _add_table(slide, df, left, top, width, height):
+    df = df.iloc[:MAX_TABLE_ROWS, :MAX_TABLE_COLS]
+    index_name = df.index.name or ""
+    n_rows, n_cols = len(df) + 1, len(df.columns) + 1
+    table = slide.shapes.add_table(n_rows, n_cols, left, top, width, height).table
+
+    header = [str(index_name)] + [str(c) for c in df.columns]
+    for j, text in enumerate(header):
+        cell = table.cell(0, j)
+        cell.text = text
+        cell.fill.solid()
+        cell.fill.fore_color.rgb = COLOR_PRIMARY
+        cell.text_frame.paragraphs[0].font.color.rgb = RGBColor(255, 255, 255)
+        cell.text_frame.paragraphs[0].font.size = Pt(10)
+        cell.text_frame.paragraphs[0].font.bold = True
+
+    for i, (label, row) in enumerate(df.iterrows(), start=1):
+        values = [str(label)] + [f"{v:,.2f}" if isinstance(v, float) else str(v) for v in row.tolist()]
+        for j, text in enumerate(values):
+            cell = table.cell(i, j)
+            cell.text = text
+            cell.text_frame.paragraphs[0].font.size = Pt(9)
+            if i % 2 == 0:
+                cell.fill.solid()
+                cell.fill.fore_color.rgb = COLOR_LIGHT
+
+def add_analysis_slide(prs, title, table=None, image=None, caption=None):
+    """Agrega una slide con título, tabla y/o imagen (lado a lado si hay ambas)."""
+    slide = prs.slides.add_slide(_blank_layout(prs))
+    _add_title(slide, prs, title, caption)
+
+    top = Inches(1.5)
+    height = prs.slide_height - top - Inches(0.4)
+    full_width = prs.slide_width - Inches(1)
+    has_table = table is not None and len(table)
+
+    if has_table and image:
+        half = Emu(int(full_width / 2) - Inches(0.1))
+        _add_table(slide, table, Inches(0.5), top, half, min(height, Inches(0.3) * (min(len(table), MAX_TABLE_ROWS) + 1)))
+        slide.shapes.add_picture(io.BytesIO(image), Inches(0.5) + half + Inches(0.2), top, width=half)
+    elif has_table:
+        _add_table(slide, table, Inches(0.5), top, full_width, min(height, Inches(0.35) * (min(len(table), MAX_TABLE_ROWS) + 1)))
+    elif image:
+        slide.shapes.add_picture(io.BytesIO(image), Inches(0.5), top, height=height)
+    return slide
+
+def build_analysis_deck(items, title=None):
+    """Arma el .pptx completo de la cola de análisis. Retorna bytes."""
+    # 1) Todos los gráficos de una vez, en paralelo
+    chart_positions = [i for i, item in enumerate(items) if item.get("chart")]
+    rendered = _render_charts([items[i]["chart"] for i in chart_positions])
+    images = {i: png for i, png in zip(chart_positions, rendered)}
+
+    # 2) Una sola pasada sobre la plantilla
+    prs = _new_presentation()
+    if title:
+        slide = prs.slides.add_slide(_blank_layout(prs))
+        _add_title(slide, prs, title, f"{len(items)} análisis")
+    for i, item in enumerate(items):
+        add_analysis_slide(prs, item["title"], table=item.get("table"),
+                           image=item.get("image") or images.get(i), caption=item.get("caption"))
+
+    output = io.BytesIO()
+    prs.save(output)
+    return output.getvalue()
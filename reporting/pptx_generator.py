@@ -1,9 +1,10 @@
 import io
-from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN, MSO_AUTO_SIZE
 from pptx.dml.color import RGBColor
 from pptx.enum.shapes import MSO_SHAPE
+from reporting.markdown_ir import parse_inlines, BOLD, ITALIC, CODE
+from reporting.template_cache import open_pptx_template
 
 # --- COLORES CORPORATIVOS ---
 COLOR_PRIMARY = RGBColor(0, 51, 102)    # Azul Oscuro
@@ -11,16 +12,17 @@ COLOR_ACCENT = RGBColor(255, 102, 0)    # Naranja
 COLOR_GRAY = RGBColor(100, 100, 100)    # Gris Texto
 COLOR_LIGHT = RGBColor(245, 245, 245)   # Gris Fondo
 
+def _widescreen(prs):
+    prs.slide_width = Inches(13.333)
+    prs.slide_height = Inches(7.5)
+
 def create_pptx_from_structure(data):
     """
     Generador Inteligente de Slides. Detecta la estructura del JSON y 
     elige el diseño visual adecuado (Cuadrantes, Tablas, Columnas).
     """
-    prs = Presentation()
-    
-    # 1. Forzar formato Widescreen (16:9)
-    prs.slide_width = Inches(13.333)
-    prs.slide_height = Inches(7.5)
+    # 1. Presentación en formato Widescreen (16:9), preparada una vez por proceso
+    prs = open_pptx_template(prepare=_widescreen)
     
     # 2. Crear Slide en blanco
     # Intenta usar el layout blank (6), si falla usa el primero (0)
@@ -70,6 +72,16 @@ def create_pptx_from_structure(data):
 # FUNCIONES DE DIBUJO ESPECÍFICAS
 # ==========================================
 
+def _set_rich_text(paragraph, text, prefix=""):
+    """Texto con markdown en línea (**negrita**, *cursiva*, `código`) como runs del párrafo."""
+    if prefix: paragraph.add_run().text = prefix
+    for span, style in parse_inlines(str(text)):
+        run = paragraph.add_run()
+        run.text = span
+        if style & BOLD: run.font.bold = True
+        if style & ITALIC: run.font.italic = True
+        if style & CODE: run.font.name = 'Courier New'
+
 def _draw_header(slide, data):
     # Título
     tb = slide.shapes.add_textbox(Inches(0.5), Inches(0.4), Inches(12), Inches(1))
@@ -128,7 +140,7 @@ def _draw_dofa_layout(slide, data):
         points_list = points if isinstance(points, list) else [str(points)]
         for point in points_list[:5]: # Limitar a 5 bullets para que quepa bien
             p = tf.add_paragraph()
-            p.text = f"• {point}"
+            _set_rich_text(p, point, "• ")
             p.font.size = Pt(11)
 
 def _draw_journey_table(slide, data):
@@ -207,7 +219,7 @@ def _draw_persona_layout(slide, data):
     needs = data.get("necesidades_jtbd", []) + data.get("deseos_motivaciones", [])
     for n in needs[:4]:
         p = tb1.text_frame.add_paragraph()
-        p.text = f"• {n}"
+        _set_rich_text(p, n, "• ")
         
     # Caja Inferior: Dolores
     tb2 = slide.shapes.add_textbox(Inches(4.2), Inches(4.0), Inches(8.5), Inches(2.0))
@@ -219,7 +231,7 @@ def _draw_persona_layout(slide, data):
     pains = data.get("puntos_dolor_frustraciones", [])
     for pn in pains[:4]:
         p = tb2.text_frame.add_paragraph()
-        p.text = f"• {pn}"
+        _set_rich_text(p, pn, "• ")
 
 def _draw_matrix_layout(slide, data):
     """Diseño para Matriz de Posicionamiento (2x2)"""
@@ -261,7 +273,7 @@ def _draw_smart_generic_layout(slide, data):
         items = val if isinstance(val, list) else [str(val)]
         for item in items:
             bullet = tf.add_paragraph()
-            bullet.text = f"• {item}"
+            _set_rich_text(bullet, item, "• ")
             bullet.font.size = Pt(11)
             bullet.space_after = Pt(2)
             
@@ -276,7 +288,7 @@ def _draw_footer_insight(slide, text):
     
     tf = shape.text_frame
     p = tf.paragraphs[0]
-    p.text = f"💡 INSIGHT: {text}"
+    _set_rich_text(p, text, "💡 INSIGHT: ")
     p.font.color.rgb = RGBColor(50, 50, 50)
     p.font.size = Pt(12)
     p.alignment = PP_ALIGN.CENTER
@@ -0,0 +1,65 @@
+import io
+import os
+import zipfile
+from functools import lru_cache
+
+# =====================================================
+# CACHÉ DE PLANTILLAS (WORD / POWERPOINT)
+# =====================================================
+# Cada plantilla (.docx / .pptx, o la plantilla por defecto de la librería) se
+# lee y se prepara una sola vez por proceso:
+#   1) Si hay un paso de preparación (p. ej. quitar las slides de ejemplo o
+#      fijar el tamaño 16:9), se aplica una vez y se vuelve a guardar.
+#   2) El zip se reempaqueta sin compresión (ZIP_STORED): abrir un clon solo
+#      copia los miembros, sin descomprimirlos.
+# Cada exportación recibe un documento nuevo abierto desde esos bytes en
+# memoria; nunca se comparte un objeto Document/Presentation entre exportaciones.
+# La clave incluye la fecha de modificación: si la plantilla cambia en disco,
+# se vuelve a preparar.
+
+def _repack_stored(data):
+    source = zipfile.ZipFile(io.BytesIO(data))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as target:
+        for info in source.infolist():
+            target.writestr(info.filename, source.read(info), compress_type=zipfile.ZIP_STORED)
+    return output.getvalue()
+
+def _loader(kind):
+    if kind == "docx":
+        from docx import Document
+        return Document
+    from pptx import Presentation
+    return Presentation
+
+def _default_path(kind):
+    if kind == "docx":
+        from docx.api import _default_docx_path
+        return _default_docx_path()
+    from pptx.api import _default_pptx_path
+    return _default_pptx_path()
+
+@lru_cache(maxsize=16)
+def _snapshot(kind, path, mtime_ns, prepare):
+    with open(path, "rb") as f:
+        data = f.read()
+    if prepare is not None:
+        document = _loader(kind)(io.BytesIO(data))
+        prepare(document)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        data = buffer.getvalue()
+    return _repack_stored(data)
+
+def template_bytes(kind, path=None, prepare=None):
+    """Bytes (ZIP_STORED) de la plantilla ya preparada. kind: "docx" | "pptx"."""
+    path = os.path.abspath(path) if path else _default_path(kind)
+    return _snapshot(kind, path, os.stat(path).st_mtime_ns, prepare)
+
+def open_docx_template(path=None, prepare=None):
+    """Document nuevo a partir de la plantilla (o la de python-docx si path es None)."""
+    return _loader("docx")(io.BytesIO(template_bytes("docx", path, prepare)))
+
+def open_pptx_template(path=None, prepare=None):
+    """Presentation nueva a partir de la plantilla (o la de python-pptx si path es None)."""
+    return _loader("pptx")(io.BytesIO(template_bytes("pptx", path, prepare)))
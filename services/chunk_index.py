@@ -0,0 +1,201 @@
+import math
+import re
+from collections import Counter, defaultdict
+from utils import normalize_text, get_stopwords
+
+# =====================================================
+# ÍNDICE DE FRAGMENTOS + RECUPERACIÓN (BM25)
+# =====================================================
+# Parte transcripciones y documentos de un proyecto en fragmentos que respetan
+# los turnos de habla y conservan la marca de tiempo, y en cada pregunta
+# recupera solo los más relevantes dentro de un presupuesto de tokens.
+#
+# Documentos de entrada: [{"source", "content", "kind"}] con kind en
+# "transcript" | "document" | "image" (este último solo como nota de texto).
+
+CHUNK_MAX_CHARS = 1500
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 24000
+MAX_LINKED_IMAGES = 8
+HISTORY_TERM_WEIGHT = 0.5
+
+BM25_K1 = 1.4
+BM25_B = 0.75
+
+# Marcas de tiempo "[00:12:30]", "00:12", "(1:02:03)" al inicio de línea
+TIMESTAMP_RE = re.compile(r"^\s*[\[\(]?(\d{1,2}:\d{2}(?::\d{2})?)[\]\)]?")
+# Exportaciones de WhatsApp: "12/03/24, 10:15 - Ana: ..." o "[12/03/24 10:15:02] Ana: ..."
+WHATSAPP_RE = re.compile(r"^\s*\[?\d{1,2}/\d{1,2}/\d{2,4},?\s+(\d{1,2}:\d{2}(?::\d{2})?)[^\]\-]*\]?\s*-?\s*([^:]{1,40}):")
+# Turnos "Hablante 1:", "Entrevistador:", "**Ana:**"
+SPEAKER_RE = re.compile(r"^\s*(?:\*\*)?([A-ZÁÉÍÓÚÑ][\wÁÉÍÓÚÑáéíóúñ .]{0,30}?)(?:\*\*)?\s*:(?!\d)")
+IMAGE_NAME_RE = re.compile(r"[\w-]+\.(?:jpe?g|png)", re.IGNORECASE)
+
+# Preguntas sobre lo visual: adjuntamos las imágenes aunque no haya mención directa
+VISUAL_HINTS = {"imagen", "imagenes", "foto", "fotos", "fotografia", "fotografias", "visual", "visuales"}
+
+KIND_LABELS = {
+    "transcript": "TRANSCRIPCIÓN DE",
+    "document": "DOC:",
+    "image": "IMAGEN:",
+}
+
+def _tokenize(text, stopwords):
+    return [t for t in re.findall(r"\w+", normalize_text(text)) if len(t) > 2 and t not in stopwords]
+
+def _parse_turn(line):
+    """Retorna (timestamp, hablante) detectados al inicio de la línea."""
+    match = WHATSAPP_RE.match(line)
+    if match:
+        return match.group(1), match.group(2).strip()
+    timestamp = None
+    ts_match = TIMESTAMP_RE.match(line)
+    if ts_match:
+        timestamp = ts_match.group(1)
+        line = line[ts_match.end():]
+    sp_match = SPEAKER_RE.match(line)
+    return timestamp, (sp_match.group(1).strip() if sp_match else None)
+
+def split_document(doc, max_chars=CHUNK_MAX_CHARS):
+    """Parte un documento en fragmentos cortando preferiblemente en cambios de turno."""
+    chunks = []
+    current, current_len = [], 0
+    chunk_start_time, last_time = None, None
+    speakers = set()
+
+    def flush():
+        nonlocal current, current_len, speakers
+        text = "\n".join(current).strip()
+        if text:
+            chunks.append({
+                "source": doc["source"],
+                "kind": doc.get("kind", "document"),
+                "timestamp": chunk_start_time,
+                "speakers": sorted(speakers),
+                "text": text,
+            })
+        current, current_len, speakers = [], 0, set()
+
+    for line in str(doc.get("content", "")).splitlines():
+        timestamp, speaker = _parse_turn(line)
+        is_turn = bool(timestamp or speaker)
+
+        # Cortamos al empezar un turno nuevo si ya superamos la mitad del tamaño,
+        # o en cualquier línea si nos pasamos del máximo
+        if current and ((is_turn and current_len > max_chars // 2) or current_len + len(line) > max_chars):
+            flush()
+
+        if timestamp: last_time = timestamp
+        if not current: chunk_start_time = last_time
+        if speaker: speakers.add(speaker)
+
+        # Líneas gigantes (p.ej. PDFs sin saltos) se trocean duro
+        while len(line) > max_chars:
+            current.append(line[:max_chars]); current_len += max_chars
+            flush()
+            chunk_start_time = last_time
+            line = line[max_chars:]
+        current.append(line)
+        current_len += len(line) + 1
+
+    flush()
+    return chunks
+
+def build_chunk_index(documents, max_chars=CHUNK_MAX_CHARS):
+    """Construye el índice BM25 sobre los fragmentos de todos los documentos."""
+    stopwords = {normalize_text(w) for w in get_stopwords()}
+    chunks = []
+    for doc in documents:
+        chunks.extend(split_document(doc, max_chars=max_chars))
+
+    postings = defaultdict(list)
+    total_len = 0
+    for idx, chunk in enumerate(chunks):
+        terms = Counter(_tokenize(chunk["text"], stopwords))
+        chunk["length"] = sum(terms.values())
+        chunk["mentioned_images"] = sorted({m.lower() for m in IMAGE_NAME_RE.findall(chunk["text"])})
+        total_len += chunk["length"]
+        for term, tf in terms.items():
+            postings[term].append((idx, tf))
+
+    return {
+        "chunks": chunks,
+        "postings": dict(postings),
+        "avg_length": (total_len / len(chunks)) if chunks else 0,
+        "total_tokens": sum(len(c["text"]) for c in chunks) // CHARS_PER_TOKEN,
+    }
+
+def _score_chunks(index, weighted_terms):
+    n = len(index["chunks"])
+    avg_len = index["avg_length"] or 1
+    scores = defaultdict(float)
+    for term, weight in weighted_terms.items():
+        posting = index["postings"].get(term)
+        if not posting: continue
+        idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+        for idx, tf in posting:
+            length = index["chunks"][idx]["length"]
+            norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+            scores[idx] += weight * idf * norm
+    return scores
+
+def render_chunk(chunk):
+    label = KIND_LABELS.get(chunk["kind"], "DOC:")
+    meta = []
+    if chunk.get("timestamp"): meta.append(f"[{chunk['timestamp']}]")
+    if chunk.get("speakers"): meta.append(f"Hablantes: {', '.join(chunk['speakers'])}")
+    meta_str = f" | {' '.join(meta)}" if meta else ""
+    return f"--- {label} {chunk['source']}{meta_str} ---\n{chunk['text']}\n"
+
+def retrieve_context(index, question, history="", token_budget=DEFAULT_TOKEN_BUDGET, image_sources=None):
+    """
+    Selecciona los fragmentos más relevantes para la pregunta sin exceder el
+    presupuesto de tokens. Retorna (contexto_texto, fuentes_de_imagen_vinculadas).
+    Si el proyecto completo cabe en el presupuesto se envía todo.
+    """
+    chunks = index["chunks"]
+    image_sources = image_sources or []
+    if not chunks:
+        return "", list(image_sources)
+
+    stopwords = {normalize_text(w) for w in get_stopwords()}
+    question_terms = _tokenize(question, stopwords)
+
+    if index["total_tokens"] <= token_budget:
+        # Proyecto pequeño: mismo comportamiento de siempre (todo el contexto y todas las imágenes)
+        return "\n".join(render_chunk(c) for c in chunks), list(image_sources)
+
+    weighted_terms = Counter()
+    for term in _tokenize(history, stopwords): weighted_terms[term] = HISTORY_TERM_WEIGHT
+    for term in question_terms: weighted_terms[term] += 1.0
+    scores = _score_chunks(index, weighted_terms)
+
+    selected, used = [], 0
+    for idx in sorted(scores, key=scores.get, reverse=True):
+        cost = len(chunks[idx]["text"]) // CHARS_PER_TOKEN
+        if used + cost > token_budget: continue
+        selected.append(idx)
+        used += cost
+
+    if not selected:
+        # Ningún término coincide: enviamos el inicio del proyecto hasta el presupuesto
+        for idx, chunk in enumerate(chunks):
+            cost = len(chunk["text"]) // CHARS_PER_TOKEN
+            if used + cost > token_budget: break
+            selected.append(idx)
+            used += cost
+    selected.sort()
+
+    # Imágenes: las mencionadas en los fragmentos elegidos o en la pregunta,
+    # y todas si la pregunta es explícitamente visual
+    available = {s.lower(): s for s in image_sources}
+    linked = []
+    mentioned = [m for idx in selected for m in chunks[idx]["mentioned_images"]]
+    mentioned += [m.lower() for m in IMAGE_NAME_RE.findall(question)]
+    for name in mentioned:
+        if name in available and available[name] not in linked:
+            linked.append(available[name])
+    if VISUAL_HINTS.intersection(question_terms):
+        linked += [s for s in image_sources if s not in linked]
+
+    context = "\n".join(render_chunk(chunks[idx]) for idx in selected)
+    return context, linked[:MAX_LINKED_IMAGES]
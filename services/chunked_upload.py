@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import streamlit as st
+from config import LOCAL_CACHE_DIR, get_secret
+from services.logger import log_error, log_action
+
+# =====================================================
+# SUBIDAS POR PARTES (REANUDABLES) PARA ARCHIVOS GRANDES
+# =====================================================
+# El archivo se lee por partes desde el handle subido (sin getvalue()), las
+# partes se suben en paralelo con reintentos y el progreso queda guardado en
+# disco: si la subida falla, al reenviar el formulario solo se suben las
+# partes que faltan.
+#
+# Backends:
+#   - S3MultipartBackend: endpoint S3 compatible de Supabase Storage.
+#   - LocalMultipartBackend: sustituto local (carpeta en disco) para pruebas.
+# Sin backend configurado se usa la subida simple de supabase-py de siempre.
+
+PART_SIZE = 8 * 1024 * 1024  # S3 exige >= 5 MB salvo la última parte
+MAX_UPLOAD_CONCURRENCY = 4
+MAX_PART_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 0.5
+
+UPLOAD_STATE_DIR = os.path.join(LOCAL_CACHE_DIR, "uploads")
+LOCAL_STORAGE_DIR = os.environ.get("LOCAL_STORAGE_DIR", os.path.join(LOCAL_CACHE_DIR, "local_storage"))
+
+
+class S3MultipartBackend:
+    """Multipart upload sobre el endpoint S3 de Supabase Storage."""
+
+    def __init__(self, endpoint, access_key, secret_key, region):
+        import boto3
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint, region_name=region,
+            aws_access_key_id=access_key, aws_secret_access_key=secret_key
+        )
+
+    def create_upload(self, bucket, path, content_type):
+        response = self.client.create_multipart_upload(Bucket=bucket, Key=path, ContentType=content_type)
+        return response["UploadId"]
+
+    def upload_part(self, bucket, path, upload_id, part_number, data):
+        response = self.client.upload_part(Bucket=bucket, Key=path, UploadId=upload_id,
+                                           PartNumber=part_number, Body=data)
+        return response["ETag"]
+
+    def list_parts(self, bucket, path, upload_id):
+        parts, marker = {}, 0
+        while True:
+            response = self.client.list_parts(Bucket=bucket, Key=path, UploadId=upload_id, PartNumberMarker=marker)
+            for p in response.get("Parts", []):
+                parts[p["PartNumber"]] = p["ETag"]
+            if not response.get("IsTruncated"): return parts
+            marker = response["NextPartNumberMarker"]
+
+    def complete_upload(self, bucket, path, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=bucket, Key=path, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": parts[n]} for n in sorted(parts)]}
+        )
+
+
+class LocalMultipartBackend:
+    """Sustituto local: partes como archivos en disco y ensamblado al completar."""
+
+    def __init__(self, root=LOCAL_STORAGE_DIR):
+        self.root = root
+
+    def _parts_dir(self, upload_id):
+        return os.path.join(self.root, ".multipart", upload_id)
+
+    def create_upload(self, bucket, path, content_type):
+        upload_id = hashlib.sha256(f"{bucket}/{path}/{time.time()}".encode()).hexdigest()[:32]
+        os.makedirs(self._parts_dir(upload_id), exist_ok=True)
+        return upload_id
+
+    def upload_part(self, bucket, path, upload_id, part_number, data):
+        with open(os.path.join(self._parts_dir(upload_id), f"{part_number:05d}"), "wb") as f:
+            f.write(data)
+        return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+    def list_parts(self, bucket, path, upload_id):
+        parts_dir = self._parts_dir(upload_id)
+        if not os.path.isdir(parts_dir):
+            raise FileNotFoundError(upload_id)
+        parts = {}
+        for name in os.listdir(parts_dir):
+            with open(os.path.join(parts_dir, name), "rb") as f:
+                parts[int(name)] = hashlib.md5(f.read(), usedforsecurity=False).hexdigest()
+        return parts
+
+    def complete_upload(self, bucket, path, upload_id, parts):
+        target = os.path.join(self.root, bucket, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        parts_dir = self._parts_dir(upload_id)
+        with open(target, "wb") as out:
+            for n in sorted(parts):
+                with open(os.path.join(parts_dir, f"{n:05d}"), "rb") as f:
+                    out.write(f.read())
+        for name in os.listdir(parts_dir):
+            os.remove(os.path.join(parts_dir, name))
+        os.rmdir(parts_dir)
+
+
+@st.cache_resource(show_spinner=False)
+def get_upload_backend():
+    """Backend según UPLOAD_BACKEND ('s3' | 'local'); por defecto S3 si hay credenciales."""
+    mode = (os.environ.get("UPLOAD_BACKEND") or "").lower()
+    if mode == "local":
+        return LocalMultipartBackend()
+
+    endpoint = get_secret("SUPABASE_S3_ENDPOINT")
+    access_key = get_secret("SUPABASE_S3_ACCESS_KEY")
+    secret_key = get_secret("SUPABASE_S3_SECRET_KEY")
+    if endpoint and access_key and secret_key:
+        try:
+            return S3MultipartBackend(endpoint, access_key, secret_key, get_secret("SUPABASE_S3_REGION") or "us-east-1")
+        except Exception as e:
+            log_error("No se pudo iniciar el backend S3 de subidas", module="ChunkedUpload", error=e)
+    return None
+
+# =====================================================
+# ESTADO REANUDABLE
+# =====================================================
+
+def _state_path(bucket, path, size):
+    key = hashlib.sha256(f"{bucket}|{path}|{size}".encode("utf-8")).hexdigest()
+    return os.path.join(UPLOAD_STATE_DIR, f"{key}.json")
+
+def _load_state(state_path):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        state["parts"] = {int(k): v for k, v in state["parts"].items()}
+        return state
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def _save_state(state_path, state):
+    os.makedirs(UPLOAD_STATE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_STATE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def _file_size(file_obj):
+    size = getattr(file_obj, "size", None)
+    if size is None:
+        file_obj.seek(0, os.SEEK_END)
+        size = file_obj.tell()
+    return size
+
+# =====================================================
+# API PÚBLICA
+# =====================================================
+
+def upload_file(file_obj, bucket, path, content_type, progress_callback=None):
+    """
+    Sube un archivo (handle con read/seek, p.ej. UploadedFile de Streamlit).
+    Usa partes en paralelo si hay backend y el archivo supera una parte;
+    si no, la subida simple de Supabase.
+    progress_callback(bytes_subidos, bytes_totales) se invoca tras cada parte.
+    """
+    size = _file_size(file_obj)
+    backend = get_upload_backend()
+
+    if backend is None or size <= PART_SIZE:
+        from services.supabase_db import supabase
+        file_obj.seek(0)
+        supabase.storage.from_(bucket).upload(path, file_obj.read(), {"content-type": content_type, "upsert": "true"})
+        if progress_callback: progress_callback(size, size)
+        return
+
+    _upload_multipart(backend, file_obj, bucket, path, content_type, size, progress_callback)
+
+def upload_set_signature(files):
+    """Firma del conjunto de archivos de un intento (nombres y tamaños, sin leer el contenido)."""
+    digest = hashlib.sha256(usedforsecurity=False)
+    for name, size in sorted((f.name, _file_size(f)) for f in files):
+        digest.update(f"{name}\x00{size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def pending_upload_target(mode_state, key, files, new_target, discard):
+    """
+    Destino (carpeta o ruta) de un formulario de creación que sube archivos.
+    Si el intento anterior falló con los mismos archivos, se reutiliza su destino
+    para reanudar; si los archivos cambiaron, discard(destino_anterior) borra lo
+    que quedó subido y se empieza en new_target. Al crear el proyecto, el llamador
+    hace mode_state.pop(key).
+    """
+    signature = upload_set_signature(files)
+    pending = mode_state.get(key)
+    if pending and pending["signature"] == signature:
+        return pending["target"]
+    if pending:
+        try:
+            discard(pending["target"])
+        except Exception as e:
+            log_error(f"No se pudo limpiar la subida abandonada {pending['target']}",
+                      module="ChunkedUpload", error=e, level="WARNING")
+    mode_state[key] = {"target": new_target, "signature": signature}
+    return new_target
+
+def remove_storage_folder(bucket, folder):
+    """Borra todos los objetos de una carpeta de Storage."""
+    from services.supabase_db import supabase
+    files = supabase.storage.from_(bucket).list(folder)
+    if files:
+        supabase.storage.from_(bucket).remove([f"{folder}/{f['name']}" for f in files])
+
+def _upload_multipart(backend, file_obj, bucket, path, content_type, size, progress_callback):
+    state_path = _state_path(bucket, path, size)
+    state = _load_state(state_path)
+
+    # Reanudar: confirmamos con el servidor qué partes ya existen
+    if state and state.get("part_size") == PART_SIZE:
+        try:
+            state["parts"].update(backend.list_parts(bucket, path, state["upload_id"]))
+            log_action(f"Reanudando subida de {path}: {len(state['parts'])} parte(s) ya subidas", module="ChunkedUpload")
+        except Exception:
+            state = None  # La subida expiró en el servidor: empezamos de cero
+
+    if not state or state.get("part_size") != PART_SIZE:
+        state = {
+            "upload_id": backend.create_upload(bucket, path, content_type),
+            "part_size": PART_SIZE,
+            "parts": {}
+        }
+        _save_state(state_path, state)
+
+    total_parts = (size + PART_SIZE - 1) // PART_SIZE
+    pending = [n for n in range(1, total_parts + 1) if n not in state["parts"]]
+    read_lock, state_lock = threading.Lock(), threading.Lock()
+    uploaded_bytes = [min(size, len(state["parts"]) * PART_SIZE)]
+
+    def read_part(part_number):
+        # El handle es compartido: seek + read deben ser atómicos
+        with read_lock:
+            file_obj.seek((part_number - 1) * PART_SIZE)
+            return file_obj.read(PART_SIZE)
+
+    def send_part(part_number):
+        data = read_part(part_number)
+        for attempt in range(1, MAX_PART_RETRIES + 1):
+            try:
+                etag = backend.upload_part(bucket, path, state["upload_id"], part_number, data)
+                break
+            except Exception as e:
+                if attempt == MAX_PART_RETRIES: raise
+                log_error(f"Reintentando parte {part_number} de {path} (intento {attempt})",
+                          module="ChunkedUpload", error=e, level="WARNING")
+                time.sleep(RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+        with state_lock:
+            state["parts"][part_number] = etag
+            _save_state(state_path, state)
+            uploaded_bytes[0] += len(data)
+        return part_number
+
+    # Solo MAX_UPLOAD_CONCURRENCY partes en memoria a la vez
+    with ThreadPoolExecutor(max_workers=MAX_UPLOAD_CONCURRENCY) as executor:
+        futures = [executor.submit(send_part, n) for n in pending]
+        for future in as_completed(futures):
+            future.result()
+            if progress_callback: progress_callback(min(uploaded_bytes[0], size), size)
+
+    backend.complete_upload(bucket, path, state["upload_id"], state["parts"])
+    os.remove(state_path)
@@ -0,0 +1,69 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from services.logger import log_error
+
+# =====================================================
+# OPTIMIZACIÓN DE MEMORIA DE DATAFRAMES
+# =====================================================
+# Las encuestas llegan con todo como object/float64/int64. Al cargarlas:
+#   - Columnas de texto con pocos valores distintos (Likert, segmentos) -> category
+#   - Texto abierto -> string[pyarrow] (mucho menor que object)
+#   - Enteros -> el entero más pequeño que los contiene
+#   - Flotantes -> float32 solo si la conversión no pierde precisión
+# El DataFrame optimizado es el que vive en la caché de carga y en mode_state.
+
+CATEGORY_MAX_RATIO = 0.5     # distintos / filas no vacías
+CATEGORY_MAX_UNIQUE = 1000
+
+def _optimize_text(series):
+    non_null = series.dropna()
+    n_unique = non_null.nunique()
+    if len(non_null) and n_unique <= CATEGORY_MAX_UNIQUE and n_unique / len(non_null) <= CATEGORY_MAX_RATIO:
+        return series.astype("category")
+    if pd.api.types.infer_dtype(non_null, skipna=True) == "string":
+        return series.astype("string[pyarrow]")
+    return series  # Tipos mezclados: se dejan como están
+
+def _optimize_float(series):
+    as_f32 = series.astype(np.float32)
+    same = (as_f32.astype(np.float64) == series) | series.isna()
+    return as_f32 if same.all() else series
+
+def optimize_dataframe(df):
+    """Retorna (df_optimizado, reporte) con reporte = {"before", "after"} en bytes."""
+    before = int(df.memory_usage(deep=True).sum())
+    out = df.copy()
+    for col in out.columns:
+        series = out[col]
+        try:
+            if pd.api.types.is_bool_dtype(series):
+                continue
+            if pd.api.types.is_integer_dtype(series):
+                out[col] = pd.to_numeric(series, downcast="integer")
+            elif pd.api.types.is_float_dtype(series):
+                out[col] = _optimize_float(series)
+            elif pd.api.types.is_object_dtype(series):
+                out[col] = _optimize_text(series)
+        except Exception as e:
+            # Una columna rara no debe impedir cargar el dataset
+            log_error(f"No se pudo optimizar la columna '{col}'", module="DataFrameUtils", error=e, level="WARNING")
+    after = int(out.memory_usage(deep=True).sum())
+    return out, {"before": before, "after": after}
+
+def format_bytes(num_bytes):
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024: return f"{num_bytes:,.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:,.1f} GB"
+
+def memory_report_caption(report):
+    saved = 1 - report["after"] / report["before"] if report["before"] else 0
+    return f"Memoria del dataset: {format_bytes(report['before'])} → {format_bytes(report['after'])} ({saved:.0%} menos)"
+
+def dataframe_hash(df):
+    """Huella estable del contenido (valores, índice y nombres de columnas) para claves de caché."""
+    digest = hashlib.sha256()
+    digest.update("|".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
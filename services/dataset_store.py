@@ -0,0 +1,85 @@
+import io
+import os
+import pandas as pd
+from services.supabase_db import supabase
+from services.logger import log_error, log_action
+
+# =====================================================
+# DATASETS EN PARQUET (CARGA RÁPIDA)
+# =====================================================
+# Al crear un proyecto de Análisis de Datos el Excel se convierte una sola vez
+# a Parquet (columnar, tipos ya inferidos) y se guarda junto al original:
+#   <user>/<uuid>.xlsx  ->  <user>/<uuid>.parquet
+# Las cargas leen el Parquet (con proyección de columnas si se pide) y solo
+# caen al Excel si el Parquet no existe; en ese caso lo generan para la
+# próxima vez (proyectos creados antes de este cambio).
+
+PARQUET_EXT = ".parquet"
+PARQUET_COMPRESSION = "zstd"
+
+def parquet_path_for(storage_path):
+    return f"{os.path.splitext(storage_path)[0]}{PARQUET_EXT}"
+
+def _coerce_for_parquet(df):
+    """
+    Columnas object con tipos mezclados (números y textos) se guardan como texto;
+    las homogéneas (solo enteros, booleanos, fechas...) pasan a su dtype, el
+    mismo que devuelve el Parquet al releerlas.
+    """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.select_dtypes(include="object").columns:
+        inferred = pd.api.types.infer_dtype(df[col], skipna=True)
+        if inferred == "mixed-integer-float":
+            df[col] = pd.to_numeric(df[col])
+        elif inferred.startswith("mixed"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        else:
+            df[col] = df[col].infer_objects()
+    return df
+
+def dataframe_to_parquet_bytes(df):
+    buffer = io.BytesIO()
+    _coerce_for_parquet(df).to_parquet(buffer, engine="pyarrow", index=False, compression=PARQUET_COMPRESSION)
+    return buffer.getvalue()
+
+def upload_parquet_artifact(df, bucket, storage_path):
+    """Guarda el Parquet junto al Excel. Retorna False si no se pudo (el Excel sigue siendo válido)."""
+    try:
+        supabase.storage.from_(bucket).upload(
+            parquet_path_for(storage_path), dataframe_to_parquet_bytes(df),
+            {"content-type": "application/vnd.apache.parquet", "upsert": "true"}
+        )
+        return True
+    except Exception as e:
+        log_error(f"No se pudo generar el Parquet de {storage_path}", module="DatasetStore", error=e, level="WARNING")
+        return False
+
+def convert_excel_upload(file_obj, bucket, storage_path):
+    """Convierte el Excel recién subido (handle de Streamlit) a Parquet. Retorna False si no se pudo."""
+    try:
+        file_obj.seek(0)
+        df = pd.read_excel(file_obj)
+    except Exception as e:
+        # El proyecto se crea igual: la primera carga lee el Excel y genera el Parquet
+        log_error(f"No se pudo leer el Excel de {storage_path} para convertirlo", module="DatasetStore", error=e, level="WARNING")
+        return False
+    return upload_parquet_artifact(df, bucket, storage_path)
+
+def read_dataset(bucket, storage_path, columns=None):
+    """Lee el dataset desde Parquet (solo `columns` si se indican); Excel como respaldo."""
+    try:
+        raw = supabase.storage.from_(bucket).download(parquet_path_for(storage_path))
+        return pd.read_parquet(io.BytesIO(raw), columns=columns)
+    except Exception as e:
+        log_action(f"Parquet no disponible para {storage_path}, leyendo Excel ({e})", module="DatasetStore")
+
+    response = supabase.storage.from_(bucket).create_signed_url(storage_path, 60)
+    # Mismos tipos y valores que devolvería el Parquet
+    df = _coerce_for_parquet(pd.read_excel(response['signedURL']))
+    upload_parquet_artifact(df, bucket, storage_path)
+    return df[columns] if columns else df
+
+def dataset_paths(storage_path):
+    """Todos los objetos de Storage de un proyecto (para borrarlo)."""
+    return [storage_path, parquet_path_for(storage_path)]
@@ -0,0 +1,62 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from services.gemini_api import call_gemini_api
+from prompts import get_document_summary_prompt, get_text_analysis_summary_prompt
+
+# =====================================================
+# RESUMEN MAP-REDUCE DE PROYECTOS DE TEXTO
+# =====================================================
+# Map: un resumen por documento, generados en paralelo. Cada resumen se
+# identifica por el hash del contenido + versión del prompt y se persiste en
+# los artefactos del proyecto (services.project_artifacts), así al reabrir el
+# proyecto solo se resumen los documentos nuevos o modificados.
+# Reduce: el resumen del proyecto se genera a partir de esos resúmenes.
+
+SUMMARY_VERSION = 1
+MAX_SUMMARY_WORKERS = 4
+MAP_MAX_CHARS = 300000  # Tope defensivo por documento para el paso map
+
+def summary_key(document):
+    payload = f"v{SUMMARY_VERSION}|{document['source']}|{document['content']}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _summarize_document(document):
+    prompt = get_document_summary_prompt(document["source"], document["content"][:MAP_MAX_CHARS])
+    return call_gemini_api(prompt, generation_config_override={"max_output_tokens": 2048})
+
+def summarize_documents(documents, cached=None, progress_callback=None):
+    """
+    Resume todos los documentos reutilizando los ya calculados.
+    cached: {clave: resumen} guardado previamente.
+    Retorna ({source: resumen}, {clave: resumen}) — el segundo para persistir.
+    """
+    cached = cached or {}
+    by_source, by_key, missing = {}, {}, []
+    for doc in documents:
+        key = summary_key(doc)
+        if key in cached:
+            by_source[doc["source"]] = by_key[key] = cached[key]
+        else:
+            missing.append((doc, key))
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(MAX_SUMMARY_WORKERS, len(missing))) as executor:
+            results = executor.map(lambda item: _summarize_document(item[0]), missing)
+            for done, ((doc, key), summary) in enumerate(zip(missing, results), start=1):
+                if progress_callback: progress_callback(done, len(missing), doc["source"])
+                if summary:
+                    by_source[doc["source"]] = by_key[key] = summary
+
+    return by_source, by_key
+
+def project_summary_key(summaries_by_key):
+    return hashlib.sha256("|".join(sorted(summaries_by_key)).encode("utf-8")).hexdigest()
+
+def render_summaries(summaries):
+    return "\n\n".join(f"--- RESUMEN: {source} ---\n{text}" for source, text in summaries.items())
+
+def reduce_summaries(summaries):
+    """Paso reduce: informe del proyecto a partir de los resúmenes por documento."""
+    if not summaries: return None
+    return call_gemini_api(get_text_analysis_summary_prompt(render_summaries(summaries)),
+                           generation_config_override={"max_output_tokens": 8192})
@@ -0,0 +1,80 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from config import banner_file
+from services.logger import log_error
+
+# =====================================================
+# EXPORTACIONES BAJO DEMANDA (PDF / WORD)
+# =====================================================
+# Los documentos ya no se generan en cada rerun: se piden con un botón, se
+# construyen en un pool de hilos del proceso y quedan memoizados por
+# (formato, hash del título + contenido). Mientras el contenido no cambie, el
+# mismo archivo se reutiliza entre reruns y entre sesiones.
+
+EXPORT_WORKERS = 2
+MAX_EXPORT_ENTRIES = 32
+
+FORMATS = {
+    "pdf": {"label": "PDF", "mime": "application/pdf"},
+    "docx": {"label": "Word", "mime": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"},
+}
+
+
+def _render(fmt, text, title):
+    # Importes diferidos: los generadores cargan reportlab / python-docx
+    if fmt == "pdf":
+        from reporting.pdf_generator import generate_pdf_html
+        return generate_pdf_html(text, title=title, banner_path=banner_file)
+    from reporting.docx_generator import generate_docx
+    return generate_docx(text, title=title)
+
+
+class ExportJobs:
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(fmt, text, title):
+        digest = hashlib.sha256(f"{title}\x00{text}".encode("utf-8")).hexdigest()
+        return (fmt, digest)
+
+    def get(self, fmt, text, title):
+        """Future del documento (o None si nunca se pidió)."""
+        key = self.key(fmt, text, title)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None: self._jobs.move_to_end(key)
+            return future
+
+    def submit(self, fmt, text, title):
+        key = self.key(fmt, text, title)
+        with self._lock:
+            future = self._jobs.get(key)
+            # Un intento fallido (None o excepción) se puede repetir
+            if future is not None and not (future.done() and (future.exception() or future.result() is None)):
+                return future
+            future = self._executor.submit(self._run, fmt, text, title)
+            self._jobs[key] = future
+            self._jobs.move_to_end(key)
+            while len(self._jobs) > MAX_EXPORT_ENTRIES:
+                self._jobs.popitem(last=False)
+            return future
+
+    @staticmethod
+    def _run(fmt, text, title):
+        try:
+            return _render(fmt, text, title)
+        except Exception as e:
+            log_error(f"Fallo generando {fmt.upper()}", module="ExportJobs", error=e)
+            return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_export_jobs():
+    """Un único pool + memo por proceso."""
+    return ExportJobs()
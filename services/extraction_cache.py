@@ -0,0 +1,113 @@
+import os
+import io
+import gzip
+import json
+import hashlib
+import tempfile
+from config import LOCAL_CACHE_DIR
+from services.logger import log_error
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+# =====================================================
+# CACHÉ DE EXTRACCIÓN DE TEXTO (PDF / DOCX)
+# =====================================================
+# Clave: SHA-256 de los bytes del archivo. El mismo documento abierto desde
+# otro modo, otra sesión o tras expirar el TTL de st.cache_data se lee del
+# disco (JSON comprimido con gzip) sin volver a pasar por PyMuPDF/python-docx.
+#
+# Formato: {"v", "text", "offsets"}; "offsets" son los índices de inicio de
+# cada página (PDF) o de cada párrafo (DOCX) dentro de "text".
+
+EXTRACTION_CACHE_DIR = os.path.join(LOCAL_CACHE_DIR, "extraction")
+EXTRACTOR_VERSION = 1
+
+def file_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _cache_path(digest, kind):
+    return os.path.join(EXTRACTION_CACHE_DIR, digest[:2], f"{digest}.{kind}.v{EXTRACTOR_VERSION}.json.gz")
+
+def _read_cached(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log_error(f"Caché de extracción corrupta: {path}", module="ExtractionCache", error=e, level="WARNING")
+        return None
+
+def _write_cached(path, payload):
+    # Escritura atómica: otro proceso nunca ve un archivo a medio escribir
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+            f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def _join_with_offsets(parts, separator=""):
+    offsets, position = [], 0
+    for part in parts:
+        offsets.append(position)
+        position += len(part) + len(separator)
+    return separator.join(parts), offsets
+
+def _extract_pdf(data):
+    if fitz is None:
+        raise RuntimeError("Librería PyMuPDF/fitz no disponible")
+    with fitz.open(stream=data, filetype="pdf") as pdf_doc:
+        pages = [page.get_text() for page in pdf_doc]
+    return _join_with_offsets(pages)
+
+def _extract_docx(data):
+    if docx is None:
+        raise RuntimeError("Librería python-docx no disponible")
+    document = docx.Document(io.BytesIO(data))
+    paragraphs = [p.text for p in document.paragraphs if p.text.strip()]
+    return _join_with_offsets(paragraphs, "\n")
+
+EXTRACTORS = {
+    "pdf": _extract_pdf,
+    "docx": _extract_docx,
+}
+
+def extract_document(data, file_ext):
+    """
+    Extrae texto de un PDF/DOCX usando la caché compartida.
+    Retorna {"text", "offsets", "sha256"}.
+    """
+    kind = file_ext.lower().lstrip(".")
+    if kind not in EXTRACTORS:
+        raise ValueError(f"Tipo de documento no soportado: {file_ext}")
+
+    digest = file_sha256(data)
+    path = _cache_path(digest, kind)
+
+    cached = _read_cached(path)
+    if cached is not None:
+        return {"text": cached["text"], "offsets": cached["offsets"], "sha256": digest}
+
+    text, offsets = EXTRACTORS[kind](data)
+    try:
+        _write_cached(path, {"v": EXTRACTOR_VERSION, "text": text, "offsets": offsets})
+    except Exception as e:
+        # La caché es una optimización: si el disco falla seguimos con el texto
+        log_error("No se pudo guardar la caché de extracción", module="ExtractionCache", error=e, level="WARNING")
+
+    return {"text": text, "offsets": offsets, "sha256": digest}
+
+def extract_text(data, file_ext):
+    return extract_document(data, file_ext)["text"]
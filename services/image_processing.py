@@ -0,0 +1,78 @@
+import hashlib
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# =====================================================
+# NORMALIZACIÓN DE IMÁGENES ANTES DE GEMINI
+# =====================================================
+# Las fotos de celular pesan 5-12 MB. Antes de enviarlas (o guardarlas en
+# caché) limitamos el lado mayor, quitamos EXIF (re-codificando sin metadatos)
+# y usamos JPEG con calidad eficiente. Las imágenes idénticas se descartan
+# por hash.
+
+MAX_IMAGE_SIDE = 1536
+JPEG_QUALITY = 82
+OUTPUT_MIME_TYPE = "image/jpeg"
+
+def image_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def normalize_image(image_bytes, max_side=MAX_IMAGE_SIDE, quality=JPEG_QUALITY):
+    """
+    Retorna {"mime_type", "data", "sha256", "original_size"} con la imagen
+    reducida y re-codificada. Lanza excepción si los bytes no son una imagen.
+    """
+    with Image.open(BytesIO(image_bytes)) as img:
+        # Respetamos la orientación de la cámara antes de descartar el EXIF
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=quality, optimize=True)
+        data = output.getvalue()
+
+    return {
+        "mime_type": OUTPUT_MIME_TYPE,
+        "data": data,
+        "sha256": image_hash(data),
+        "original_size": len(image_bytes)
+    }
+
+def as_gemini_part(image_part):
+    """Blob mínimo para Gemini (descarta metadatos propios como 'source' o 'sha256')."""
+    return {"mime_type": image_part["mime_type"], "data": image_part["data"]}
+
+class ImageDeduplicator:
+    """Normaliza imágenes y descarta las repetidas (mismo archivo o mismo resultado)."""
+
+    def __init__(self):
+        self._seen = {}
+
+    def remember(self, part_sha256, source):
+        """Registra una imagen ya normalizada en otra carga (p.ej. artefactos guardados)."""
+        self._seen.setdefault(part_sha256, source)
+
+    def add(self, image_bytes, source):
+        """Retorna (parte_normalizada, None) o (None, fuente_original) si ya existía."""
+        raw_hash = image_hash(image_bytes)
+        if raw_hash in self._seen:
+            return None, self._seen[raw_hash]
+
+        part = normalize_image(image_bytes)
+        if part["sha256"] in self._seen:
+            self._seen[raw_hash] = self._seen[part["sha256"]]
+            return None, self._seen[part["sha256"]]
+
+        part["source"] = source
+        self._seen[raw_hash] = source
+        self._seen[part["sha256"]] = source
+        return part, None
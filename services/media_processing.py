@@ -0,0 +1,156 @@
+import os
+import re
+import shutil
+import subprocess  # nosec B404 - solo se invoca ffmpeg con argumentos controlados
+import tempfile
+from services.logger import log_error
+
+# =====================================================
+# PRE-PROCESAMIENTO LOCAL DE AUDIO / VIDEO
+# =====================================================
+# Antes de enviar medios a Gemini los reducimos con ffmpeg:
+#   - Audio: mono, 16 kHz, AAC a 32 kbps (suficiente para voz).
+#   - Grabaciones largas: segmentos alineados en el tiempo para transcribir en paralelo.
+#   - Video: fotogramas clave muestreados (JPEG) + la pista de audio.
+# Si ffmpeg no está instalado (ver packages.txt) las funciones devuelven None
+# y los llamadores envían los bytes originales como antes.
+
+FFMPEG_BIN = shutil.which("ffmpeg")
+
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_BITRATE = "32k"
+AUDIO_MIME_TYPE = "audio/aac"
+SEGMENT_SECONDS = 600
+
+KEYFRAME_INTERVAL_SECONDS = 15
+MAX_KEYFRAMES = 12
+KEYFRAME_MAX_SIDE = 768
+KEYFRAME_JPEG_QUALITY = 5  # Escala qscale de ffmpeg (2 = mejor, 31 = peor)
+
+FFMPEG_TIMEOUT_SECONDS = 900
+
+def ffmpeg_available():
+    return FFMPEG_BIN is not None
+
+def format_timestamp(seconds):
+    seconds = int(seconds or 0)
+    return f"{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
+
+def _run_ffmpeg(args):
+    cmd = [FFMPEG_BIN, "-hide_banner", "-nostdin", "-loglevel", "error", "-y"] + args
+    return subprocess.run(cmd, capture_output=True, timeout=FFMPEG_TIMEOUT_SECONDS)  # nosec B603
+
+def _probe_duration(input_path):
+    """Lee la duración (segundos) del encabezado que ffmpeg imprime en stderr."""
+    try:
+        result = subprocess.run([FFMPEG_BIN, "-hide_banner", "-nostdin", "-i", input_path],
+                                capture_output=True, timeout=60)  # nosec B603
+        match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr.decode("utf-8", "ignore"))
+        if match:
+            h, m, s = match.groups()
+            return int(h) * 3600 + int(m) * 60 + float(s)
+    except Exception:
+        pass
+    return None
+
+def _write_input(tmp_dir, media_bytes, file_ext):
+    # ffmpeg necesita un archivo con seek: los .mov/.mp4 suelen tener el índice (moov) al final
+    input_path = os.path.join(tmp_dir, f"input{file_ext or '.bin'}")
+    with open(input_path, "wb") as f:
+        f.write(media_bytes)
+    return input_path
+
+def _extract_audio_from_path(input_path, tmp_dir, segment_seconds):
+    out_pattern = os.path.join(tmp_dir, "audio_%04d.aac")
+    args = ["-i", input_path, "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+            "-c:a", "aac", "-b:a", AUDIO_BITRATE]
+    if segment_seconds:
+        args += ["-f", "segment", "-segment_time", str(segment_seconds),
+                 "-segment_format", "adts", "-reset_timestamps", "1", out_pattern]
+    else:
+        args += ["-f", "adts", out_pattern % 0]
+
+    result = _run_ffmpeg(args)
+    if result.returncode != 0:
+        # Videos sin pista de audio terminan aquí: no es un error para el llamador
+        return []
+
+    segments = []
+    for idx, name in enumerate(sorted(n for n in os.listdir(tmp_dir) if n.startswith("audio_"))):
+        with open(os.path.join(tmp_dir, name), "rb") as f:
+            data = f.read()
+        if data:
+            segments.append({
+                "start_seconds": idx * segment_seconds if segment_seconds else 0,
+                "mime_type": AUDIO_MIME_TYPE,
+                "data": data
+            })
+    return segments
+
+def _extract_keyframes_from_path(input_path, tmp_dir, interval_seconds, max_frames):
+    duration = _probe_duration(input_path)
+    if duration:
+        # Repartimos los fotogramas a lo largo de todo el video, no solo el inicio
+        interval_seconds = max(interval_seconds, duration / max_frames)
+
+    out_pattern = os.path.join(tmp_dir, "frame_%04d.jpg")
+    scale = f"scale='min({KEYFRAME_MAX_SIDE},iw)':'min({KEYFRAME_MAX_SIDE},ih)':force_original_aspect_ratio=decrease"
+    result = _run_ffmpeg([
+        "-i", input_path, "-an",
+        "-vf", f"fps=1/{interval_seconds:.3f},{scale}",
+        "-frames:v", str(max_frames), "-q:v", str(KEYFRAME_JPEG_QUALITY), out_pattern
+    ])
+    if result.returncode != 0:
+        return []
+
+    frames = []
+    for idx, name in enumerate(sorted(n for n in os.listdir(tmp_dir) if n.startswith("frame_"))):
+        with open(os.path.join(tmp_dir, name), "rb") as f:
+            frames.append({
+                "timestamp_seconds": idx * interval_seconds,
+                "mime_type": "image/jpeg",
+                "data": f.read()
+            })
+    return frames
+
+def prepare_media(media_bytes, file_ext, is_video=False, segment_seconds=SEGMENT_SECONDS,
+                  keyframe_interval=KEYFRAME_INTERVAL_SECONDS, max_keyframes=MAX_KEYFRAMES):
+    """
+    Reduce un audio/video a partes livianas para Gemini.
+    Retorna {"audio_segments": [...], "keyframes": [...], "original_size", "processed_size"}
+    o None si ffmpeg no está disponible o el archivo no se pudo procesar.
+    segment_seconds=None produce una única pista de audio.
+    """
+    if not ffmpeg_available() or not media_bytes:
+        return None
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="atl_media_") as tmp_dir:
+            input_path = _write_input(tmp_dir, media_bytes, file_ext)
+            audio_dir = os.path.join(tmp_dir, "audio")
+            os.makedirs(audio_dir)
+            audio_segments = _extract_audio_from_path(input_path, audio_dir, segment_seconds)
+
+            keyframes = []
+            if is_video:
+                frames_dir = os.path.join(tmp_dir, "frames")
+                os.makedirs(frames_dir)
+                keyframes = _extract_keyframes_from_path(input_path, frames_dir, keyframe_interval, max_keyframes)
+
+        if not audio_segments and not keyframes:
+            return None
+
+        processed_size = sum(len(p["data"]) for p in audio_segments + keyframes)
+        return {
+            "audio_segments": audio_segments,
+            "keyframes": keyframes,
+            "original_size": len(media_bytes),
+            "processed_size": processed_size
+        }
+    except Exception as e:
+        log_error("Fallo pre-procesando medio con ffmpeg", module="MediaProcessing", error=e, level="WARNING")
+        return None
+
+def keyframes_in_range(keyframes, start_seconds, end_seconds):
+    """Fotogramas cuyo instante cae dentro de [start, end)."""
+    return [f for f in keyframes if start_seconds <= f["timestamp_seconds"] < end_seconds]
@@ -0,0 +1,128 @@
+import os
+import mmap
+import hashlib
+import tempfile
+import threading
+import streamlit as st
+from config import LOCAL_CACHE_DIR
+from services.logger import log_error
+
+# =====================================================
+# ALMACÉN DE MEDIOS EN DISCO (HANDLES LIVIANOS)
+# =====================================================
+# Los modos ya no guardan bytes de imágenes en st.cache_data / session_state:
+# guardan un "handle" (dict pequeño) y los bytes viven en un caché local en
+# disco con desalojo por tamaño (el menos usado recientemente sale primero).
+# Los bytes se leen (mmap) solo al armar el prompt. Si un archivo fue
+# desalojado, se vuelve a descargar de Storage y se normaliza otra vez.
+
+MEDIA_STORE_DIR = os.path.join(LOCAL_CACHE_DIR, "media")
+MEDIA_STORE_MAX_BYTES = int(os.environ.get("MEDIA_STORE_MAX_MB", "1024")) * 1024 * 1024
+EVICTION_TARGET_RATIO = 0.9  # Al desalojar bajamos al 90% para no desalojar en cada escritura
+
+
+class DiskMediaStore:
+    def __init__(self, root=MEDIA_STORE_DIR, max_bytes=MEDIA_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._total_bytes = sum(os.path.getsize(p) for p in self._all_paths())
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _all_paths(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(dirpath, name)
+
+    def put(self, data, mime_type, source, origin=None):
+        """Guarda los bytes (direccionados por contenido) y retorna el handle."""
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._total_bytes += len(data)
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        return {"key": key, "mime_type": mime_type, "size": len(data), "source": source, "origin": origin}
+
+    def read(self, key):
+        """Lee los bytes vía mmap. Retorna None si fueron desalojados."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = mm[:]
+            os.utime(path)  # Marca de uso reciente para el desalojo LRU
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _evict(self):
+        entries = []
+        for path in self._all_paths():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICTION_TARGET_RATIO
+        for _, size, path in entries:
+            if total <= target: break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+
+@st.cache_resource(show_spinner=False)
+def get_media_store():
+    return DiskMediaStore()
+
+def store_media(data, mime_type, source, origin=None):
+    """
+    Guarda bytes en el almacén y retorna un handle:
+    {"key", "mime_type", "size", "source", "origin": {"bucket", "path"} | None}
+    """
+    return get_media_store().put(data, mime_type, source, origin=origin)
+
+def _refetch_image(handle):
+    """Reconstruye una imagen desalojada desde su origen en Storage."""
+    from services.supabase_db import supabase
+    from services.image_processing import normalize_image
+
+    origin = handle.get("origin")
+    if not origin: return None
+    raw = supabase.storage.from_(origin["bucket"]).download(origin["path"])
+    part = normalize_image(raw)
+    get_media_store().put(part["data"], part["mime_type"], handle["source"], origin=origin)
+    return part["data"]
+
+def load_media_part(handle):
+    """Retorna el blob {"mime_type", "data"} listo para Gemini, o None si no se pudo recuperar."""
+    data = get_media_store().read(handle["key"])
+    if data is None:
+        try:
+            data = _refetch_image(handle)
+        except Exception as e:
+            log_error(f"No se pudo recuperar el medio '{handle.get('source')}'", module="MediaStore", error=e, level="WARNING")
+            return None
+    if data is None: return None
+    return {"mime_type": handle["mime_type"], "data": data}
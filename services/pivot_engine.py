@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from services.weighted_statistics import clean_weights, weighted_chi_squared, weighted_crosstab, weighted_cell_sums
+
+# =====================================================
+# MOTOR DE TABLAS DINÁMICAS
+# =====================================================
+# Cada columna usada como fila/columna se codifica a enteros una sola vez por
+# dataset (códigos 0..k-1, -1 = vacío). Un crosstab es entonces un
+# np.bincount sobre fila * k_columnas + columna (weighted_crosstab), y cada resultado (tabla +
+# chi²) queda memoizado por (hash del dataset, filas, columnas, valores,
+# agregación, ponderador) con desalojo LRU: los reruns de Streamlit por otros
+# widgets no recalculan nada. Con ponderador, los conteos son sumas de pesos
+# y el chi² se ajusta por efecto de diseño (services.weighted_statistics; sin
+# ponderador es la misma prueba con pesos 1).
+
+PIVOT_CACHE_MAX_ENTRIES = 128
+AGGREGATIONS = {"count": "Conteo", "sum": "Suma", "mean": "Promedio"}
+
+_pivot_cache = OrderedDict()
+_pivot_cache_lock = threading.Lock()
+
+
+class PivotEngine:
+    def __init__(self, df, dataset_hash):
+        self.df = df
+        self.dataset_hash = dataset_hash
+        self._codes = {}
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def weights(self, column):
+        with self._lock:
+            if column not in self._weights:
+                self._weights[column] = clean_weights(self.df[column])
+            return self._weights[column]
+
+    def codes(self, column):
+        """(códigos, etiquetas) de la columna; se calcula una vez por dataset."""
+        with self._lock:
+            if column not in self._codes:
+                series = self.df[column]
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    self._codes[column] = (series.cat.codes.to_numpy(dtype=np.int64), series.cat.categories)
+                else:
+                    codes, labels = pd.factorize(series, sort=True)
+                    self._codes[column] = (codes.astype(np.int64), labels)
+            return self._codes[column]
+
+    def _compute(self, rows, cols, values, aggfunc, weight=None):
+        r_codes, r_labels = self.codes(rows)
+        if cols:
+            c_codes, c_labels = self.codes(cols)
+        else:
+            c_codes, c_labels = np.zeros(len(self.df), dtype=np.int64), pd.Index([values])
+        n_cols = len(c_labels)
+
+        # Filas sin valor quedan con peso 0 (fuera de la tabla); sin ponderador, peso 1
+        value_series = self.df[values]
+        x = pd.to_numeric(value_series, errors="coerce").to_numpy(dtype=float) if aggfunc != "count" else None
+        present = value_series.notna().to_numpy() if x is None else ~np.isnan(x)
+        row_weights = np.where(present, self.weights(weight) if weight else 1.0, 0.0)
+
+        counts, w = weighted_crosstab(r_codes, c_codes, row_weights, len(r_labels), n_cols)
+        if aggfunc == "count":
+            result = counts if weight else counts.astype(np.int64)
+        else:
+            sums = weighted_cell_sums(r_codes, c_codes, row_weights, np.nan_to_num(x), len(r_labels), n_cols)
+            if aggfunc == "sum":
+                result = sums
+            elif aggfunc == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result = np.where(counts > 0, sums / np.where(counts > 0, counts, 1), 0.0)
+            else:
+                raise ValueError(f"Agregación no soportada: {aggfunc}")
+
+        # Igual que pd.pivot_table: solo filas/columnas observadas, vacíos = 0
+        keep_r, keep_c = counts.sum(axis=1) > 0, counts.sum(axis=0) > 0
+        table = pd.DataFrame(result[keep_r][:, keep_c],
+                             index=pd.Index(np.asarray(r_labels)[keep_r], name=rows),
+                             columns=pd.Index(np.asarray(c_labels)[keep_c], name=cols))
+        return table, w
+
+    def _significance(self, table, cell_weights, weight):
+        # Misma prueba con y sin ponderador: sin él los pesos son 1 y deff = 1
+        p_value, residuals, deff = weighted_chi_squared(table.to_numpy(), cell_weights)
+        if residuals is not None:
+            residuals = pd.DataFrame(residuals, index=table.index, columns=table.columns)
+        return p_value, residuals, deff if weight else None
+
+    def pivot(self, rows, cols=None, values=None, aggfunc="count", weight=None):
+        """
+        Retorna {"table", "p_value", "residuals", "deff"}; el chi² solo aplica a
+        conteos. Los resultados son compartidos: no modificarlos.
+        """
+        key = (self.dataset_hash, rows, cols, values, aggfunc, weight)
+        with _pivot_cache_lock:
+            if key in _pivot_cache:
+                _pivot_cache.move_to_end(key)
+                return _pivot_cache[key]
+
+        table, cell_weights = self._compute(rows, cols, values, aggfunc, weight=weight)
+        p_value, residuals, deff = (
+            self._significance(table, cell_weights, weight) if aggfunc == "count" and cols else (None, None, None)
+        )
+        result = {"table": table, "p_value": p_value, "residuals": residuals, "deff": deff}
+
+        with _pivot_cache_lock:
+            _pivot_cache[key] = result
+            _pivot_cache.move_to_end(key)
+            while len(_pivot_cache) > PIVOT_CACHE_MAX_ENTRIES:
+                _pivot_cache.popitem(last=False)
+        return result
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_pivot_engine(dataset_hash, _df):
+    """Un motor (con sus códigos) por dataset; _df no se hashea."""
+    return PivotEngine(_df, dataset_hash)
@@ -0,0 +1,157 @@
+import gzip
+import json
+import hashlib
+from services.supabase_db import supabase
+from services.logger import log_error, log_action
+from services.chunk_index import build_chunk_index
+
+# =====================================================
+# ARTEFACTOS PERSISTIDOS POR PROYECTO
+# =====================================================
+# Cada proyecto (Texto / EtnoChat) guarda en su carpeta de Storage un único
+# "_atl_artifacts.json.gz" con lo ya calculado: texto extraído por archivo,
+# índice de fragmentos, resúmenes y estadísticas, más un manifiesto con la
+# huella (eTag + tamaño) de cada archivo fuente. Al reabrir el proyecto basta
+# con un list() y esa lectura; solo se reprocesan los archivos que cambiaron.
+#
+# Formato:
+#   {"v", "files": {nombre: {"fingerprint", "documents", "media", "stats"}},
+#    "summaries": {clave: texto}, "project_summary": {"key", "text"},
+#    "index_key", "chunk_index"}
+
+ARTIFACT_PREFIX = "_atl_"
+ARTIFACTS_FILE = f"{ARTIFACT_PREFIX}artifacts.json.gz"
+ARTIFACTS_VERSION = 1
+LEGACY_SUMMARY_PREFIX = f"{ARTIFACT_PREFIX}summary_"  # Resúmenes sueltos anteriores al bundle
+
+def is_artifact_file(file_name):
+    """Archivos generados por la app dentro de la carpeta del proyecto."""
+    return file_name.startswith(ARTIFACT_PREFIX)
+
+def file_fingerprint(file_info):
+    """Huella de un archivo a partir de la metadata de list() (sin descargarlo)."""
+    if not file_info: return None
+    meta = file_info.get("metadata") or {}
+    version = meta.get("eTag") or file_info.get("updated_at") or file_info.get("id")
+    return f"{version}|{meta.get('size')}"
+
+def _empty_artifacts():
+    return {"v": ARTIFACTS_VERSION, "files": {}, "summaries": {}, "project_summary": None,
+            "index_key": None, "chunk_index": None}
+
+
+class ProjectArtifacts:
+    def __init__(self, bucket, storage_folder, data=None):
+        self.bucket = bucket
+        self.storage_folder = storage_folder
+        self.data = data if data and data.get("v") == ARTIFACTS_VERSION else _empty_artifacts()
+        self.dirty = False
+
+    @classmethod
+    def load(cls, bucket, storage_folder, files_list=None):
+        """Lee el bundle si existe (files_list evita un download cuando no está)."""
+        if files_list is not None and not any(f["name"] == ARTIFACTS_FILE for f in files_list):
+            return cls(bucket, storage_folder)
+        try:
+            raw = supabase.storage.from_(bucket).download(f"{storage_folder}/{ARTIFACTS_FILE}")
+            return cls(bucket, storage_folder, json.loads(gzip.decompress(raw).decode("utf-8")))
+        except Exception as e:
+            log_error(f"Artefactos ilegibles en {storage_folder}; se regeneran", module="ProjectArtifacts", error=e, level="WARNING")
+            return cls(bucket, storage_folder)
+
+    def purge_legacy_files(self, files_list):
+        """Borra de la carpeta los _atl_summary_<hash>.txt que el bundle reemplazó."""
+        legacy = [f"{self.storage_folder}/{f['name']}" for f in files_list or []
+                  if f["name"].startswith(LEGACY_SUMMARY_PREFIX)]
+        if not legacy: return
+        try:
+            supabase.storage.from_(self.bucket).remove(legacy)
+            log_action(f"{len(legacy)} resumen(es) antiguo(s) eliminados: {self.storage_folder}", module="ProjectArtifacts")
+        except Exception as e:
+            log_error("No se pudieron borrar los resúmenes antiguos", module="ProjectArtifacts", error=e, level="WARNING")
+
+    def save(self):
+        if not self.dirty: return False
+        payload = gzip.compress(json.dumps(self.data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        try:
+            supabase.storage.from_(self.bucket).upload(
+                f"{self.storage_folder}/{ARTIFACTS_FILE}", payload,
+                {"content-type": "application/gzip", "upsert": "true"}
+            )
+            self.dirty = False
+            log_action(f"Artefactos guardados ({len(payload) // 1024} KB): {self.storage_folder}", module="ProjectArtifacts")
+            return True
+        except Exception as e:
+            # Es una optimización: sin artefactos el proyecto se reprocesa la próxima vez
+            log_error("No se pudieron guardar los artefactos del proyecto", module="ProjectArtifacts", error=e, level="WARNING")
+            return False
+
+    # --- Archivos fuente ---
+
+    def get_entry(self, file_name, fingerprint):
+        """Entrada cacheada del archivo si su huella no cambió; None si hay que reprocesarlo."""
+        entry = self.data["files"].get(file_name)
+        if entry and fingerprint and entry["fingerprint"] == fingerprint:
+            return entry
+        return None
+
+    def put_entry(self, file_name, fingerprint, documents, media=None):
+        text = "\n".join(d["content"] for d in documents)
+        entry = {
+            "fingerprint": fingerprint,
+            "documents": documents,
+            "media": media or [],
+            "stats": {"chars": len(text), "words": len(text.split())}
+        }
+        self.data["files"][file_name] = entry
+        self.dirty = True
+        return entry
+
+    def prune(self, present_names):
+        """Quita del manifiesto los archivos que ya no están en Storage."""
+        for name in set(self.data["files"]) - set(present_names):
+            del self.data["files"][name]
+            self.dirty = True
+
+    def documents(self):
+        return [doc for name in sorted(self.data["files"]) for doc in self.data["files"][name]["documents"]]
+
+    def media(self):
+        return [h for name in sorted(self.data["files"]) for h in self.data["files"][name]["media"]]
+
+    def stats(self):
+        return {name: entry["stats"] for name, entry in self.data["files"].items()}
+
+    # --- Derivados ---
+
+    def _sources_key(self):
+        payload = "|".join(f"{name}:{entry['fingerprint']}" for name, entry in sorted(self.data["files"].items()))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def chunk_index(self):
+        """Índice BM25 del proyecto; se reconstruye solo si cambió algún archivo."""
+        key = self._sources_key()
+        if self.data["index_key"] != key or self.data["chunk_index"] is None:
+            self.data["chunk_index"] = build_chunk_index(self.documents())
+            self.data["index_key"] = key
+            self.dirty = True
+        return self.data["chunk_index"]
+
+    @property
+    def summaries(self):
+        """Resúmenes por documento {clave_de_contenido: texto} (ver services.document_summaries)."""
+        return self.data["summaries"]
+
+    def set_summaries(self, summaries_by_key):
+        """Reemplaza los resúmenes (descarta los de documentos que ya no existen)."""
+        if summaries_by_key != self.data["summaries"]:
+            self.data["summaries"] = dict(summaries_by_key)
+            self.dirty = True
+
+    def get_project_summary(self, key):
+        cached = self.data.get("project_summary")
+        return cached["text"] if cached and cached["key"] == key else None
+
+    def set_project_summary(self, key, text):
+        self.data["project_summary"] = {"key": key, "text": text}
+        self.dirty = True
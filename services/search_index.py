@@ -0,0 +1,161 @@
+import re
+import hashlib
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+import streamlit as st
+from utils import normalize_text
+
+# =====================================================
+# ÍNDICE POSICIONAL DEL REPOSITORIO
+# =====================================================
+# Se construye una vez por repositorio (db_full) y se reutiliza en todas las
+# búsquedas del Radar de Tendencias:
+#   - Texto por documento (todos sus grupos unidos) con el caso original.
+#   - Por documento, los offsets de inicio/fin de cada token en ese texto.
+#   - Índice invertido: término normalizado -> {doc_id: array de posiciones}.
+# Una consulta con varios términos (incluidas frases de varias palabras) solo
+# consulta listas de posiciones; nunca vuelve a recorrer el texto. El
+# fragmento de cada documento es la ventana de tokens con más términos
+# distintos (y luego más coincidencias), no la primera aparición.
+# Coincidencia por prefijo sobre el vocabulario ordenado: "cerveza" encuentra
+# "cervezas" (en una frase, solo su última palabra es prefijo). A diferencia
+# de la búsqueda por subcadena anterior, ya no coincide a mitad de palabra.
+
+_TOKEN_RE = re.compile(r"\w+")
+
+SNIPPET_WINDOW_TOKENS = 70
+SNIPPET_CONTEXT_TOKENS = 12
+MIN_PREFIX_CHARS = 3  # Términos más cortos solo coinciden exactos
+
+@lru_cache(maxsize=200000)
+def _norm_token(token):
+    return normalize_text(token)
+
+def _query_tokens(term):
+    return [_norm_token(t) for t in _TOKEN_RE.findall(str(term))]
+
+
+class RepositoryIndex:
+    def __init__(self, db):
+        self.names = []
+        self.texts = []
+        self.starts = []
+        self.ends = []
+        self.postings = {}
+
+        for doc_id, doc in enumerate(db):
+            text = " ".join(str(g.get("contenido_texto", "")) for g in doc.get("grupos", []))
+            starts, ends = array("I"), array("I")
+            for pos, match in enumerate(_TOKEN_RE.finditer(text)):
+                starts.append(match.start())
+                ends.append(match.end())
+                by_doc = self.postings.setdefault(_norm_token(match.group()), {})
+                positions = by_doc.get(doc_id)
+                if positions is None:
+                    by_doc[doc_id] = positions = array("I")
+                positions.append(pos)
+            self.names.append(doc.get("nombre_archivo", "Documento sin nombre"))
+            self.texts.append(text)
+            self.starts.append(starts)
+            self.ends.append(ends)
+        self.vocabulary = sorted(self.postings)
+
+    def _token_postings(self, token, prefix):
+        """Posiciones del token; con prefix, unidas las de todo término que empiece por él."""
+        if not prefix or len(token) < MIN_PREFIX_CHARS:
+            return self.postings.get(token, {})
+        merged = {}
+        i = bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            for doc_id, positions in self.postings[self.vocabulary[i]].items():
+                merged.setdefault(doc_id, []).extend(positions)
+            i += 1
+        return merged
+
+    def term_positions(self, term):
+        """{doc_id: [posición de inicio]} de un término (frases: tokens consecutivos)."""
+        tokens = _query_tokens(term)
+        if not tokens: return {}
+        first = self._token_postings(tokens[0], prefix=len(tokens) == 1)
+        if len(tokens) == 1:
+            return {doc_id: sorted(positions) for doc_id, positions in first.items()}
+
+        rest = [self._token_postings(t, prefix=i == len(tokens) - 2) for i, t in enumerate(tokens[1:])]
+        result = {}
+        for doc_id, positions in first.items():
+            if not all(doc_id in r for r in rest): continue
+            following = [set(r[doc_id]) for r in rest]
+            hits = [p for p in positions if all(p + i + 1 in following[i] for i in range(len(following)))]
+            if hits: result[doc_id] = hits
+        return result
+
+    def _densest_window(self, hits):
+        """hits: [(posición, término)] ordenado. Retorna (inicio, fin) en tokens."""
+        best, best_key = (hits[0][0], hits[0][0]), (0, 0)
+        counts = {}
+        left = 0
+        for right, (pos, term) in enumerate(hits):
+            counts[term] = counts.get(term, 0) + 1
+            while pos - hits[left][0] >= SNIPPET_WINDOW_TOKENS:
+                old = hits[left][1]
+                counts[old] -= 1
+                if not counts[old]: del counts[old]
+                left += 1
+            key = (len(counts), right - left + 1)
+            if key > best_key:
+                best_key, best = key, (hits[left][0], pos)
+        return best
+
+    def snippet(self, doc_id, hits):
+        first, last = self._densest_window(hits)
+        starts, ends = self.starts[doc_id], self.ends[doc_id]
+        # Centra la ventana: el contexto sobrante se reparte a ambos lados
+        pad = SNIPPET_CONTEXT_TOKENS + max(0, SNIPPET_WINDOW_TOKENS - (last - first + 1)) // 2
+        lo = max(0, first - pad)
+        hi = min(len(ends) - 1, last + pad)
+        return " ".join(self.texts[doc_id][starts[lo]:ends[hi]].split())
+
+    def search(self, terms, limit=7):
+        """
+        Un barrido por todos los términos. Retorna [{"doc", "score", "snippet",
+        "matches"}] ordenado por términos distintos y luego por coincidencias.
+        """
+        doc_hits = {}
+        for term in dict.fromkeys(t for t in terms if t):
+            for doc_id, positions in self.term_positions(term).items():
+                doc_hits.setdefault(doc_id, {})[term] = positions
+
+        ranked = sorted(doc_hits.items(),
+                        key=lambda item: (len(item[1]), sum(len(p) for p in item[1].values())),
+                        reverse=True)[:limit]
+        results = []
+        for doc_id, by_term in ranked:
+            hits = sorted((pos, term) for term, positions in by_term.items() for pos in positions)
+            results.append({
+                "doc": self.names[doc_id],
+                "score": len(by_term),
+                "snippet": self.snippet(doc_id, hits),
+                "matches": list(by_term),
+            })
+        return results
+
+
+def repository_fingerprint(db):
+    """
+    Huella del repositorio cargado, para la caché: nombres y texto de cada
+    grupo (sha1 sobre el contenido; mucho más barato que reconstruir el índice).
+    """
+    digest = hashlib.sha1(str(len(db)).encode("utf-8"), usedforsecurity=False)
+    for doc in db:
+        grupos = doc.get("grupos", [])
+        digest.update(f"\x00{doc.get('nombre_archivo', '')}\x00{len(grupos)}".encode("utf-8"))
+        for g in grupos:
+            text = str(g.get("contenido_texto", ""))
+            digest.update(f"\x01{len(text)}\x01{text}".encode("utf-8"))
+    return digest.hexdigest()
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_repository_index(fingerprint, _db):
+    """Un índice por repositorio; _db no se hashea."""
+    return RepositoryIndex(_db)
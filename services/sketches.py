@@ -0,0 +1,116 @@
+import math
+import numpy as np
+import pandas as pd
+
+# =====================================================
+# ESTRUCTURAS APROXIMADAS EN STREAMING
+# =====================================================
+# Resúmenes de memoria acotada que se alimentan por bloques de filas:
+#   - ReservoirSample: muestra uniforme de tamaño fijo (Algoritmo R por bloques)
+#   - TDigest: cuantiles aproximados (centroides con escala k1)
+#   - HyperLogLog: cardinalidad aproximada (~1.6% de error con p=12)
+# Todo vectorizado con NumPy por bloque; ningún bucle por fila.
+
+
+class ReservoirSample:
+    def __init__(self, size=10000, seed=0):
+        self.size = size
+        self.seen = 0
+        self.values = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=object)
+        n = len(values)
+        if n == 0: return
+
+        # Primero se llena el reservorio
+        free = min(n, max(0, self.size - len(self.values)))
+        if free:
+            self.values.extend(values[:free].tolist())
+        rest = values[free:]
+
+        if len(rest):
+            # El elemento i (global) reemplaza una posición al azar con probabilidad size / (i + 1)
+            positions = np.arange(self.seen + free, self.seen + n) + 1
+            slots = (self._rng.random(len(rest)) * positions).astype(np.int64)
+            accepted = slots < self.size
+            for slot, value in zip(slots[accepted], rest[accepted]):
+                self.values[slot] = value
+        self.seen += n
+
+    def to_series(self):
+        return pd.Series(self.values, dtype=object)
+
+
+class TDigest:
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * np.arcsin(2 * np.clip(q, 0, 1) - 1)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0: return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+
+        # Cada centroide abarca como máximo una unidad de la escala k1:
+        # los puntos se agrupan por floor(k(q)) y se promedian por grupo
+        cumulative = np.cumsum(weights)
+        q_mid = (cumulative - weights / 2) / cumulative[-1]
+        groups = np.floor(self._k(q_mid)).astype(np.int64)
+        groups -= groups.min()
+        group_weights = np.bincount(groups, weights=weights)
+        group_sums = np.bincount(groups, weights=means * weights)
+        keep = group_weights > 0
+        self.weights = group_weights[keep]
+        self.means = group_sums[keep] / self.weights
+
+    def quantile(self, q):
+        if len(self.weights) == 0: return float("nan")
+        if len(self.weights) == 1: return float(self.means[0])
+        cumulative = np.cumsum(self.weights)
+        centers = (cumulative - self.weights / 2) / cumulative[-1]
+        xs = np.concatenate([[0.0], centers, [1.0]])
+        ys = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q, xs, ys))
+
+
+class HyperLogLog:
+    def __init__(self, precision=12):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, values):
+        values = pd.Series(values).dropna()
+        if values.empty: return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Posición del primer bit en 1 dentro de los (64 - p) bits restantes
+        bit_length = np.zeros(len(rest), dtype=np.int64)
+        nonzero = rest > 0
+        bit_length[nonzero] = np.floor(np.log2(rest[nonzero].astype(float))).astype(np.int64) + 1
+        rank = (64 - self.p) - bit_length + 1
+        np.maximum.at(self.registers, idx, rank.astype(np.uint8))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)  # Rango pequeño: conteo lineal
+        return int(round(estimate))
@@ -1,27 +1,101 @@
+import streamlit as st
 import pandas as pd
 import scipy.stats as stats
 import numpy as np
+from scipy import sparse
 import io
-import re
+import math
+from services.text_matching import KeywordMatcher
+from services.sketches import ReservoirSample, TDigest, HyperLogLog
+
+SNAPSHOT_CHUNK_ROWS = 100000
+SNAPSHOT_SAMPLE_SIZE = 10000
+SNAPSHOT_MAX_CATEGORIES = 50
+
+class _ColumnSummary:
+    """Resumen en streaming de una columna (memoria acotada)."""
+
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.total = 0
+        self.distinct = HyperLogLog()
+        if numeric:
+            self.digest = TDigest()
+            # Momentos (n, media, M2) combinados por bloque (Chan et al.): estables sin restar sumas grandes
+            self.n = 0
+            self.mean = 0.0
+            self.m2 = 0.0
+        else:
+            self.sample = ReservoirSample(SNAPSHOT_SAMPLE_SIZE)
+
+    def add(self, series):
+        self.total += len(series)
+        series = series.dropna()
+        self.count += len(series)
+        self.distinct.add(series)
+        if self.numeric:
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            self.digest.add(values)
+            self._merge_moments(values)
+        else:
+            self.sample.add(series.astype(str).to_numpy(dtype=object))
+
+    def _merge_moments(self, values):
+        n_b = len(values)
+        if not n_b: return
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / n
+        self.n = n
+
+    def numeric_row(self):
+        n = self.n
+        return {
+            "count": n, "mean": self.mean if n else float("nan"),
+            "std": math.sqrt(self.m2 / (n - 1)) if n > 1 else float("nan"),
+            "min": self.digest.quantile(0), "25%": self.digest.quantile(0.25), "50%": self.digest.quantile(0.5),
+            "75%": self.digest.quantile(0.75), "max": self.digest.quantile(1)
+        }
+
+def get_dataframe_snapshot(df, chunk_rows=SNAPSHOT_CHUNK_ROWS):
+    """
+    Genera un resumen textual técnico del DataFrame para enviarlo a la IA.
+    Una sola pasada por bloques de filas con estructuras aproximadas
+    (t-digest, HyperLogLog, muestras de reservorio): tiempo y memoria acotados.
+    """
+    summaries = {
+        col: _ColumnSummary(pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]))
+        for col in df.columns
+    }
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for col, summary in summaries.items():
+            summary.add(chunk[col])
 
-def get_dataframe_snapshot(df):
-    """Genera un resumen textual técnico del DataFrame para enviarlo a la IA."""
     snapshot_buffer = io.StringIO()
     snapshot_buffer.write(f"Total Filas: {len(df)}\n\n")
-    df.info(buf=snapshot_buffer, verbose=False)
+    snapshot_buffer.write(f"Columnas ({len(df.columns)}):\n")
+    for col, summary in summaries.items():
+        snapshot_buffer.write(f"- {col}: {df[col].dtype}, {summary.count} no nulos, ~{summary.distinct.count()} valores distintos\n")
     
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if not numeric_cols.empty:
-        snapshot_buffer.write("\nMétricas Numéricas:\n")
-        snapshot_buffer.write(df[numeric_cols].describe().to_string(float_format="%.2f"))
+    numeric = {col: s.numeric_row() for col, s in summaries.items() if s.numeric}
+    if numeric:
+        snapshot_buffer.write("\nMétricas Numéricas (cuantiles aproximados):\n")
+        snapshot_buffer.write(pd.DataFrame(numeric).to_string(float_format="%.2f"))
         
-    cat_cols = df.select_dtypes(include=['object', 'category']).columns
-    if not cat_cols.empty:
-        snapshot_buffer.write("\nDistribución Categórica (Top 5):\n")
-        for col in cat_cols:
-            if df[col].nunique() < 50: 
+    categorical = {col: s for col, s in summaries.items() if not s.numeric}
+    if categorical:
+        snapshot_buffer.write("\n\nDistribución Categórica (Top 5, estimada sobre muestra):\n")
+        for col, summary in categorical.items():
+            if summary.distinct.count() < SNAPSHOT_MAX_CATEGORIES:
+                shares = summary.sample.to_series().value_counts(normalize=True).head(5) * 100
                 snapshot_buffer.write(f"\n{col}:\n")
-                snapshot_buffer.write(df[col].value_counts(normalize=True).head(5).to_string(float_format="%.1f%%"))
+                snapshot_buffer.write(shares.to_string(float_format="%.1f%%"))
     
     return snapshot_buffer.getvalue()
 
@@ -49,33 +123,205 @@ def calculate_group_comparison(df, num_col, cat_col):
         
     return test_type, p, len(groups)
 
+def match_autocode_categories(df, col_to_autocode, categories_list):
+    """
+    Escanea la columna una sola vez con todas las keywords (Aho-Corasick).
+    Retorna (categorías_con_keywords, conteos, membresía) con membresía =
+    matriz dispersa respuestas × categorías para cruces posteriores.
+    """
+    categories = [cat for cat in categories_list if any(k.strip() for k in cat.get('keywords', []))]
+    matcher = KeywordMatcher([[k for k in cat.get('keywords', []) if k.strip()] for cat in categories])
+    counts, membership = matcher.match_series(df[col_to_autocode])
+    return categories, counts, membership
+
 def process_autocode_results(df, col_to_autocode, categories_list):
     """
-    Procesa las categorías generadas por IA y cuenta coincidencias en el DataFrame usando Regex.
+    Procesa las categorías generadas por IA y cuenta las respuestas que mencionan
+    alguna de sus keywords (coincidencia por palabra completa, sin tildes ni mayúsculas).
     Retorna un DataFrame con los resultados.
     """
-    results = []
-    full_text = df[col_to_autocode].astype(str)
+    categories, counts, _ = match_autocode_categories(df, col_to_autocode, categories_list)
     total_rows = len(df)
     
-    for cat in categories_list:
-        # Extraer keywords y limpiar
-        kw = [re.escape(k.strip()) for k in cat.get('keywords', []) if k.strip()]
-        if not kw: continue
-        
-        # Construir patrón regex seguro (word boundaries)
-        pattern = r'\b(?:' + '|'.join(kw) + r')\b'
-        
-        try:
-            count = full_text.str.contains(pattern, case=False, regex=True).sum()
-        except:
-            count = 0
-            
+    results = []
+    for cat, count in zip(categories, counts):
         results.append({
             "Categoría": cat['categoria'],
             "Menciones": int(count),
-            "%": round((count / total_rows) * 100, 1),
+            "%": round((count / total_rows) * 100, 1) if total_rows else 0.0,
             "Keywords": ", ".join(cat.get('keywords', [])[:5]) # Guardar keywords para referencia
         })
     
-    return pd.DataFrame(results).sort_values("Menciones", ascending=False)
+    return pd.DataFrame(results, columns=["Categoría", "Menciones", "%", "Keywords"]).sort_values("Menciones", ascending=False)
+
+# =====================================================
+# ESCANEO DE SIGNIFICANCIA (TODOS LOS PARES)
+# =====================================================
+# Chi² para cada par categórica × categórica y ANOVA (T-Test si hay dos
+# grupos) para cada par numérica × categórica, en bloque: cada categórica se
+# codifica una vez como entero y se pasa a una matriz one-hot dispersa; los
+# crosstabs de una variable contra todas las demás salen de un solo producto
+# de matrices, y las sumas por grupo de todas las numéricas también.
+# Corre en serie dentro del proceso de Streamlit: con la codificación dispersa
+# el escaneo completo es rápido y no compensa copiar los datos a otros procesos.
+# Los p-values se corrigen con Benjamini-Hochberg (FDR).
+
+SCAN_MAX_LEVELS = 30        # Categóricas con más niveles se ignoran (texto abierto, IDs)
+SCAN_MIN_GROUP_SIZE = 2
+
+def _category_codes(series):
+    """Códigos enteros 0..k-1 (-1 = vacío) y cantidad de niveles."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.remove_unused_categories()
+        return series.cat.codes.to_numpy(dtype=np.int64), len(series.cat.categories)
+    codes, uniques = pd.factorize(series)
+    return codes.astype(np.int64), len(uniques)
+
+def _one_hot(codes, n_levels):
+    valid = codes >= 0
+    rows = np.flatnonzero(valid)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, codes[valid])), shape=(len(codes), n_levels))
+
+def scan_columns(df, max_levels=SCAN_MAX_LEVELS):
+    """Separa columnas candidatas: (categóricas, numéricas)."""
+    categorical, numeric = [], []
+    for col in df.columns:
+        series = df[col]
+        n_unique = series.nunique(dropna=True)
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            if n_unique > max_levels: numeric.append(col)
+            elif n_unique >= 2: categorical.append(col)  # Escalas codificadas (1-5) se tratan como categorías
+        elif 2 <= n_unique <= max_levels:
+            categorical.append(col)
+    return categorical, numeric
+
+def benjamini_hochberg(p_values):
+    """q-values de Benjamini-Hochberg (misma forma que la entrada)."""
+    p = np.asarray(p_values, dtype=float)
+    n = len(p)
+    if n == 0: return p
+    order = np.argsort(p)
+    ranked = p[order] * n / np.arange(1, n + 1)
+    q_sorted = np.minimum.accumulate(ranked[::-1])[::-1]
+    q = np.empty(n)
+    q[order] = np.minimum(q_sorted, 1.0)
+    return q
+
+def _chi2_block(a_name, a_onehot, others):
+    """Chi² de una categórica contra varias: others = [(nombre, one-hot)]."""
+    if not others: return []
+    names = [name for name, _ in others]
+    widths = [m.shape[1] for _, m in others]
+    tables = (a_onehot.T @ sparse.hstack([m for _, m in others], format="csr")).toarray()
+
+    rows, start = [], 0
+    for name, width in zip(names, widths):
+        table = tables[:, start:start + width]
+        start += width
+        table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0]
+        if min(table.shape) < 2: continue
+        n = table.sum()
+        expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+        chi2 = ((table - expected) ** 2 / expected).sum()
+        dof = (table.shape[0] - 1) * (table.shape[1] - 1)
+        rows.append({
+            "a": a_name, "b": name, "test": "Chi²", "stat": chi2, "dof": dof, "n": int(n),
+            "effect": np.sqrt(chi2 / (n * (min(table.shape) - 1))),  # V de Cramér
+            "low_expected": float((expected < 5).mean())
+        })
+    return rows
+
+def _numeric_moments(X):
+    """
+    Indicadora de no vacío, valores y cuadrados (NaN -> 0) de las numéricas, una
+    sola vez. Los valores se centran en la media de su columna: las sumas de
+    cuadrados por grupo no pierden precisión con magnitudes grandes y poca
+    dispersión, y la ANOVA no cambia (es invariante a un desplazamiento).
+    """
+    valid = ~np.isnan(X)
+    counts = valid.sum(axis=0)
+    shift = np.where(counts > 0, np.where(valid, X, 0.0).sum(axis=0) / np.maximum(counts, 1), 0.0)
+    X0 = np.where(valid, X - shift, 0.0)
+    return valid.astype(float), X0, X0 ** 2
+
+def _anova_block(cat_name, onehot, numeric_names, moments):
+    """ANOVA de todas las numéricas (moments = _numeric_moments(X)) por una categórica."""
+    if not numeric_names: return []
+    valid, X0, X0sq = moments
+    counts = onehot.T @ valid          # niveles × numéricas
+    sums = onehot.T @ X0
+    sumsq = onehot.T @ X0sq
+
+    rows = []
+    for j, num_name in enumerate(numeric_names):
+        n_g, s_g, ss_g = counts[:, j], sums[:, j], sumsq[:, j]
+        keep = n_g >= SCAN_MIN_GROUP_SIZE
+        k = int(keep.sum())
+        if k < 2: continue
+        n_g, s_g, ss_g = n_g[keep], s_g[keep], ss_g[keep]
+        n = n_g.sum()
+        if n - k <= 0: continue
+        means = s_g / n_g
+        grand = s_g.sum() / n
+        ss_between = (n_g * (means - grand) ** 2).sum()
+        ss_within = (ss_g - n_g * means ** 2).sum()
+        if ss_within <= 0: continue
+        f_stat = (ss_between / (k - 1)) / (ss_within / (n - k))
+        rows.append({
+            # Con dos grupos el F de ANOVA es t² del T-Test de varianzas iguales (mismo p-value)
+            "a": num_name, "b": cat_name, "test": "T-Test" if k == 2 else "ANOVA",
+            "stat": f_stat, "dof": (k - 1, int(n - k)), "n": int(n),
+            "effect": ss_between / (ss_between + ss_within),  # Eta²
+            "low_expected": 0.0
+        })
+    return rows
+
+def _run_scan(df, max_levels=SCAN_MAX_LEVELS):
+    categorical, numeric = scan_columns(df, max_levels=max_levels)
+    # Cada categórica se codifica una sola vez y se reutiliza en todos sus pares
+    encoded = [(col, _one_hot(*_category_codes(df[col]))) for col in categorical]
+    X = df[numeric].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float) if numeric else np.empty((len(df), 0))
+    moments = _numeric_moments(X)
+
+    # Cada par categórico se calcula una sola vez (a contra las que le siguen)
+    rows = []
+    for i, (name, onehot) in enumerate(encoded):
+        rows.extend(_chi2_block(name, onehot, encoded[i + 1:]))
+        rows.extend(_anova_block(name, onehot, numeric, moments))
+    return rows
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def significance_scan(dataset_hash, _df, max_levels=SCAN_MAX_LEVELS):
+    """
+    Escanea todos los pares y retorna una tabla ordenada por q-value.
+    Cacheada por hash del dataset (_df no se hashea; ver services.dataframe_utils.dataframe_hash).
+    """
+    columns = ["Variable", "Cruce", "Prueba", "Estadístico", "gl", "N", "Efecto", "p-value", "q-value (BH)", "Alerta"]
+    rows = _run_scan(_df, max_levels=max_levels)
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    # p-values en bloque
+    chi_mask = np.array([r["test"] == "Chi²" for r in rows])
+    stat = np.array([r["stat"] for r in rows], dtype=float)
+    p_values = np.empty(len(rows))
+    if chi_mask.any():
+        p_values[chi_mask] = stats.chi2.sf(stat[chi_mask], [r["dof"] for r, m in zip(rows, chi_mask) if m])
+    if (~chi_mask).any():
+        dofs = np.array([r["dof"] for r, m in zip(rows, chi_mask) if not m])
+        p_values[~chi_mask] = stats.f.sf(stat[~chi_mask], dofs[:, 0], dofs[:, 1])
+    q_values = benjamini_hochberg(p_values)
+
+    table = pd.DataFrame({
+        "Variable": [r["a"] for r in rows],
+        "Cruce": [r["b"] for r in rows],
+        "Prueba": [r["test"] for r in rows],
+        "Estadístico": stat.round(3),
+        "gl": [str(r["dof"]) if r["test"] == "Chi²" else f"{r['dof'][0]}, {r['dof'][1]}" for r in rows],
+        "N": [r["n"] for r in rows],
+        "Efecto": np.array([r["effect"] for r in rows]).round(3),
+        "p-value": p_values,
+        "q-value (BH)": q_values,
+        "Alerta": ["Frecuencias esperadas bajas" if r["low_expected"] > 0.2 else "" for r in rows],
+    }, columns=columns)
+    return table.sort_values(["q-value (BH)", "Efecto"], ascending=[True, False]).reset_index(drop=True)
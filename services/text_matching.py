@@ -0,0 +1,106 @@
+import re
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from utils import normalize_text
+
+# =====================================================
+# BÚSQUEDA MULTI-PATRÓN (AHO-CORASICK)
+# =====================================================
+# Un solo autómata con todas las keywords de todas las categorías: cada
+# respuesta se normaliza una vez (minúsculas, sin tildes, espacios simples) y
+# se recorre una sola vez, sin importar cuántas categorías haya. Las
+# coincidencias deben caer en límites de palabra (equivalente a \b...\b).
+# Respuestas repetidas ("No sé", "Ninguno") se escanean una sola vez.
+
+_SPACES_RE = re.compile(r"\s+")
+
+def _normalize(text):
+    return _SPACES_RE.sub(" ", normalize_text(text)).strip()
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    def __init__(self, keyword_groups):
+        """keyword_groups: lista (una por categoría) de listas de keywords."""
+        self.n_groups = len(keyword_groups)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # Por estado: [(largo_patrón, índice_categoría)]
+
+        for group_idx, keywords in enumerate(keyword_groups):
+            for keyword in keywords:
+                pattern = _normalize(keyword)
+                if pattern: self._add(pattern, group_idx)
+        self._build_failure_links()
+
+    def _add(self, pattern, group_idx):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({}); self._fail.append(0); self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), group_idx))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                # Las salidas del sufijo más largo también son salidas de este estado
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def match_normalized(self, text):
+        """Índices de categoría con al menos una keyword en `text` (ya normalizado)."""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state, last = 0, len(text) - 1
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]: continue
+            after_ok = i == last or not _is_word_char(text[i + 1])
+            if not after_ok: continue
+            for length, group_idx in out[state]:
+                start = i - length + 1
+                if start == 0 or not _is_word_char(text[start - 1]):
+                    found.add(group_idx)
+        return found
+
+    def match(self, text):
+        return self.match_normalized(_normalize(text))
+
+    def match_series(self, series):
+        """
+        Escanea una columna de texto. Retorna (conteos_por_categoría, membresía)
+        con membresía = matriz dispersa CSR booleana respuestas × categorías.
+        """
+        memo = {}
+        rows, cols = [], []
+        for row_idx, value in enumerate(series.tolist()):
+            if pd.isna(value): continue
+            text = _normalize(value)
+            hits = memo.get(text)
+            if hits is None:
+                hits = memo[text] = sorted(self.match_normalized(text))
+            rows.extend([row_idx] * len(hits))
+            cols.extend(hits)
+
+        membership = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=bool), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=(len(series), self.n_groups)
+        )
+        counts = np.asarray(membership.sum(axis=0)).ravel().astype(int)
+        return counts, membership
@@ -0,0 +1,346 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import streamlit as st
+
+from config import LOCAL_CACHE_DIR
+from services.logger import log_error, log_action
+from services.media_processing import prepare_media, keyframes_in_range, format_timestamp
+
+# =====================================================
+# COLA DE TRANSCRIPCIÓN EN SEGUNDO PLANO (ETNOCHAT)
+# =====================================================
+# La cola es persistente: en producción vive en una tabla compartida y aquí
+# usamos SQLite local como sustituto. Los workers toman trabajos pendientes,
+# reducen el medio con ffmpeg (services.media_processing), lo transcriben con
+# Gemini y escriben el "_transcript.txt" en el mismo folder del proyecto.
+
+QUEUE_DB_PATH = os.path.join(LOCAL_CACHE_DIR, "transcription_jobs.sqlite3")
+MAX_TRANSCRIPTION_WORKERS = int(os.environ.get("TRANSCRIPTION_WORKERS", "2"))
+MAX_JOB_ATTEMPTS = 3
+SEGMENT_WORKERS = 3  # Segmentos de una misma grabación transcritos en paralelo
+POLL_INTERVAL_SECONDS = 5
+RETRY_BACKOFF_SECONDS = 60        # Espera antes del 2º intento; se duplica en cada fallo
+STALE_JOB_SECONDS = 2 * 3600      # 'procesando' de otro host sin cambios en este tiempo: se da por perdido
+WORKER_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+STATUS_PENDING = "pendiente"
+STATUS_RUNNING = "procesando"
+STATUS_DONE = "lista"
+STATUS_ERROR = "error"
+
+TRANSCRIPT_SUFFIX = "_transcript.txt"
+
+
+class SQLiteJobStore:
+    """
+    Almacén de trabajos sobre SQLite. Cada operación abre (y cierra) su propia
+    conexión para poder usarse desde varios hilos sin compartir cursores.
+    """
+
+    def __init__(self, db_path=QUEUE_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcription_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bucket TEXT NOT NULL,
+                    storage_folder TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    next_attempt_at TEXT,
+                    owner TEXT,
+                    UNIQUE (bucket, storage_folder, file_name)
+                )
+            """)
+            # Bases creadas antes de los reintentos con espera / dueño del trabajo
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(transcription_jobs)")}
+            for column in ("next_attempt_at", "owner"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE transcription_jobs ADD COLUMN {column} TEXT")
+
+    def _connect(self):
+        # Modo autocommit: cada sentencia se confirma sola; quien abre, cierra
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, bucket, storage_folder, file_name, mime_type):
+        """
+        Registra un trabajo. Si ya existía y falló, o terminó pero su
+        transcripción ya no está (quien encola es quien lo verificó), lo
+        devuelve a la cola. Los pendientes o en curso no se tocan.
+        """
+        now = datetime.now().isoformat()
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                INSERT INTO transcription_jobs
+                    (bucket, storage_folder, file_name, mime_type, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bucket, storage_folder, file_name) DO UPDATE SET
+                    status = CASE WHEN status IN (?, ?) THEN ? ELSE status END,
+                    attempts = CASE WHEN status IN (?, ?) THEN 0 ELSE attempts END,
+                    next_attempt_at = CASE WHEN status IN (?, ?) THEN NULL ELSE next_attempt_at END,
+                    mime_type = excluded.mime_type,
+                    updated_at = excluded.updated_at
+            """, (bucket, storage_folder, file_name, mime_type, STATUS_PENDING, now, now,
+                  STATUS_ERROR, STATUS_DONE, STATUS_PENDING,
+                  STATUS_ERROR, STATUS_DONE,
+                  STATUS_ERROR, STATUS_DONE))
+
+    def claim_next(self):
+        """Toma de forma atómica el trabajo pendiente más antiguo."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = datetime.now().isoformat()
+            row = conn.execute(
+                "SELECT * FROM transcription_jobs WHERE status = ? "
+                "AND (next_attempt_at IS NULL OR next_attempt_at <= ?) ORDER BY id LIMIT 1",
+                (STATUS_PENDING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE transcription_jobs SET status = ?, attempts = attempts + 1, owner = ?, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, WORKER_OWNER, now, row["id"])
+            )
+            conn.execute("COMMIT")
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def mark(self, job_id, status, error=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE transcription_jobs SET status = ?, last_error = ?, owner = NULL, updated_at = ? WHERE id = ?",
+                (status, error, datetime.now().isoformat(), job_id)
+            )
+
+    def retry_later(self, job_id, attempts, error=None):
+        """Devuelve el trabajo a la cola con espera exponencial según los intentos hechos."""
+        delay = RETRY_BACKOFF_SECONDS * 2 ** max(0, attempts - 1)
+        now = datetime.now()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE transcription_jobs SET status = ?, last_error = ?, owner = NULL, "
+                "next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (STATUS_PENDING, error, (now + timedelta(seconds=delay)).isoformat(), now.isoformat(), job_id)
+            )
+
+    @staticmethod
+    def _is_orphaned(owner, updated_at):
+        """Un 'procesando' está huérfano si su proceso (en este host) ya no existe o si lleva demasiado sin cambios."""
+        host, _, pid = (owner or "").rpartition(":")
+        if host == socket.gethostname() and pid.isdigit():
+            if int(pid) == os.getpid():
+                return False  # Hilos de este mismo proceso
+            try:
+                os.kill(int(pid), 0)
+                return False
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                return False  # Existe, pero es de otro usuario
+        age = datetime.now() - datetime.fromisoformat(updated_at)
+        return age.total_seconds() > STALE_JOB_SECONDS
+
+    def requeue_stale(self):
+        """Al arrancar, devuelve a la cola solo los 'procesando' cuyo worker ya no existe."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, owner, updated_at FROM transcription_jobs WHERE status = ?", (STATUS_RUNNING,)
+            ).fetchall()
+            for row in rows:
+                if self._is_orphaned(row["owner"], row["updated_at"]):
+                    # Condicionado al mismo dueño: si otro proceso lo tomó entretanto, no se toca
+                    conn.execute(
+                        "UPDATE transcription_jobs SET status = ?, owner = NULL WHERE id = ? AND status = ? AND owner IS ?",
+                        (STATUS_PENDING, row["id"], STATUS_RUNNING, row["owner"])
+                    )
+
+    def discard_project(self, bucket, storage_folder):
+        """Quita de la cola los trabajos de una carpeta que ya no existe."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM transcription_jobs WHERE bucket = ? AND storage_folder = ?",
+                (bucket, storage_folder)
+            )
+
+    def project_status(self, bucket, storage_folder):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT file_name, status, attempts, last_error FROM transcription_jobs "
+                "WHERE bucket = ? AND storage_folder = ? ORDER BY file_name",
+                (bucket, storage_folder)
+            ).fetchall()
+        return {r["file_name"]: dict(r) for r in rows}
+
+
+# =====================================================
+# WORKERS
+# =====================================================
+
+def _transcribe_segment(prompt_parts):
+    from services.gemini_api import call_gemini_api
+    return call_gemini_api(prompt_parts, generation_config_override={"max_output_tokens": 8192})
+
+def _transcribe_media(media_bytes, file_name, mime_type):
+    """
+    Transcribe usando la versión reducida del medio (audio mono + fotogramas).
+    Las grabaciones largas se parten en segmentos que se transcriben en paralelo
+    y se unen en orden con su marca de tiempo.
+    """
+    from prompts import get_media_transcription_prompt
+
+    prepared = prepare_media(media_bytes, os.path.splitext(file_name)[1].lower(),
+                             is_video=mime_type.startswith("video"))
+    if not prepared or not prepared["audio_segments"]:
+        # Sin ffmpeg (o sin pista de audio): enviamos el archivo original
+        return _transcribe_segment([get_media_transcription_prompt(), {"mime_type": mime_type, "data": media_bytes}])
+
+    log_action(f"{file_name}: {prepared['original_size'] / 1e6:.1f} MB -> {prepared['processed_size'] / 1e6:.1f} MB "
+               f"({len(prepared['audio_segments'])} segmento(s))", module="TranscriptionQueue")
+
+    segments = prepared["audio_segments"]
+    payloads = []
+    for idx, seg in enumerate(segments):
+        end = segments[idx + 1]["start_seconds"] if idx + 1 < len(segments) else float("inf")
+        start_label = format_timestamp(seg["start_seconds"]) if len(segments) > 1 else None
+        frames = keyframes_in_range(prepared["keyframes"], seg["start_seconds"], end)
+        payloads.append(
+            [get_media_transcription_prompt(start_label), {"mime_type": seg["mime_type"], "data": seg["data"]}]
+            + [{"mime_type": f["mime_type"], "data": f["data"]} for f in frames]
+        )
+
+    if len(payloads) == 1:
+        return _transcribe_segment(payloads[0])
+
+    with ThreadPoolExecutor(max_workers=SEGMENT_WORKERS) as executor:
+        results = list(executor.map(_transcribe_segment, payloads))
+
+    if any(not r for r in results):
+        raise RuntimeError("Uno o más segmentos no se pudieron transcribir")
+    return "\n\n".join(
+        f"[{format_timestamp(seg['start_seconds'])}]\n{text.strip()}" for seg, text in zip(segments, results)
+    )
+
+def _transcribe_job(job):
+    """Descarga el medio, lo transcribe y sube el resultado a Storage."""
+    from services.supabase_db import supabase
+
+    storage = supabase.storage.from_(job["bucket"])
+    media_path = f"{job['storage_folder']}/{job['file_name']}"
+    transcript_path = f"{media_path}{TRANSCRIPT_SUFFIX}"
+
+    media_bytes = storage.download(media_path)
+    transcript = _transcribe_media(media_bytes, job["file_name"], job["mime_type"])
+    del media_bytes
+
+    if not transcript:
+        raise RuntimeError("Gemini no devolvió transcripción")
+
+    storage.upload(
+        path=transcript_path,
+        file=transcript.encode("utf-8"),
+        file_options={"content-type": "text/plain", "upsert": "true"}
+    )
+
+
+class TranscriptionWorkerPool:
+    """Hilos daemon con concurrencia acotada que consumen la cola."""
+
+    def __init__(self, store, max_workers=MAX_TRANSCRIPTION_WORKERS):
+        self.store = store
+        self.max_workers = max(1, max_workers)
+        self._wakeup = threading.Event()
+        self._threads = []
+        self.store.requeue_stale()
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._run, name=f"transcription-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                job = self.store.claim_next()
+            except Exception as e:
+                log_error("Error leyendo la cola de transcripción", module="TranscriptionQueue", error=e)
+                job = None
+
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            try:
+                start = time.time()
+                _transcribe_job(job)
+                self.store.mark(job["id"], STATUS_DONE)
+                log_action(f"Transcripción lista: {job['file_name']} ({time.time() - start:.1f}s)", module="TranscriptionQueue")
+            except Exception as e:
+                retry = job["attempts"] < MAX_JOB_ATTEMPTS
+                log_error(f"Fallo transcribiendo {job['file_name']} (intento {job['attempts']})",
+                          module="TranscriptionQueue", error=e, level="WARNING" if retry else "ERROR")
+                # Si ni siquiera se puede anotar el fallo (p. ej. "database is locked"), el hilo
+                # sigue vivo; el trabajo queda 'procesando' hasta el próximo arranque (requeue_stale)
+                try:
+                    if retry:
+                        self.store.retry_later(job["id"], job["attempts"], error=str(e)[:500])
+                    else:
+                        self.store.mark(job["id"], STATUS_ERROR, error=str(e)[:500])
+                except Exception as mark_error:
+                    log_error(f"No se pudo actualizar el estado de {job['file_name']}",
+                              module="TranscriptionQueue", error=mark_error)
+
+
+@st.cache_resource(show_spinner=False)
+def get_transcription_store():
+    return SQLiteJobStore()
+
+@st.cache_resource(show_spinner=False)
+def get_transcription_workers():
+    """Un único pool de workers por proceso."""
+    return TranscriptionWorkerPool(get_transcription_store())
+
+# =====================================================
+# API PÚBLICA
+# =====================================================
+
+def enqueue_transcription(bucket, storage_folder, file_name, mime_type):
+    """Encola la transcripción de un archivo y despierta a los workers."""
+    get_transcription_store().enqueue(bucket, storage_folder, file_name, mime_type)
+    get_transcription_workers().notify()
+
+def discard_transcriptions(bucket, storage_folder):
+    """Cancela las transcripciones de una carpeta borrada (un 'procesando' termina sin efecto)."""
+    get_transcription_store().discard_project(bucket, storage_folder)
+
+def get_transcription_status(bucket, storage_folder):
+    """Devuelve {nombre_archivo: {status, attempts, last_error}} para el proyecto."""
+    try:
+        return get_transcription_store().project_status(bucket, storage_folder)
+    except Exception as e:
+        log_error("Error consultando estado de transcripciones", module="TranscriptionQueue", error=e)
+        return {}
@@ -0,0 +1,333 @@
+import os
+import io
+import copy
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+from config import LOCAL_CACHE_DIR
+from services.logger import log_error, log_action
+
+# =====================================================
+# CAPA DE DATOS DE GOOGLE TRENDS
+# =====================================================
+# - Caché persistente en disco con TTL por (keyword, timeframe, geo): repetir
+#   un escaneo no vuelve a tocar Google.
+# - Hasta 5 keywords por payload (límite de Trends). Si se comparan más, cada
+#   lote incluye la keyword principal como ancla para poder expresar todas las
+#   series en la misma escala (relative_peak = pico / pico del ancla).
+# - Los endpoints de un payload se piden en paralelo sobre copias del mismo
+#   TrendReq (comparten los tokens del payload) bajo un limitador común.
+# - Las regiones se piden con un payload de un solo término: en un payload
+#   múltiple el valor de cada región se reparte entre los términos del lote y
+#   no podría cachearse por keyword.
+# - TRENDS_FIXTURE_DIR: cliente que reproduce respuestas grabadas (pruebas sin
+#   red). TRENDS_RECORD_FIXTURES=1 graba las respuestas reales en esa carpeta.
+#
+# Entrada de caché: {"fetched_at", "interest": [[fecha_iso, valor]],
+#   "regions": [[región, valor]], "rising_queries", "related_topics",
+#   "ratios": {ancla: pico_relativo}}  (series normalizadas a su propio pico = 100)
+
+TRENDS_CACHE_DIR = os.path.join(LOCAL_CACHE_DIR, "trends")
+TRENDS_CACHE_TTL_SECONDS = int(os.environ.get("TRENDS_CACHE_TTL_HOURS", "12")) * 3600
+TRENDS_FIXTURE_DIR = os.environ.get("TRENDS_FIXTURE_DIR")
+TRENDS_RECORD_FIXTURES = os.environ.get("TRENDS_RECORD_FIXTURES") == "1"
+TRENDS_CACHE_VERSION = 2  # v2: regiones de un payload de un solo término
+
+MAX_KEYWORDS_PER_PAYLOAD = 5
+MAX_CONCURRENT_REQUESTS = 2
+MIN_REQUEST_INTERVAL_SECONDS = 1.0
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 4.0
+TOP_N = 5
+TOP_REGIONS = 10
+
+
+class TrendsDataError(Exception):
+    """Google Trends no devolvió datos para el término (o bloqueó la consulta)."""
+
+
+class RequestLimiter:
+    """Máximo de solicitudes simultáneas + separación mínima entre inicios."""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_REQUESTS, min_interval=MIN_REQUEST_INTERVAL_SECONDS):
+        self._semaphore = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._min_interval = min_interval
+        self._last_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            wait = self._last_start + self._min_interval - time.monotonic()
+            if wait > 0: time.sleep(wait)
+            self._last_start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self._semaphore.release()
+        return False
+
+
+@st.cache_resource(show_spinner=False)
+def get_request_limiter():
+    # Compartido por todas las sesiones del proceso
+    return RequestLimiter()
+
+# =====================================================
+# CLIENTE DE FIXTURES (SIN RED)
+# =====================================================
+
+def _fixture_path(directory, keywords, timeframe, geo):
+    key = hashlib.sha256(json.dumps([list(keywords), timeframe, geo]).encode("utf-8")).hexdigest()[:24]
+    return os.path.join(directory, f"trends_{key}.json")
+
+def _df_to_json(df):
+    return None if df is None else df.to_json(orient="split", date_format="iso")
+
+def _df_from_json(raw):
+    return None if raw is None else pd.read_json(io.StringIO(raw), orient="split")
+
+def save_fixture(directory, keywords, timeframe, geo, responses):
+    """
+    Graba las respuestas de un payload (mismo formato que lee FixtureTrendReq).
+    Los endpoints que no vienen en responses conservan lo ya grabado.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = _fixture_path(directory, keywords, timeframe, geo)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (FileNotFoundError, ValueError):
+        payload = {"interest_over_time": None, "interest_by_region": None, "related_queries": {}, "related_topics": {}}
+    payload.update({"keywords": list(keywords), "timeframe": timeframe, "geo": geo})
+    for name in ("interest_over_time", "interest_by_region"):
+        if responses.get(name) is not None: payload[name] = _df_to_json(responses[name])
+    for name in ("related_queries", "related_topics"):
+        if responses.get(name) is not None:
+            payload[name] = {kw: {"rising": _df_to_json((v or {}).get("rising"))} for kw, v in responses[name].items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+class FixtureTrendReq:
+    """Sustituto de TrendReq que responde con fixtures grabados."""
+
+    def __init__(self, directory=TRENDS_FIXTURE_DIR, **kwargs):
+        self.directory = directory
+        self._data = None
+
+    def build_payload(self, kw_list, cat=0, timeframe="today 12-m", geo="", **kwargs):
+        path = _fixture_path(self.directory, kw_list, timeframe, geo)
+        if not os.path.exists(path):
+            raise TrendsDataError(f"Sin fixture para {kw_list} ({timeframe}, {geo or 'global'})")
+        with open(path, "r", encoding="utf-8") as f:
+            self._data = json.load(f)
+
+    def interest_over_time(self):
+        df = _df_from_json(self._data["interest_over_time"])
+        return df if df is not None else pd.DataFrame()
+
+    def interest_by_region(self, **kwargs):
+        return _df_from_json(self._data["interest_by_region"])
+
+    def related_queries(self):
+        return {kw: {"rising": _df_from_json(v["rising"])} for kw, v in self._data["related_queries"].items()}
+
+    def related_topics(self):
+        return {kw: {"rising": _df_from_json(v["rising"])} for kw, v in self._data["related_topics"].items()}
+
+def _new_client():
+    if TRENDS_FIXTURE_DIR and not TRENDS_RECORD_FIXTURES:
+        return FixtureTrendReq()
+    from pytrends.request import TrendReq
+    return TrendReq(hl='es', tz=300, timeout=(5, 20))
+
+# =====================================================
+# CACHÉ EN DISCO
+# =====================================================
+
+def _cache_path(keyword, timeframe, geo):
+    key = hashlib.sha256(f"v{TRENDS_CACHE_VERSION}|{keyword.strip().lower()}|{timeframe}|{geo}".encode("utf-8")).hexdigest()
+    return os.path.join(TRENDS_CACHE_DIR, f"{key}.json")
+
+def _read_cache(keyword, timeframe, geo):
+    try:
+        with open(_cache_path(keyword, timeframe, geo), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if time.time() - entry.get("fetched_at", 0) > TRENDS_CACHE_TTL_SECONDS:
+        return None
+    return entry
+
+def _write_cache(keyword, timeframe, geo, entry):
+    try:
+        os.makedirs(TRENDS_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=TRENDS_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, _cache_path(keyword, timeframe, geo))
+    except Exception as e:
+        log_error("No se pudo guardar la caché de Trends", module="TrendsService", error=e, level="WARNING")
+
+# =====================================================
+# CONSULTA POR LOTES
+# =====================================================
+
+def _call_endpoint(client, name, limiter):
+    method = getattr(client, name)
+    kwargs = {"resolution": "REGION", "inc_low_vol": True} if name == "interest_by_region" else {}
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with limiter:
+                return method(**kwargs)
+        except Exception as e:
+            # 429 u otros errores transitorios: reintento con espera creciente
+            if attempt == MAX_RETRIES:
+                if name == "interest_over_time": raise
+                log_error(f"Trends '{name}' falló", module="TrendsService", error=e, level="WARNING")
+                return None
+            time.sleep(RETRY_BACKOFF_SECONDS * (attempt + 1))
+
+ENDPOINTS = ("interest_over_time", "interest_by_region", "related_queries", "related_topics")
+BATCH_ENDPOINTS = ("interest_over_time", "related_queries", "related_topics")
+
+def _fetch_regions(keyword, timeframe, geo, limiter):
+    """interest_by_region con un payload de un solo término (None si falla)."""
+    try:
+        client = _new_client()
+        with limiter:
+            client.build_payload([keyword], cat=0, timeframe=timeframe, geo=geo)
+        regions = _call_endpoint(client, "interest_by_region", limiter)
+    except Exception as e:
+        log_error(f"Trends: sin regiones para '{keyword}'", module="TrendsService", error=e, level="WARNING")
+        return None
+    if TRENDS_RECORD_FIXTURES and TRENDS_FIXTURE_DIR:
+        save_fixture(TRENDS_FIXTURE_DIR, [keyword], timeframe, geo, {"interest_by_region": regions})
+    return regions
+
+def _fetch_batch(keywords, timeframe, geo, region_keywords):
+    """
+    Un payload (≤ 5 keywords): sus endpoints en paralelo, más las regiones de
+    region_keywords con un payload propio por término. Retorna las respuestas
+    crudas con "regions" = {keyword: DataFrame | None}.
+    """
+    limiter = get_request_limiter()
+    client = _new_client()
+    with limiter:
+        client.build_payload(list(keywords), cat=0, timeframe=timeframe, geo=geo)
+
+    # Con un solo término el payload del lote ya es el de sus regiones
+    single = len(keywords) == 1 and list(region_keywords) == list(keywords)
+    endpoints = ENDPOINTS if single else BATCH_ENDPOINTS
+    separate = [] if single else list(region_keywords)
+
+    # Copias superficiales: comparten los tokens del payload, cada hilo usa la suya
+    with ThreadPoolExecutor(max_workers=len(endpoints) + len(separate)) as executor:
+        futures = {name: executor.submit(_call_endpoint, copy.copy(client), name, limiter) for name in endpoints}
+        region_futures = {kw: executor.submit(_fetch_regions, kw, timeframe, geo, limiter) for kw in separate}
+        responses = {name: future.result() for name, future in futures.items()}
+        regions = {kw: future.result() for kw, future in region_futures.items()}
+
+    if TRENDS_RECORD_FIXTURES and TRENDS_FIXTURE_DIR:
+        save_fixture(TRENDS_FIXTURE_DIR, keywords, timeframe, geo, responses)
+    if single:
+        regions = {keywords[0]: responses.pop("interest_by_region")}
+    responses["regions"] = regions
+    return responses
+
+def _top_regions(regions_df, keyword):
+    if regions_df is None or keyword not in regions_df.columns: return []
+    col = regions_df[keyword].astype(float)
+    region_peak = float(col.max())
+    if not region_peak: return []
+    top = col[col > 0].sort_values(ascending=False).head(TOP_REGIONS)
+    return [[str(name), round(float(v) / region_peak * 100, 1)] for name, v in top.items()]
+
+def _rising(related, keyword, column):
+    try:
+        df = (related or {}).get(keyword, {}).get("rising")
+        return df.head(TOP_N)[column].tolist() if df is not None else []
+    except Exception:
+        return []
+
+def _entries_from_batch(keywords, anchor, responses):
+    iot = responses["interest_over_time"]
+    if iot is None or iot.empty:
+        raise TrendsDataError("EmptyData")
+    date_col = iot.index if "date" not in iot.columns else pd.to_datetime(iot["date"])
+    if "date" in iot.columns: iot = iot.set_index("date")
+    anchor_peak = float(iot[anchor].max()) if anchor in iot.columns else 0.0
+
+    entries = {}
+    for kw in keywords:
+        if kw not in iot.columns: continue
+        series = iot[kw].astype(float)
+        peak = float(series.max())
+        scaled = series / peak * 100 if peak else series
+        entry = {
+            "fetched_at": time.time(),
+            "interest": [[pd.Timestamp(d).isoformat(), round(float(v), 2)] for d, v in zip(date_col, scaled)],
+            # None = no se pidieron en este lote (get_trends conserva las de caché)
+            "regions": _top_regions(responses["regions"][kw], kw) if kw in responses["regions"] else None,
+            "rising_queries": _rising(responses["related_queries"], kw, "query"),
+            "related_topics": _rising(responses["related_topics"], kw, "topic_title"),
+            "ratios": {anchor: (peak / anchor_peak) if anchor_peak else None},
+        }
+        entries[kw] = entry
+    return entries
+
+def _to_result(entry, anchor):
+    interest = pd.DataFrame(entry["interest"], columns=["Fecha", "Interés"])
+    interest["Fecha"] = pd.to_datetime(interest["Fecha"])
+    regions = pd.DataFrame(entry["regions"], columns=["Región", "Interés"]) if entry["regions"] else None
+    return {
+        "interest": interest, "regions": regions,
+        "rising_queries": entry["rising_queries"], "related_topics": entry["related_topics"],
+        "relative_peak": entry.get("ratios", {}).get(anchor),
+    }
+
+def get_trends(keywords, timeframe, geo):
+    """
+    keywords[0] es la principal (ancla). Retorna {keyword: {"interest",
+    "regions", "rising_queries", "related_topics", "relative_peak"}}.
+    Lanza TrendsDataError si no hay términos o si la principal no tiene datos.
+    """
+    keywords = list(dict.fromkeys(k.strip() for k in keywords if k and k.strip()))
+    if not keywords:
+        raise TrendsDataError("Sin términos de búsqueda")
+    anchor = keywords[0]
+
+    cached = {kw: _read_cache(kw, timeframe, geo) for kw in keywords}
+    # Una comparada necesita además su escala respecto a esta ancla
+    missing = [kw for kw in keywords
+               if cached[kw] is None or (kw != anchor and cached[kw].get("ratios", {}).get(anchor) is None)]
+    if missing:
+        log_action(f"Trends: {len(keywords) - len(missing)} en caché, consultando {missing}", module="TrendsService")
+
+    others = [kw for kw in missing if kw != anchor]
+    batches = [[anchor] + others[i:i + MAX_KEYWORDS_PER_PAYLOAD - 1] for i in range(0, len(others), MAX_KEYWORDS_PER_PAYLOAD - 1)]
+    if anchor in missing and not batches:
+        batches = [[anchor]]
+
+    # Regiones por término (payload propio): solo las que no están ya en caché
+    have_regions = {kw for kw in keywords if cached[kw] is not None}
+    for batch in batches:
+        region_keywords = [kw for kw in batch if kw not in have_regions]
+        entries = _entries_from_batch(batch, anchor, _fetch_batch(batch, timeframe, geo, region_keywords))
+        have_regions.update(region_keywords)
+        for kw, entry in entries.items():
+            # El ancla conserva las razones que ya tenía con otras comparaciones
+            if cached.get(kw): entry["ratios"] = {**cached[kw].get("ratios", {}), **entry["ratios"]}
+            if entry["regions"] is None: entry["regions"] = (cached.get(kw) or {}).get("regions") or []
+            cached[kw] = entry
+            _write_cache(kw, timeframe, geo, entry)
+
+    if not cached.get(anchor):
+        raise TrendsDataError("EmptyData")
+    return {kw: _to_result(entry, anchor) for kw, entry in cached.items() if entry}
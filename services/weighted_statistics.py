@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+# =====================================================
+# ESTADÍSTICA PONDERADA (ENCUESTAS CON FACTOR DE EXPANSIÓN)
+# =====================================================
+# Todo trabaja sobre códigos enteros por grupo (0..k-1, -1 = vacío) y
+# np.bincount con pesos: nunca se replican filas.
+#
+# - n efectivo de Kish: n_eff = (Σw)² / Σw²  y  deff = n / n_eff
+# - Chi² ajustado: el Chi² de Pearson sobre la tabla ponderada reescalada a n
+#   se divide por deff (corrección de primer orden tipo Rao-Scott).
+# - Residuos ajustados (Haberman) de esa misma tabla, divididos por √deff.
+#   Con pesos 1 (deff = 1) es el Chi² y los residuos ajustados sin ponderar.
+# - ANOVA ponderada: medias y sumas de cuadrados ponderadas con los pesos
+#   normalizados para sumar n_eff (los grados de libertad usan n_eff).
+
+def clean_weights(weights):
+    """Pesos como float; vacíos, negativos o no numéricos cuentan como 0."""
+    # Copia propia: to_numpy() puede ser una vista de la columna (compartida entre sesiones)
+    w = np.array(pd.to_numeric(pd.Series(weights), errors="coerce"), dtype=float, copy=True)
+    w[~np.isfinite(w) | (w < 0)] = 0.0
+    return w
+
+def effective_sample_size(weights):
+    w = np.asarray(weights, dtype=float)
+    w = w[w > 0]
+    if len(w) == 0: return 0.0
+    return float(w.sum() ** 2 / (w ** 2).sum())
+
+def design_effect(weights):
+    w = np.asarray(weights, dtype=float)
+    w = w[w > 0]
+    n_eff = effective_sample_size(w)
+    return float(len(w) / n_eff) if n_eff else float("nan")
+
+def _cells(row_codes, col_codes, weights, n_cols):
+    mask = (row_codes >= 0) & (col_codes >= 0) & (weights > 0)
+    return row_codes[mask] * n_cols + col_codes[mask], mask
+
+def weighted_crosstab(row_codes, col_codes, weights, n_rows, n_cols):
+    """Tabla ponderada (n_rows × n_cols) y el vector de pesos de las filas válidas."""
+    flat, mask = _cells(row_codes, col_codes, weights, n_cols)
+    table = np.bincount(flat, weights=weights[mask], minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+    return table, weights[mask]
+
+def weighted_cell_sums(row_codes, col_codes, weights, values, n_rows, n_cols):
+    """Σ w·x por celda sobre las mismas filas válidas que weighted_crosstab."""
+    flat, mask = _cells(row_codes, col_codes, weights, n_cols)
+    return np.bincount(flat, weights=weights[mask] * values[mask], minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+
+def weighted_chi_squared(table, cell_weights):
+    """
+    Chi² ajustado por efecto de diseño sobre una tabla ponderada.
+    Retorna (p_value, residuos_ajustados, deff) o (None, None, None).
+    """
+    table = np.asarray(table, dtype=float)
+    if min(table.shape) < 2 or table.sum() <= 0:
+        return None, None, None
+    n = len(cell_weights)
+    deff = design_effect(cell_weights)
+
+    scaled = table / table.sum() * n
+    row_share, col_share = scaled.sum(axis=1) / n, scaled.sum(axis=0) / n
+    expected = np.outer(row_share, col_share) * n
+    # Varianza de (O - E) bajo independencia: E · (1 - fila/n) · (1 - columna/n)
+    variance = expected * np.outer(1 - row_share, 1 - col_share) * deff
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contributions = np.where(expected > 0, (scaled - expected) ** 2 / expected, 0.0)
+        residuals = np.where(variance > 0, (scaled - expected) / np.sqrt(variance), 0.0)
+    chi2 = contributions.sum() / deff
+    dof = (np.count_nonzero(scaled.sum(axis=1)) - 1) * (np.count_nonzero(scaled.sum(axis=0)) - 1)
+    if dof <= 0:
+        return None, None, None
+    return float(stats.chi2.sf(chi2, dof)), residuals, deff
+
+def weighted_group_stats(codes, values, weights, n_groups):
+    """Por grupo: suma de pesos, media ponderada y n efectivo."""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+    mask = (codes >= 0) & (weights > 0) & ~np.isnan(values)
+    c, x, w = codes[mask], values[mask], weights[mask]
+    sum_w = np.bincount(c, weights=w, minlength=n_groups)
+    sum_wx = np.bincount(c, weights=w * x, minlength=n_groups)
+    sum_w2 = np.bincount(c, weights=w ** 2, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.where(sum_w > 0, sum_wx / sum_w, np.nan)
+        n_eff = np.where(sum_w2 > 0, sum_w ** 2 / sum_w2, 0.0)
+    return {"weight": sum_w, "mean": means, "n_eff": n_eff, "codes": c, "values": x, "weights": w}
+
+def weighted_anova(codes, values, weights, n_groups):
+    """ANOVA ponderada. Retorna (test_type, p_value, n_grupos) como calculate_group_comparison."""
+    g = weighted_group_stats(codes, values, weights, n_groups)
+    present = np.flatnonzero(g["weight"] > 0)
+    k = len(present)
+    if k < 2:
+        return None, None, 0
+
+    n_eff = effective_sample_size(g["weights"])
+    if n_eff - k <= 0:
+        return None, None, k
+    w = g["weights"] * n_eff / g["weights"].sum()  # Pesos normalizados a n_eff
+    c, x = g["codes"], g["values"]
+
+    group_w = np.bincount(c, weights=w, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        group_mean = np.where(group_w > 0, np.bincount(c, weights=w * x, minlength=n_groups) / group_w, 0.0)
+    grand = (w * x).sum() / w.sum()
+    ss_between = (group_w * (group_mean - grand) ** 2).sum()
+    ss_within = (w * (x - group_mean[c]) ** 2).sum()
+    if ss_within <= 0:
+        return None, None, k
+
+    f_stat = (ss_between / (k - 1)) / (ss_within / (n_eff - k))
+    p = float(stats.f.sf(f_stat, k - 1, n_eff - k))
+    return ("T-Test (ponderado)" if k == 2 else "ANOVA (ponderada)"), p, k
+
+def weighted_group_comparison(df, num_col, cat_col, weight_col):
+    """Versión ponderada de services.statistics.calculate_group_comparison."""
+    codes, uniques = pd.factorize(df[cat_col])
+    return weighted_anova(codes.astype(np.int64), df[num_col], clean_weights(df[weight_col]), len(uniques))
+
+def weighted_mean_table(df, num_col, cat_col, weight_col):
+    """Medias ponderadas por grupo con n efectivo (para mostrar junto a la prueba)."""
+    codes, uniques = pd.factorize(df[cat_col], sort=True)
+    g = weighted_group_stats(codes.astype(np.int64), df[num_col], clean_weights(df[weight_col]), len(uniques))
+    table = pd.DataFrame({"Media ponderada": g["mean"], "Peso total": g["weight"], "n efectivo": g["n_eff"]},
+                         index=pd.Index(uniques, name=cat_col))
+    return table[table["Peso total"] > 0]
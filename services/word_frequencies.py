@@ -0,0 +1,77 @@
+import io
+import pandas as pd
+import streamlit as st
+from wordcloud import WordCloud
+from utils import get_stopwords, normalize_text
+
+# =====================================================
+# NUBE DE PALABRAS: FRECUENCIAS PRIMERO, RENDER APARTE
+# =====================================================
+# 1) Frecuencias: la columna se tokeniza de forma vectorizada (minúsculas,
+#    sin tildes, sin stopwords en español/inglés) contando cada respuesta
+#    distinta una sola vez y ponderando por su repetición. Cacheado por
+#    (dataset, columna, filtro).
+# 2) Render: WordCloud.generate_from_frequencies -> PIL -> PNG, cacheado por
+#    las frecuencias y las opciones visuales. Cambiar de color o de número de
+#    palabras solo re-renderiza; nunca re-tokeniza.
+
+MIN_WORD_LENGTH = 3
+MAX_FREQUENCIES = 500
+TOKEN_RE = r"[a-z0-9ñ]{%d,}" % MIN_WORD_LENGTH
+
+# Solo para la nube: palabras de relleno de respuestas abiertas. No van en
+# utils.get_stopwords(), que también tokeniza el índice de fragmentos (BM25).
+# Se comparan ya sin tildes, así que no hace falta listar las variantes acentuadas.
+WORDCLOUD_EXTRA_STOPWORDS = {
+    'unos', 'unas', 'uno', 'ese', 'esa', 'eso', 'esos', 'esas', 'estos', 'estas', 'esto', 'aquel', 'aquella',
+    'muy', 'mas', 'menos', 'tambien', 'porque', 'como', 'cuando', 'donde', 'quien', 'cual', 'cuales',
+    'ya', 'hay', 'ha', 'han', 'he', 'has', 'era', 'fue', 'ser', 'estar', 'estan', 'estoy', 'soy',
+    'tiene', 'tienen', 'tengo', 'hace', 'hacer', 'puede', 'pueden', 'sin', 'sus', 'les', 'nos', 'te', 'tu',
+    'yo', 'ella', 'ellos', 'ellas', 'nosotros', 'ustedes', 'todo', 'toda', 'todos', 'todas',
+    'otro', 'otra', 'otros', 'otras', 'mismo', 'misma', 'entre', 'hasta', 'desde', 'durante', 'segun',
+    'ni', 'o', 'u', 'e', 'pues', 'asi', 'bien', 'solo', 'siempre', 'nada', 'algo', 'cada', 'mucho', 'mucha',
+    'muchos', 'muchas', 'poco', 'poca', 'tan', 'tanto', 'ahi', 'aqui', 'alla', 'entonces', 'sea'
+}
+
+def _folded_stopwords():
+    return {normalize_text(w) for w in get_stopwords() | WORDCLOUD_EXTRA_STOPWORDS}
+
+def _fold_series(series):
+    """Minúsculas y sin tildes (conserva la ñ), vectorizado sobre la columna."""
+    folded = series.str.lower().str.replace("ñ", "\x00", regex=False)
+    folded = folded.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return folded.str.replace("\x00", "ñ", regex=False)
+
+def series_word_frequencies(series, max_words=MAX_FREQUENCIES):
+    """Frecuencias {palabra: conteo} de una columna de texto (sin caché)."""
+    responses = series.dropna().astype(str)
+    if responses.empty: return {}
+
+    # Cada respuesta distinta se tokeniza una sola vez
+    unique_counts = responses.value_counts()
+    tokens = _fold_series(pd.Series(unique_counts.index, dtype=object)).str.findall(TOKEN_RE)
+    exploded = pd.DataFrame({"word": tokens.values, "n": unique_counts.values}).explode("word").dropna()
+    exploded = exploded[~exploded["word"].isin(_folded_stopwords())]
+    if exploded.empty: return {}
+
+    totals = exploded.groupby("word", sort=False)["n"].sum().nlargest(max_words)
+    return {word: int(count) for word, count in totals.items()}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def column_word_frequencies(dataset_hash, _df, column, filter_column=None, filter_values=()):
+    """Frecuencias de `column`, opcionalmente filtrando filas por filter_column ∈ filter_values."""
+    series = _df[column]
+    if filter_column and filter_values:
+        series = series[_df[filter_column].isin(list(filter_values))]
+    return series_word_frequencies(series)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_wordcloud_png(frequencies, max_words=150, colormap="viridis", width=800, height=400):
+    """PNG de la nube a partir de frecuencias (tupla de pares para que sea hasheable)."""
+    freq_dict = dict(frequencies)
+    if not freq_dict: return None
+    wc = WordCloud(width=width, height=height, background_color="white",
+                   max_words=max_words, colormap=colormap).generate_from_frequencies(freq_dict)
+    buffer = io.BytesIO()
+    wc.to_image().save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
@@ -60,15 +60,13 @@ def extract_text_from_pdfs(files):
     Extrae texto de una lista de archivos subidos. 
     Requerido por onepager_mode.py
     """
+    from services.extraction_cache import extract_text
     text = ""
     for file in files:
         try:
             if fitz:
-                # Abrimos el documento desde el stream de bytes
-                doc = fitz.open(stream=file.read(), filetype="pdf")
-                for page in doc:
-                    text += page.get_text()
-                file.seek(0) # Reset del puntero para futuros usos
+                # Caché compartida por hash: un PDF ya visto no se vuelve a parsear
+                text += extract_text(file.getvalue(), ".pdf")
             else:
                 text += "\n[Error: Librería PyMuPDF/fitz no disponible]"
         except Exception as e: